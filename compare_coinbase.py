@@ -6,78 +6,44 @@ This script connects to two mining pools and compares their coinbase
 transaction structures to identify similarities or differences.
 """
 
-import socket
-import json
 import sys
 import time
 import binascii
 import argparse
 
+from stratum_client import StratumClient
+
 
 def get_coinbase_from_pool(host, port, timeout=10):
     """
     Connect to a pool and retrieve the coinbase structure.
     Returns (coinb1, coinb2, notify_params) or (None, None, None) on failure.
     """
+    client = StratumClient(host, port, timeout)
     try:
-        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        sock.settimeout(timeout)
-        sock.connect((host, port))
+        deadline = time.time() + timeout
+        client.connect()
         
         # Subscribe
-        subscribe_msg = json.dumps({
-            "id": 1,
-            "method": "mining.subscribe",
-            "params": ["compare_coinbase/1.0"]
-        }) + "\n"
-        sock.sendall(subscribe_msg.encode('utf-8'))
-        time.sleep(0.2)
+        client.subscribe(["compare_coinbase/1.0"], timeout=deadline - time.time())
         
         # Authorize with a Bitcoin address (some pools require this)
-        auth_msg = json.dumps({
-            "id": 2,
-            "method": "mining.authorize",
-            "params": ["bc1qar0srrr7xfkvy5l643lydnw9re59gtzzwf5mdq", "x"]
-        }) + "\n"
-        sock.sendall(auth_msg.encode('utf-8'))
-        time.sleep(0.8)
-        
-        # Read responses
-        response_parts = []
-        sock.settimeout(3)
-        
-        try:
-            for _ in range(3):
-                chunk = sock.recv(8192).decode('utf-8')
-                if chunk:
-                    response_parts.append(chunk)
-                time.sleep(0.1)
-        except socket.timeout:
-            pass
-        
-        sock.close()
-        
-        response = ''.join(response_parts)
+        client.authorize("bc1qar0srrr7xfkvy5l643lydnw9re59gtzzwf5mdq", "x", timeout=deadline - time.time())
         
-        # Parse for mining.notify
-        for line in response.split('\n'):
-            if line.strip():
-                try:
-                    data = json.loads(line)
-                    if data.get('method') == 'mining.notify':
-                        params = data.get('params')
-                        if params and len(params) >= 9:
-                            coinb1 = params[2]
-                            coinb2 = params[3]
-                            return coinb1, coinb2, params
-                except json.JSONDecodeError:
-                    continue
+        # Wait for mining.notify
+        params = client.wait_for_notify(deadline - time.time())
+        if params and len(params) >= 9:
+            coinb1 = params[2]
+            coinb2 = params[3]
+            return coinb1, coinb2, params
         
         return None, None, None
         
     except Exception as e:
         print(f"Error connecting to {host}:{port}: {e}", file=sys.stderr)
         return None, None, None
+    finally:
+        client.close()
 
 
 def analyze_coinbase_structure(coinb1_hex, coinb2_hex, pool_name):
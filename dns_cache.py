@@ -0,0 +1,273 @@
+#!/usr/bin/env python3
+"""
+DNS Cache
+
+Resolver layer for stratum_test.py, so DNS is timed as its own metric
+instead of inside every stratum sample.
+
+prefetch() resolves every pool hostname once, concurrently, at startup.
+Probes then call lookup() and connect to the cached addresses until the
+entry's TTL runs out, at which point the next lookup resolves again. Every
+real resolution is timed and kept per hostname; resolutions(hostname,
+since=mark) returns those made after a mark() (e.g. one round of probes),
+so cache hits are never counted as zero-millisecond lookups.
+
+By default hostnames are resolved with getaddrinfo(), which does not
+expose record TTLs, so answers are kept for DEFAULT_DNS_TTL seconds. With
+resolvers (IP[:port] strings), every hostname is instead queried against
+all of them at once with dns_client.py: the answer of the fastest resolver
+that returned addresses is cached for its record TTL, and every query
+result is kept in `queries` for per-resolver reporting.
+
+Lookups return IPv4 addresses unless the cache is created with
+family=socket.AF_INET6. all_addresses() returns both families, or only the
+one passed as family.
+
+Usage:
+    from dns_cache import DnsCache
+
+    cache = DnsCache()
+    mark = cache.mark()
+    cache.prefetch(["solo.atlaspool.io", "solo.ckpool.org"])
+    addrinfo = cache.lookup("solo.atlaspool.io", 3333)
+    dns_times = cache.resolutions("solo.atlaspool.io", mark)
+
+Requirements:
+  • Python 3.6+ (alookup requires 3.7+)
+  • No external dependencies
+"""
+
+import socket
+import asyncio
+import ipaddress
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Dict, List, Tuple, Iterable
+
+from stratum_client import now_ns
+from probe_scheduler import run_until
+import dns_client
+
+# Seconds a getaddrinfo() answer stays cached
+DEFAULT_DNS_TTL = 60
+
+# Concurrent resolutions during prefetch()
+PREFETCH_WORKERS = 32
+
+# Resolution times kept per hostname
+HISTORY_SIZE = 1000
+
+# Resolver query results kept for reporting (with resolvers)
+QUERY_LOG_SIZE = 10000
+
+# Shortest time a resolver answer is cached, even with a lower record TTL
+MIN_RECORD_TTL = 1
+
+
+def literal_addrinfo(hostname: str, port: int) -> Optional[List[Tuple]]:
+    """addrinfo list for an IPv4/IPv6 address literal (None for a hostname)"""
+    try:
+        address = ipaddress.ip_address(hostname)
+    except ValueError:
+        return None
+    if address.version == 6:
+        return [(socket.AF_INET6, socket.SOCK_STREAM, socket.IPPROTO_TCP, '', (hostname, port, 0, 0))]
+    return [(socket.AF_INET, socket.SOCK_STREAM, socket.IPPROTO_TCP, '', (hostname, port))]
+
+
+class DnsEntry:
+    """Cached addresses of one hostname"""
+
+    def __init__(self, addresses: List[Tuple], ttl: float):
+        self.addresses = addresses  # (family, socktype, proto, sockaddr without port)
+        self.expires = time.monotonic() + ttl
+        self.ttl = ttl
+
+    def fresh(self) -> bool:
+        return time.monotonic() < self.expires
+
+
+class DnsCache:
+    """Thread-safe hostname -> addresses cache with per-entry TTL"""
+
+    def __init__(self, default_ttl: float = DEFAULT_DNS_TTL, family: Optional[int] = None,
+                 resolvers: Optional[List[str]] = None, timeout: float = dns_client.DEFAULT_TIMEOUT):
+        self.default_ttl = default_ttl
+        self.family = family or socket.AF_INET
+        self.all_families = family is None
+        self.resolvers = [dns_client.parse_resolver(r) for r in resolvers or []]
+        self.timeout = timeout
+        self.queries = deque(maxlen=QUERY_LOG_SIZE)
+        self._entries = {}
+        self._history = {}  # hostname -> deque of (sequence number, resolve ms)
+        self._sequence = 0
+        self._lock = threading.Lock()
+
+    def put(self, hostname: str, addresses: List[Tuple], ttl: Optional[float] = None,
+            resolve_ms: Optional[float] = None):
+        """
+        Cache addresses (from addrinfo tuples) for ttl seconds (default_ttl
+        if None). resolve_ms, if given, is recorded as a resolution time.
+        """
+        entry = DnsEntry([(family, socktype, proto, sockaddr[:1] + sockaddr[2:])
+                          for family, socktype, proto, _, sockaddr in addresses],
+                         self.default_ttl if ttl is None else ttl)
+        with self._lock:
+            self._entries[hostname] = entry
+            if resolve_ms is not None:
+                history = self._history.setdefault(hostname, deque(maxlen=HISTORY_SIZE))
+                history.append((self._sequence, resolve_ms))
+                self._sequence += 1
+
+    def mark(self) -> int:
+        """Position to pass to resolutions() to see only later resolutions"""
+        with self._lock:
+            return self._sequence
+
+    def resolutions(self, hostname: str, since: int = 0) -> List[float]:
+        """Times (ms) of the resolutions of hostname made after mark() returned since"""
+        with self._lock:
+            return [ms for sequence, ms in self._history.get(hostname, ()) if sequence >= since]
+
+    def fresh(self, hostname: str) -> bool:
+        """True if hostname has an unexpired entry"""
+        with self._lock:
+            entry = self._entries.get(hostname)
+            return entry is not None and entry.fresh()
+
+    def address(self, hostname: str) -> Optional[str]:
+        """First cached IP of hostname without resolving (None if no fresh entry)"""
+        if literal_addrinfo(hostname, 0) is not None:
+            return hostname
+        with self._lock:
+            entry = self._entries.get(hostname)
+            if entry is None or not entry.fresh() or not entry.addresses:
+                return None
+            return entry.addresses[0][3][0]
+
+    def _cached(self, hostname: str, port: int) -> Optional[List[Tuple]]:
+        with self._lock:
+            entry = self._entries.get(hostname)
+            if entry is None or not entry.fresh():
+                return None
+        return [(family, socktype, proto, '', sockaddr[:1] + (port,) + sockaddr[1:])
+                for family, socktype, proto, sockaddr in entry.addresses]
+
+    async def _query(self, hostnames: List[str]):
+        """Query hostnames against every resolver and cache the fastest answers"""
+        qtype = 'AAAA' if self.family == socket.AF_INET6 else 'A'
+        results = await dns_client.query_all(hostnames, self.resolvers, timeout=self.timeout)
+        with self._lock:
+            self.queries.extend(results)
+        for hostname in hostnames:
+            answer = dns_client.choose_answer(results, hostname, qtype)
+            if answer is None:
+                continue
+            addresses = [(self.family, socket.SOCK_STREAM, socket.IPPROTO_TCP, '',
+                          (ip, 0) if self.family == socket.AF_INET else (ip, 0, 0, 0))
+                         for ip in answer['addresses']]
+            self.put(hostname, addresses, ttl=max(answer['ttl'] or 0, MIN_RECORD_TTL),
+                     resolve_ms=answer['latency_ms'])
+
+    def _resolve(self, hostname: str):
+        """Resolve hostname now and cache it (raises socket.gaierror if that fails)"""
+        if self.resolvers:
+            asyncio.run(self._query([hostname]))
+            if not self.fresh(hostname):
+                raise socket.gaierror(socket.EAI_NONAME, "No address from any resolver")
+            return
+        start = now_ns()
+        addresses = socket.getaddrinfo(hostname, 0, self.family, socket.SOCK_STREAM)
+        self.put(hostname, addresses, resolve_ms=(now_ns() - start) / 1e6)
+
+    def lookup(self, hostname: str, port: int) -> List[Tuple]:
+        """
+        getaddrinfo()-style address list for hostname:port, resolving (and
+        recording the resolution time) only if there is no fresh entry.
+        Address literals are returned as they are, in their own family.
+        Raises socket.gaierror like getaddrinfo().
+        """
+        cached = literal_addrinfo(hostname, port) or self._cached(hostname, port)
+        if cached is None:
+            self._resolve(hostname)
+            cached = self._cached(hostname, port)
+        return cached
+
+    async def alookup(self, hostname: str, port: int) -> List[Tuple]:
+        """lookup() for coroutines: resolves with loop.getaddrinfo() on a cache miss"""
+        cached = literal_addrinfo(hostname, port) or self._cached(hostname, port)
+        if cached is None and self.resolvers:
+            await self._query([hostname])
+            cached = self._cached(hostname, port)
+            if cached is None:
+                raise socket.gaierror(socket.EAI_NONAME, "No address from any resolver")
+        elif cached is None:
+            loop = asyncio.get_event_loop()
+            start = now_ns()
+            addresses = await loop.getaddrinfo(hostname, 0, family=self.family, type=socket.SOCK_STREAM)
+            self.put(hostname, addresses, resolve_ms=(now_ns() - start) / 1e6)
+            cached = self._cached(hostname, port)
+        return cached
+
+    def all_addresses(self, hostname: str) -> List[str]:
+        """
+        Every A and AAAA address of hostname (IPv4 first), uncached: the
+        union of all resolvers' answers with resolvers, else getaddrinfo().
+        Only addresses of the cache's family if one was given.
+        """
+        if literal_addrinfo(hostname, 0) is not None:
+            return [hostname]
+        qtypes = ('A', 'AAAA') if self.all_families else ('AAAA' if self.family == socket.AF_INET6 else 'A',)
+        if self.resolvers:
+            results = asyncio.run(dns_client.query_all([hostname], self.resolvers, timeout=self.timeout))
+            with self._lock:
+                self.queries.extend(results)
+            addresses = [address for qtype in qtypes for r in results if r['qtype'] == qtype
+                         for address in r['addresses']]
+        else:
+            try:
+                family = socket.AF_UNSPEC if self.all_families else self.family
+                infos = socket.getaddrinfo(hostname, None, family, socket.SOCK_STREAM)
+            except OSError:
+                return []
+            infos.sort(key=lambda info: info[0] != socket.AF_INET)
+            addresses = [info[4][0] for info in infos]
+        return list(dict.fromkeys(addresses))
+
+    def prefetch(self, hostnames: Iterable[str], deadline: Optional[float] = None) -> Dict[str, Optional[float]]:
+        """
+        Resolve hostnames that have no fresh entry, concurrently (in one
+        event loop with resolvers, else in a thread pool). Must not be
+        called from a running event loop. Returns the resolution time in
+        ms per resolved hostname (None if it failed; failures are not
+        cached, so probes resolve again and report the error themselves).
+        With deadline (a time.monotonic() value), hostnames still resolving
+        then are left unresolved.
+        """
+        def resolve(hostname):
+            try:
+                self._resolve(hostname)
+            except OSError:
+                pass
+
+        hostnames = [hostname for hostname in dict.fromkeys(hostnames)
+                     if not self.fresh(hostname) and literal_addrinfo(hostname, 0) is None]
+        if not hostnames:
+            return {}
+        mark = self.mark()
+        if self.resolvers and deadline is not None:
+            try:
+                asyncio.run(asyncio.wait_for(self._query(hostnames), max(deadline - time.monotonic(), 0)))
+            except asyncio.TimeoutError:
+                pass
+        elif self.resolvers:
+            asyncio.run(self._query(hostnames))
+        elif deadline is not None:
+            run_until([lambda hostname=hostname: resolve(hostname) for hostname in hostnames], deadline,
+                      max_workers=PREFETCH_WORKERS)
+        else:
+            with ThreadPoolExecutor(max_workers=min(PREFETCH_WORKERS, len(hostnames))) as executor:
+                list(executor.map(resolve, hostnames))
+        return {hostname: (self.resolutions(hostname, mark) or [None])[-1] for hostname in hostnames}
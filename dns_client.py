@@ -0,0 +1,342 @@
+#!/usr/bin/env python3
+"""
+Async DNS Client
+
+Minimal asyncio UDP DNS client (RFC 1035) for comparing resolvers. getaddrinfo()
+blocks a thread and always asks the system resolver; this sends A/AAAA
+queries straight to one or more resolvers, concurrently, and reports each
+resolver's query latency, answers and record TTL. For anycast pools such as
+solo.atlaspool.io, different resolvers can return different PoPs.
+
+stratum_test.py --resolver uses it through DnsCache: pool hostnames are
+resolved against every configured resolver and the probes connect to the
+answer of the fastest resolver that returned one, cached for the record TTL.
+
+Usage:
+    # Command line
+    python3 dns_client.py solo.atlaspool.io --resolver 1.1.1.1 --resolver 8.8.8.8
+
+    # From Python
+    import asyncio
+    from dns_client import query_all
+
+    results = asyncio.run(query_all(["solo.atlaspool.io"], ["1.1.1.1", "9.9.9.9"]))
+    for r in results:
+        print(r['resolver'], r['qtype'], r['latency_ms'], r['addresses'])
+
+Requirements:
+  • Python 3.7+
+  • No external dependencies
+"""
+
+import sys
+import time
+import json
+import struct
+import socket
+import secrets
+import asyncio
+import argparse
+import ipaddress
+from statistics import median
+from typing import Optional, Dict, List, Tuple, Iterable
+
+DNS_PORT = 53
+DEFAULT_TIMEOUT = 2.0
+
+QTYPES = {'A': 1, 'AAAA': 28}
+TYPE_CNAME = 5
+CLASS_IN = 1
+
+RCODES = {0: 'NOERROR', 1: 'FORMERR', 2: 'SERVFAIL', 3: 'NXDOMAIN', 4: 'NOTIMP', 5: 'REFUSED'}
+
+HEADER = struct.Struct('!HHHHHH')  # id, flags, qdcount, ancount, nscount, arcount
+
+
+def parse_resolver(spec: str) -> Tuple[str, int]:
+    """'1.1.1.1', '1.1.1.1:5353', '2606:4700::1111' or '[2606:4700::1111]:53' -> (ip, port)"""
+    spec = spec.strip()
+    if spec.startswith('['):
+        host, _, port = spec[1:].partition(']')
+        port = port.lstrip(':')
+    elif spec.count(':') == 1:
+        host, port = spec.split(':')
+    else:
+        host, port = spec, ''
+    ipaddress.ip_address(host)  # resolvers must be IP addresses (raises ValueError)
+    return host, int(port) if port else DNS_PORT
+
+
+def format_resolver(resolver: Tuple[str, int]) -> str:
+    host, port = resolver
+    return f"[{host}]:{port}" if ':' in host else f"{host}:{port}"
+
+
+def system_resolvers(path: str = '/etc/resolv.conf') -> List[str]:
+    """Nameservers configured in resolv.conf (empty on Windows or if unreadable)"""
+    resolvers = []
+    try:
+        with open(path) as f:
+            for line in f:
+                fields = line.split()
+                if len(fields) >= 2 and fields[0] == 'nameserver':
+                    resolvers.append(fields[1].split('%')[0])
+    except OSError:
+        pass
+    return resolvers
+
+
+def build_query(hostname: str, qtype: str, query_id: int) -> bytes:
+    """DNS query packet asking for qtype records of hostname, recursion desired"""
+    question = b''
+    for label in hostname.rstrip('.').split('.'):
+        encoded = label.encode('idna')
+        if not 0 < len(encoded) < 64:
+            raise ValueError(f"invalid hostname: {hostname}")
+        question += bytes([len(encoded)]) + encoded
+    question += b'\x00' + struct.pack('!HH', QTYPES[qtype], CLASS_IN)
+    return HEADER.pack(query_id, 0x0100, 1, 0, 0, 0) + question
+
+
+def _read_name(data: bytes, offset: int) -> Tuple[str, int]:
+    """Decode a possibly compressed name at offset; returns (name, offset after it)"""
+    labels = []
+    end = None
+    jumps = 0
+    while True:
+        length = data[offset]
+        if length & 0xC0 == 0xC0:
+            if end is None:
+                end = offset + 2
+            jumps += 1
+            if jumps > 32:
+                raise ValueError("compression loop")
+            offset = struct.unpack_from('!H', data, offset)[0] & 0x3FFF
+        elif length == 0:
+            return '.'.join(labels), end if end is not None else offset + 1
+        else:
+            labels.append(data[offset + 1:offset + 1 + length].decode('ascii', 'replace'))
+            offset += 1 + length
+
+
+def parse_response(data: bytes) -> Dict:
+    """
+    Parse a DNS response into id, rcode, truncated flag, the question name
+    and the answer records (name, type, ttl, data; data is the address for
+    A/AAAA and the target for CNAME).
+    """
+    query_id, flags, qdcount, ancount, _, _ = HEADER.unpack_from(data, 0)
+    offset = HEADER.size
+    question = None
+    for _ in range(qdcount):
+        name, offset = _read_name(data, offset)
+        question = question or name
+        offset += 4
+    records = []
+    for _ in range(ancount):
+        name, offset = _read_name(data, offset)
+        rtype, _, ttl, length = struct.unpack_from('!HHIH', data, offset)
+        offset += 10
+        rdata = data[offset:offset + length]
+        if rtype == QTYPES['A'] and length == 4:
+            value = socket.inet_ntop(socket.AF_INET, rdata)
+        elif rtype == QTYPES['AAAA'] and length == 16:
+            value = socket.inet_ntop(socket.AF_INET6, rdata)
+        elif rtype == TYPE_CNAME:
+            value = _read_name(data, offset)[0]
+        else:
+            value = None
+        records.append({'name': name, 'type': rtype, 'ttl': ttl, 'data': value})
+        offset += length
+    return {
+        'id': query_id,
+        'response': bool(flags & 0x8000),
+        'rcode': flags & 0x000F,
+        'truncated': bool(flags & 0x0200),
+        'question': question,
+        'records': records
+    }
+
+
+class _QueryProtocol(asyncio.DatagramProtocol):
+    """Waits for the response matching one query id and question"""
+
+    def __init__(self, query_id: int, hostname: str, future: asyncio.Future):
+        self.query_id = query_id
+        self.hostname = hostname.rstrip('.').lower()
+        self.future = future
+
+    def datagram_received(self, data, addr):
+        try:
+            response = parse_response(data)
+        except (ValueError, IndexError, struct.error):
+            return  # Malformed - keep waiting for a valid answer
+        if (response['response'] and response['id'] == self.query_id
+                and (response['question'] or '').lower() == self.hostname and not self.future.done()):
+            self.future.set_result(response)
+
+    def error_received(self, exc):
+        if not self.future.done():
+            self.future.set_exception(exc)
+
+
+async def query(hostname: str, qtype: str = 'A', resolver=('127.0.0.1', DNS_PORT),
+                timeout: float = DEFAULT_TIMEOUT) -> Dict:
+    """
+    Send one qtype query for hostname to resolver ((ip, port) or 'ip[:port]').
+    Never raises: failures are reported in 'error'.
+
+    Returns dict with hostname, qtype, resolver, latency_ms, rcode,
+    addresses (answers of qtype, CNAMEs followed), ttl (lowest TTL of those
+    answers), cname (chain) and error (None if the resolver answered).
+    """
+    if isinstance(resolver, str):
+        resolver = parse_resolver(resolver)
+    result = {
+        'hostname': hostname,
+        'qtype': qtype,
+        'resolver': format_resolver(resolver),
+        'latency_ms': None,
+        'rcode': None,
+        'addresses': [],
+        'ttl': None,
+        'cname': [],
+        'error': None
+    }
+    loop = asyncio.get_event_loop()
+    transport = None
+    try:
+        query_id = secrets.randbits(16)
+        packet = build_query(hostname, qtype, query_id)
+        future = loop.create_future()
+        family = socket.AF_INET6 if ':' in resolver[0] else socket.AF_INET
+        transport, _ = await loop.create_datagram_endpoint(
+            lambda: _QueryProtocol(query_id, hostname, future), remote_addr=resolver, family=family)
+        start = time.perf_counter()
+        transport.sendto(packet)
+        response = await asyncio.wait_for(future, timeout)
+        result['latency_ms'] = (time.perf_counter() - start) * 1000
+    except asyncio.TimeoutError:
+        result['error'] = "Timeout"
+        return result
+    except (OSError, ValueError) as e:
+        result['error'] = str(e) or type(e).__name__
+        return result
+    finally:
+        if transport is not None:
+            transport.close()
+
+    result['rcode'] = RCODES.get(response['rcode'], str(response['rcode']))
+    if response['rcode'] != 0:
+        result['error'] = result['rcode']
+        return result
+
+    # Follow the CNAME chain from the question name to the address records
+    name = hostname.rstrip('.').lower()
+    for _ in range(16):
+        targets = [r['data'] for r in response['records']
+                   if r['type'] == TYPE_CNAME and r['name'].lower() == name and r['data']]
+        if not targets:
+            break
+        result['cname'].append(targets[0])
+        name = targets[0].lower()
+    answers = [r for r in response['records'] if r['type'] == QTYPES[qtype] and r['data']
+               and r['name'].lower() == name]
+    result['addresses'] = [r['data'] for r in answers]
+    result['ttl'] = min((r['ttl'] for r in answers), default=None)
+    if response['truncated'] and not answers:
+        result['error'] = "Truncated response"
+    return result
+
+
+async def query_all(hostnames: Iterable[str], resolvers: Iterable, qtypes: Iterable[str] = ('A', 'AAAA'),
+                    timeout: float = DEFAULT_TIMEOUT) -> List[Dict]:
+    """Query every hostname for every qtype against every resolver, all at once"""
+    resolvers = [parse_resolver(r) if isinstance(r, str) else r for r in resolvers]
+    queries = [query(hostname, qtype, resolver, timeout)
+               for hostname in dict.fromkeys(hostnames) for resolver in resolvers for qtype in qtypes]
+    return list(await asyncio.gather(*queries))
+
+
+def choose_answer(results: List[Dict], hostname: str, qtype: str = 'A') -> Optional[Dict]:
+    """Fastest query result for hostname/qtype that returned addresses (None if none did)"""
+    answered = [r for r in results if r['hostname'] == hostname and r['qtype'] == qtype and r['addresses']]
+    return min(answered, key=lambda r: r['latency_ms'], default=None)
+
+
+def resolver_summary(results: List[Dict]) -> List[Dict]:
+    """Per resolver: queries sent, answered (no error), median and max latency in ms"""
+    summary = {}
+    for r in results:
+        stats = summary.setdefault(r['resolver'], {'resolver': r['resolver'], 'queries': 0, 'answered': 0,
+                                                   'latencies': []})
+        stats['queries'] += 1
+        if r['error'] is None:
+            stats['answered'] += 1
+        if r['latency_ms'] is not None:
+            stats['latencies'].append(r['latency_ms'])
+    rows = []
+    for stats in summary.values():
+        latencies = stats.pop('latencies')
+        stats['median_ms'] = median(latencies) if latencies else None
+        stats['max_ms'] = max(latencies) if latencies else None
+        rows.append(stats)
+    return rows
+
+
+def answer_differences(results: List[Dict], qtype: str = 'A') -> Dict[str, Dict[str, List[str]]]:
+    """Hostnames whose qtype answers differ between resolvers: {hostname: {resolver: addresses}}"""
+    answers = {}
+    for r in results:
+        if r['qtype'] == qtype and r['addresses']:
+            answers.setdefault(r['hostname'], {})[r['resolver']] = sorted(r['addresses'])
+    return {hostname: by_resolver for hostname, by_resolver in answers.items()
+            if len({tuple(a) for a in by_resolver.values()}) > 1}
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(
+        description='Query A/AAAA records of hostnames against several DNS resolvers concurrently',
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+Examples:
+  python3 dns_client.py solo.atlaspool.io --resolver 1.1.1.1 --resolver 8.8.8.8
+  python3 dns_client.py solo.atlaspool.io solo.ckpool.org --resolver 9.9.9.9 --json
+        """
+    )
+    parser.add_argument('hostname', nargs='+')
+    parser.add_argument('--resolver', action='append', metavar='IP[:PORT]',
+                        help='Resolver to query (repeatable; default: nameservers in /etc/resolv.conf)')
+    parser.add_argument('--timeout', type=float, default=DEFAULT_TIMEOUT, help='Seconds per query (default: 2)')
+    parser.add_argument('--json', action='store_true', help='Output JSON')
+    args = parser.parse_args()
+
+    resolvers = args.resolver or system_resolvers()
+    if not resolvers:
+        print("Error: no resolvers configured (use --resolver)", file=sys.stderr)
+        return 1
+    try:
+        resolvers = [parse_resolver(r) for r in resolvers]
+    except ValueError as e:
+        print(f"Error: invalid resolver: {e}", file=sys.stderr)
+        return 1
+
+    results = asyncio.run(query_all(args.hostname, resolvers, timeout=args.timeout))
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return 0
+
+    for r in results:
+        latency = f"{r['latency_ms']:.1f} ms" if r['latency_ms'] is not None else "-"
+        answer = ', '.join(r['addresses']) or r['error'] or 'no records'
+        ttl = f" (TTL {r['ttl']}s)" if r['ttl'] is not None else ""
+        print(f"{r['hostname']:<28} {r['qtype']:<4} {r['resolver']:<24} {latency:>10}  {answer}{ttl}")
+    for hostname, by_resolver in answer_differences(results).items():
+        print(f"\n{hostname}: resolvers disagree")
+        for resolver, addresses in by_resolver.items():
+            print(f"  {resolver:<24} {', '.join(addresses)}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
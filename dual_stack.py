@@ -0,0 +1,354 @@
+#!/usr/bin/env python3
+"""
+Dual-Stack Connect
+
+IPv4/IPv6 helpers for the tools in this repository, and a Happy Eyeballs
+(RFC 8305) connection race that shows which address family a dual-stack
+client would actually use to reach a pool, and by how much it wins.
+
+happy_eyeballs() resolves both families, orders the addresses IPv6 first
+and alternating families (RFC 8305 section 4), and starts one connection
+attempt every CONNECTION_ATTEMPT_DELAY seconds (sooner when an attempt
+fails) until one connects. That attempt's family is the winner. Because the
+IPv6 head start means a winning family is not necessarily the faster one,
+the first address of the other family is then connected on its own, and
+the result carries both families' TCP connect times and the margin between
+them.
+
+Usage:
+    import dual_stack
+
+    addresses = dual_stack.family_addresses("solo.atlaspool.io")  # {AF_INET: ..., AF_INET6: ...}
+    race = dual_stack.happy_eyeballs("solo.atlaspool.io", 3333)
+    print(race['winner'], race['margin_ms'])
+
+    # Command line
+    python3 dual_stack.py solo.atlaspool.io 3333 --runs 5
+
+Requirements:
+  • Python 3.6+
+  • No external dependencies
+"""
+
+import socket
+import select
+import errno
+import json
+import sys
+import argparse
+from statistics import median
+from typing import Optional, Dict, List, Tuple
+
+from stratum_client import now_ns
+from probe_scheduler import run_until
+
+# RFC 8305 recommended delay between connection attempts (seconds)
+CONNECTION_ATTEMPT_DELAY = 0.25
+
+FAMILY_LABELS = {socket.AF_INET: 'IPv4', socket.AF_INET6: 'IPv6'}
+
+
+def family_label(family: int) -> str:
+    """'IPv4' / 'IPv6' for a socket family ('any' for AF_UNSPEC)"""
+    return FAMILY_LABELS.get(family, 'any')
+
+
+def address_family(address: str) -> int:
+    """Socket family of an IP address string"""
+    return socket.AF_INET6 if ':' in address else socket.AF_INET
+
+
+def resolve(host: str, port: int, family: int = socket.AF_UNSPEC) -> List[Tuple]:
+    """getaddrinfo() for TCP, without duplicate addresses (raises socket.gaierror)"""
+    infos = socket.getaddrinfo(host, port, family, socket.SOCK_STREAM)
+    seen = set()
+    unique = []
+    for info in infos:
+        if info[4][0] not in seen:
+            seen.add(info[4][0])
+            unique.append(info)
+    return unique
+
+
+def family_addresses(host: str) -> Dict[int, str]:
+    """First IPv4 and first IPv6 address of host ({} if it does not resolve)"""
+    try:
+        infos = resolve(host, 0)
+    except OSError:
+        return {}
+    addresses = {}
+    for family, _, _, _, sockaddr in infos:
+        addresses.setdefault(family, sockaddr[0])
+    return addresses
+
+
+def split_families(host: str) -> List[Tuple[str, str]]:
+    """
+    [('IPv4', address), ('IPv6', address)] for the first address of each
+    family host resolves to (only the families it has; [] if it does not
+    resolve), for tools that probe a pool once per family
+    """
+    addresses = family_addresses(host)
+    return [(FAMILY_LABELS[family], addresses[family]) for family in (socket.AF_INET, socket.AF_INET6)
+            if family in addresses]
+
+
+def split_pools(pools: List[Tuple], host_index: int = 0, name_index: int = 2,
+                deadline: Optional[float] = None) -> Tuple[List[Tuple], Dict[str, Tuple[str, str]]]:
+    """
+    Split every pool tuple into one entry per address family (--dual-stack
+    in pool-mempool.py and findings/prevhash_timeline.py): the host at
+    host_index becomes its first IPv4 / first IPv6 address and the name at
+    name_index "<name> (IPv4)" / "<name> (IPv6)". Returns the entries and a
+    map of entry name -> (pool name, family label). Pools that do not
+    resolve are kept as they are. With deadline (a time.monotonic() value),
+    hosts are resolved concurrently and those still resolving then are
+    kept as they are too.
+    """
+    if deadline is None:
+        resolved = {index: split_families(pool[host_index]) for index, pool in enumerate(pools)}
+    else:
+        resolved = run_until([lambda host=pool[host_index]: split_families(host) for pool in pools], deadline)
+
+    expanded = []
+    families = {}
+    for index, pool in enumerate(pools):
+        addresses = resolved.get(index)
+        if not addresses:
+            expanded.append(pool)
+            continue
+        for label, address in addresses:
+            entry = list(pool)
+            entry[host_index] = address
+            entry[name_index] = f"{pool[name_index]} ({label})"
+            expanded.append(tuple(entry))
+            families[entry[name_index]] = (pool[name_index], label)
+    return expanded, families
+
+
+def interleave(infos: List[Tuple]) -> List[Tuple]:
+    """
+    Order addrinfo tuples for Happy Eyeballs: IPv6 first, then alternating
+    families, keeping getaddrinfo() order within a family (RFC 8305 section 4).
+    """
+    v6 = [info for info in infos if info[0] == socket.AF_INET6]
+    v4 = [info for info in infos if info[0] != socket.AF_INET6]
+    ordered = []
+    for index in range(max(len(v6), len(v4))):
+        ordered.extend(family_list[index] for family_list in (v6, v4) if index < len(family_list))
+    return ordered
+
+
+def connect_time(sockaddr: Tuple, family: int, timeout: float = 5) -> Tuple[Optional[float], Optional[str]]:
+    """TCP connect time (ms) to one address, or (None, error)"""
+    sock = socket.socket(family, socket.SOCK_STREAM)
+    sock.settimeout(timeout)
+    try:
+        start = now_ns()
+        sock.connect(sockaddr)
+        return (now_ns() - start) / 1e6, None
+    except socket.timeout:
+        return None, "Timeout"
+    except OSError as e:
+        return None, e.strerror or str(e)
+    finally:
+        sock.close()
+
+
+def _race(ordered: List[Tuple], timeout: float, attempt_delay: float) -> Tuple[Optional[socket.socket], List[Dict]]:
+    """
+    Staggered non-blocking connection attempts over ordered addrinfo tuples.
+    Returns (connected socket of the first attempt to succeed or None, attempts).
+    Every attempt dict has family, address, started_ms (since the race began),
+    connect_ms (its own handshake time) and error.
+    """
+    start = now_ns()
+    deadline = start + int(timeout * 1e9)
+    next_start = start
+    attempts = []
+    pending = {}  # socket -> attempt
+    index = 0
+    winner = None
+
+    try:
+        while winner is None:
+            now = now_ns()
+            if index < len(ordered) and (now >= next_start or not pending):
+                family, socktype, proto, _, sockaddr = ordered[index]
+                index += 1
+                attempt = {'family': family, 'address': sockaddr[0], 'started_ms': (now - start) / 1e6,
+                           'connect_ms': None, 'error': None, '_start': now}
+                attempts.append(attempt)
+                sock = socket.socket(family, socktype, proto)
+                sock.setblocking(False)
+                code = sock.connect_ex(sockaddr)
+                if code in (0, errno.EINPROGRESS, errno.EWOULDBLOCK):
+                    pending[sock] = attempt
+                else:
+                    attempt['error'] = errno.errorcode.get(code, str(code))
+                    sock.close()
+                    next_start = now  # a failed attempt starts the next one right away
+                    continue
+                next_start = now + int(attempt_delay * 1e9)
+            if not pending:
+                break
+
+            wait_until = deadline if index >= len(ordered) else min(deadline, next_start)
+            remaining = (wait_until - now_ns()) / 1e9
+            if remaining <= 0 and now_ns() >= deadline:
+                break
+            _, writable, _ = select.select([], list(pending), [], max(remaining, 0))
+            done = now_ns()
+            for sock in writable:
+                attempt = pending.pop(sock)
+                code = sock.getsockopt(socket.SOL_SOCKET, socket.SO_ERROR)
+                if code == 0 and winner is None:
+                    attempt['connect_ms'] = (done - attempt['_start']) / 1e6
+                    winner = sock
+                    continue
+                attempt['error'] = errno.errorcode.get(code, str(code)) if code else "Cancelled"
+                sock.close()
+                next_start = done
+    finally:
+        for sock, attempt in pending.items():
+            attempt['error'] = attempt['error'] or ("Cancelled" if winner is not None else "Timeout")
+            sock.close()
+        for attempt in attempts:
+            del attempt['_start']
+
+    if winner is not None:
+        winner.setblocking(True)
+    return winner, attempts
+
+
+def happy_eyeballs(host: str, port: int, timeout: float = 5,
+                   attempt_delay: float = CONNECTION_ATTEMPT_DELAY,
+                   addresses: Optional[List[str]] = None) -> Dict:
+    """
+    Race connections to every address of host:port the Happy Eyeballs way.
+    addresses, if given, are raced instead of resolving host (e.g. the
+    answers of specific DNS resolvers).
+
+    Returns a dict with 'winner' ('IPv4', 'IPv6' or None), 'address' (the
+    winning address), 'time_to_connect_ms' (from the first attempt, so it
+    includes any attempt delay), 'connect_ms' ({'IPv4': ms, 'IPv6': ms}, the
+    TCP handshake time of each family's first address), 'margin_ms' (the
+    other family's connect time minus the winner's: negative when the winner
+    was slower but won on its head start), 'attempts' and 'error'.
+    """
+    result = {
+        'host': host,
+        'port': port,
+        'winner': None,
+        'address': None,
+        'time_to_connect_ms': None,
+        'connect_ms': {},
+        'margin_ms': None,
+        'attempts': [],
+        'error': None
+    }
+    if addresses is not None:
+        infos = interleave([(address_family(address), socket.SOCK_STREAM, socket.IPPROTO_TCP, '',
+                             (address, port, 0, 0) if ':' in address else (address, port))
+                            for address in addresses])
+    else:
+        try:
+            infos = interleave(resolve(host, port))
+        except socket.gaierror as e:
+            result['error'] = f"DNS resolution failed: {e.strerror or e}"
+            return result
+
+    sock, attempts = _race(infos, timeout, attempt_delay)
+    result['attempts'] = [dict(attempt, family=family_label(attempt['family'])) for attempt in attempts]
+    if sock is None:
+        result['error'] = next((a['error'] for a in reversed(attempts) if a['error']), "No address")
+        return result
+    sock.close()
+
+    won = next(attempt for attempt in attempts if attempt['connect_ms'] is not None)
+    result['winner'] = family_label(won['family'])
+    result['address'] = won['address']
+    result['time_to_connect_ms'] = won['started_ms'] + won['connect_ms']
+    result['connect_ms'][result['winner']] = won['connect_ms']
+
+    # The race cancels the other family; time its first address on its own
+    other = next((info for info in infos if info[0] != won['family']), None)
+    if other is not None:
+        other_ms, _ = connect_time(other[4], other[0], timeout)
+        if other_ms is not None:
+            result['connect_ms'][family_label(other[0])] = other_ms
+            result['margin_ms'] = other_ms - won['connect_ms']
+    return result
+
+
+def summarize_races(races: List[Dict]) -> Dict:
+    """Wins per family and median connect times and margin over several races"""
+    wins = {'IPv4': 0, 'IPv6': 0}
+    connect = {'IPv4': [], 'IPv6': []}
+    margins = []
+    for race in races:
+        if race['winner']:
+            wins[race['winner']] += 1
+        for label, ms in race['connect_ms'].items():
+            connect[label].append(ms)
+        if race['margin_ms'] is not None:
+            margins.append(race['margin_ms'])
+    winner = max(wins, key=wins.get) if any(wins.values()) else None
+    return {
+        'races': len(races),
+        'wins': wins,
+        'winner': winner,
+        'connect_median_ms': {label: median(times) if times else None for label, times in connect.items()},
+        'margin_median_ms': median(margins) if margins else None,
+        'errors': [race['error'] for race in races if race['error']]
+    }
+
+
+def describe_summary(summary: Dict) -> str:
+    """One-line text for a summarize_races() result"""
+    if summary['winner'] is None:
+        return f"no connection ({summary['errors'][0] if summary['errors'] else 'no address'})"
+    v4, v6 = summary['connect_median_ms']['IPv4'], summary['connect_median_ms']['IPv6']
+    text = f"{summary['winner']} wins {summary['wins'][summary['winner']]}/{summary['races']}"
+    if v4 is None or v6 is None:
+        return text + f" ({'IPv6' if v4 is None else 'IPv4'} only)"
+    text += f", connect IPv4 {v4:.1f} ms / IPv6 {v6:.1f} ms"
+    margin = summary['margin_median_ms']
+    if margin is not None and margin >= 0:
+        text += f", {summary['winner']} faster by {margin:.1f} ms"
+    elif margin is not None:
+        text += f", {summary['winner']} slower by {-margin:.1f} ms but wins on the head start"
+    return text
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Happy Eyeballs (RFC 8305) IPv4/IPv6 connection race to a host')
+    parser.add_argument('host', help='Hostname with A and AAAA records')
+    parser.add_argument('port', type=int, help='TCP port')
+    parser.add_argument('--runs', type=int, default=3, help='Races to run (default: 3)')
+    parser.add_argument('--delay', type=float, default=CONNECTION_ATTEMPT_DELAY,
+                        help=f'Connection attempt delay in seconds (default: {CONNECTION_ATTEMPT_DELAY})')
+    parser.add_argument('--timeout', type=float, default=5, help='Seconds per race (default: 5)')
+    parser.add_argument('--json', action='store_true', help='Output races and summary as JSON')
+    args = parser.parse_args()
+
+    races = [happy_eyeballs(args.host, args.port, args.timeout, args.delay) for _ in range(args.runs)]
+    summary = summarize_races(races)
+    if args.json:
+        print(json.dumps({'races': races, 'summary': summary}, indent=2))
+        return
+
+    for number, race in enumerate(races, 1):
+        if race['error']:
+            print(f"Race {number}: {race['error']}")
+            continue
+        times = ", ".join(f"{label} {ms:.1f} ms" for label, ms in sorted(race['connect_ms'].items()))
+        print(f"Race {number}: {race['winner']} {race['address']} in {race['time_to_connect_ms']:.1f} ms "
+              f"(connect {times})")
+    print(f"{args.host}:{args.port}: {describe_summary(summary)}")
+    if summary['winner'] is None:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
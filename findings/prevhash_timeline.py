@@ -6,15 +6,42 @@ Captures prevhash from all pools at 30-second intervals for 11 minutes,
 then displays a table showing how prevhashes changed over time.
 
 This definitively shows which pools update to new blocks and which don't.
+
+Pass --history (or --history=PATH) to also record every snapshot in the
+local history database (see history_db.py). --metrics=[HOST:]PORT serves
+prevhash agreement to Prometheus while the timeline runs, and
+--influx-file=PATH appends it in InfluxDB line protocol.
+
+-6 connects to the pools over IPv6. --dual-stack follows every pool over
+both IPv4 and IPv6 (as "<pool> (IPv4)" / "<pool> (IPv6)") and reports how
+often the two families saw different prevhashes, and their job times.
+
+--deadline=SECONDS bounds the whole run: no snapshot starts after it, pools
+that have not sent a job by then are marked TIMEOUT, and the tables are
+printed from the snapshots collected so far.
 """
 
+import os
+import sys
 import socket
-import json
 import time
-import threading
-from typing import Dict, List, Tuple
+from statistics import median
+from typing import Dict, List, Tuple, Optional
 from datetime import datetime
 
+# The shared stratum client lives in the repository root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from stratum_client import StratumClient
+from probe_scheduler import ProbeScheduler
+from history_db import HistoryStore, HistoryRun, DEFAULT_HISTORY_PATH
+from stratum_test import client_info
+from metrics_exporter import Exporter
+import dual_stack
+
+# Error of pools still waiting for a job at the --deadline
+DEADLINE_ERROR = 'TIMEOUT'
+
 
 def prevhash_to_block_hash(prevhash: str) -> str:
     """
@@ -58,75 +85,37 @@ def load_pools(filename: str = 'pools.txt') -> List[Tuple[str, int, str]]:
     return pools
 
 
-def get_prevhash(host: str, port: int, address: str, timeout: int = 10) -> Dict:
+def get_prevhash(host: str, port: int, address: str, timeout: int = 10, family: int = socket.AF_INET) -> Dict:
     """
-    Connect to a pool and get the first prevhash
+    Connect to a pool (over family) and get the first prevhash.
+    time_ms is the time from connecting to the first job.
     """
     result = {
         'host': host,
         'port': port,
         'prevhash': None,
         'merkle_branches': None,
+        'time_ms': None,
         'error': None
     }
     
-    sock = None
+    client = StratumClient(host, port, timeout, family)
     
     try:
-        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        sock.settimeout(timeout)
-        
         # Connect
-        sock.connect((host, port))
-        
-        # Subscribe
-        subscribe_msg = json.dumps({
-            'id': 1,
-            'method': 'mining.subscribe',
-            'params': ['PrevhashTimeline/1.0', None, host, port]
-        }) + '\n'
-        sock.sendall(subscribe_msg.encode('utf-8'))
-        
-        # Authorize
-        authorize_msg = json.dumps({
-            'id': 2,
-            'method': 'mining.authorize',
-            'params': [address, 'x']
-        }) + '\n'
-        sock.sendall(authorize_msg.encode('utf-8'))
+        start = time.time()
+        client.connect()
         
-        # Read responses
-        buffer = ""
-        start_time = time.time()
+        # Subscribe and authorize without waiting in between
+        client.send('mining.subscribe', ['PrevhashTimeline/1.0', None, host, port])
+        client.send('mining.authorize', [address, 'x'])
         
-        while time.time() - start_time < timeout:
-            try:
-                chunk = sock.recv(4096).decode('utf-8')
-                if not chunk:
-                    break
-                    
-                buffer += chunk
-                
-                while '\n' in buffer:
-                    line, buffer = buffer.split('\n', 1)
-                    if line.strip():
-                        try:
-                            data = json.loads(line)
-                            
-                            # Check for mining.notify (job with prevhash)
-                            if data.get('method') == 'mining.notify':
-                                params = data.get('params', [])
-                                if len(params) >= 9:
-                                    result['prevhash'] = params[1]
-                                    result['merkle_branches'] = len(params[4])
-                                    sock.close()
-                                    return result
-                        
-                        except json.JSONDecodeError:
-                            pass
-            
-            except socket.timeout:
-                break
+        # Wait for mining.notify (job with prevhash)
+        params = client.wait_for_notify(timeout)
+        if params and len(params) >= 9:
+            result['prevhash'] = params[1]
+            result['merkle_branches'] = len(params[4])
+            result['time_ms'] = (time.time() - start) * 1000
         
         if result['prevhash'] is None:
             result['error'] = 'No job'
@@ -138,42 +127,59 @@ def get_prevhash(host: str, port: int, address: str, timeout: int = 10) -> Dict:
     except Exception as e:
         result['error'] = str(e)[:20]
     finally:
-        if sock:
-            try:
-                sock.close()
-            except:
-                pass
+        client.close()
     
     return result
 
 
-def snapshot_all_pools(pools: List[Tuple[str, int, str]], address: str) -> Dict:
+def timed_out_prevhash(host: str, port: int, name: str) -> Tuple[str, Dict]:
+    """Snapshot entry of a pool still waiting for a job at the --deadline"""
+    return name, {
+        'host': host,
+        'port': port,
+        'prevhash': None,
+        'merkle_branches': None,
+        'time_ms': None,
+        'error': DEADLINE_ERROR
+    }
+
+
+def snapshot_all_pools(pools: List[Tuple[str, int, str]], address: str,
+                       scheduler: Optional[ProbeScheduler] = None, family: int = socket.AF_INET,
+                       deadline: Optional[float] = None) -> Dict:
     """
-    Connect to all pools simultaneously and capture prevhash
+    Connect to all pools simultaneously (over family) and capture prevhash.
+    Connections go through scheduler (per-pool rate limit, global in-flight cap).
+    With deadline (a time.monotonic() value), pools without a job by then
+    are abandoned and get a TIMEOUT entry.
     """
-    results = {}
-    threads = []
-    
-    # Start all connections in parallel
-    def worker(host, port, name):
-        results[name] = get_prevhash(host, port, address)
-    
-    for host, port, name in pools:
-        thread = threading.Thread(target=worker, args=(host, port, name))
-        thread.start()
-        threads.append(thread)
-    
-    # Wait for all to complete
-    for thread in threads:
-        thread.join()
-    
-    return results
+    if scheduler is None:
+        scheduler = ProbeScheduler(max_in_flight=len(pools))
+    
+    snapshots = scheduler.map(
+        lambda host, port, name: (name, get_prevhash(host, port, address, family=family)),
+        pools,
+        key=lambda pool: pool[0],
+        error_of=lambda snapshot: snapshot[1]['error'],
+        deadline=deadline,
+        on_timeout=timed_out_prevhash
+    )
+    return dict(snapshots)
 
 
 def collect_timeline(pools: List[Tuple[str, int, str]], address: str, 
-                     num_snapshots: int = 22, interval: int = 30) -> List[Dict]:
+                     num_snapshots: int = 22, interval: int = 30,
+                     history_run: Optional[HistoryRun] = None,
+                     exporter: Optional[Exporter] = None,
+                     family: int = socket.AF_INET,
+                     deadline: Optional[float] = None) -> List[Dict]:
     """
     Collect prevhash snapshots over time
+    If history_run is given, every snapshot is also recorded there, and
+    exporter (if given) publishes each snapshot's prevhash agreement.
+    Pools given by hostname are connected to over family.
+    With deadline (a time.monotonic() value), collection stops there and
+    returns the snapshots taken so far.
     """
     timeline = []
     
@@ -184,25 +190,39 @@ def collect_timeline(pools: List[Tuple[str, int, str]], address: str,
     print(f"Monitoring {len(pools)} pools")
     print(f"Snapshots: {num_snapshots} (every {interval} seconds)")
     print(f"Total duration: {num_snapshots * interval / 60:.1f} minutes")
+    if deadline is not None:
+        print(f"Deadline: {deadline - time.monotonic():.0f} seconds")
     print(f"Address: {address}")
     print()
     
+    # Shared across snapshots so per-pool rate limits carry over
+    scheduler = ProbeScheduler(max_in_flight=len(pools))
     start_time = time.time()
     
     for i in range(num_snapshots):
+        if deadline is not None and time.monotonic() >= deadline:
+            print(f"Deadline reached after {i} of {num_snapshots} snapshots")
+            break
         snapshot_num = i + 1
         elapsed = time.time() - start_time
         timestamp = datetime.now().strftime("%H:%M:%S")
         
         print(f"[{timestamp}] Snapshot {snapshot_num}/{num_snapshots} (T+{elapsed:.0f}s)...", end='', flush=True)
         
-        results = snapshot_all_pools(pools, address)
+        results = snapshot_all_pools(pools, address, scheduler, family, deadline)
+        if history_run is not None:
+            for name, result in results.items():
+                history_run.record_prevhash(name, result)
+        if exporter is not None:
+            exporter.observe_prevhash_snapshot(results)
         
         # Count responses
         responding = sum(1 for r in results.values() if r['prevhash'])
         unique_prevhashes = len(set(r['prevhash'] for r in results.values() if r['prevhash']))
+        timed_out = sum(1 for r in results.values() if r['error'] == DEADLINE_ERROR)
+        timed_out_msg = f", {timed_out} TIMEOUT" if timed_out else ""
         
-        print(f" {responding}/{len(pools)} pools, {unique_prevhashes} unique prevhash(es)")
+        print(f" {responding}/{len(pools)} pools, {unique_prevhashes} unique prevhash(es){timed_out_msg}")
         
         timeline.append({
             'snapshot': snapshot_num,
@@ -211,9 +231,9 @@ def collect_timeline(pools: List[Tuple[str, int, str]], address: str,
             'results': results
         })
         
-        # Wait before next snapshot (except for last one)
+        # Wait before next snapshot (except for last one), but not past the deadline
         if snapshot_num < num_snapshots:
-            time.sleep(interval)
+            time.sleep(interval if deadline is None else min(interval, max(deadline - time.monotonic(), 0)))
     
     print()
     print("✓ Data collection complete!")
@@ -287,6 +307,8 @@ def display_timeline_table(timeline: List[Dict], pools: List[Tuple[str, int, str
                 ph_short = result['prevhash'][:8]
                 letter = prevhash_letters.get(ph_short, '?')
                 row += f"  {letter}"
+            elif result.get('error') == DEADLINE_ERROR:
+                row += f"  T"
             elif result.get('error'):
                 row += f"  -"
             else:
@@ -336,7 +358,7 @@ def display_timeline_table(timeline: List[Dict], pools: List[Tuple[str, int, str
         full_prevhash = None
         for snapshot in timeline:
             for result in snapshot['results'].values():
-                if result.get('prevhash', '')[:8] == ph_short:
+                if (result.get('prevhash') or '')[:8] == ph_short:
                     full_prevhash = result['prevhash']
                     break
             if full_prevhash:
@@ -351,6 +373,45 @@ def display_timeline_table(timeline: List[Dict], pools: List[Tuple[str, int, str
         print()
     
     print("  [-] No response / Error")
+    print("  [T] TIMEOUT (still waiting at the --deadline)")
+    print()
+
+
+def compare_families(timeline: List[Dict], families: Dict[str, Tuple[str, str]]):
+    """
+    Per pool, how often its IPv4 and IPv6 addresses served different
+    prevhashes in the same snapshot, and their median time to first job
+    """
+    pools = {}
+    for entry, (name, label) in families.items():
+        pools.setdefault(name, {})[label] = entry
+    pools = {name: entries for name, entries in pools.items() if len(entries) == 2}
+    if not pools:
+        return
+    
+    print("="*80)
+    print("IPV4 VS IPV6")
+    print("="*80)
+    print()
+    
+    for name in sorted(pools):
+        both = differ = 0
+        times = {'IPv4': [], 'IPv6': []}
+        for snapshot in timeline:
+            v4 = snapshot['results'].get(pools[name]['IPv4'], {})
+            v6 = snapshot['results'].get(pools[name]['IPv6'], {})
+            for label, result in (('IPv4', v4), ('IPv6', v6)):
+                if result.get('time_ms') is not None:
+                    times[label].append(result['time_ms'])
+            if v4.get('prevhash') and v6.get('prevhash'):
+                both += 1
+                differ += v4['prevhash'] != v6['prevhash']
+        
+        cells = [f"{label} {median(times[label]):.0f} ms" if times[label] else f"{label} N/A"
+                 for label in ('IPv4', 'IPv6')]
+        agreement = f"different prevhash in {differ}/{both} snapshots" if both else "never both answered"
+        print(f"  {name}: first job {', '.join(cells)}; {agreement}")
+    
     print()
 
 
@@ -449,15 +510,50 @@ def main():
     pools_file = 'pools.txt'  # Default
     num_snapshots = 22  # Default
     interval = 30  # Default (seconds)
+    history_path = None
+    metrics_listen = None
+    influx_file = None
+    family = socket.AF_INET
+    dual_stack_mode = False
+    deadline = None
+    
+    # --history[=PATH] records every snapshot in the history database;
+    # --metrics=[HOST:]PORT and --influx-file=PATH export prevhash agreement;
+    # -4/-6 pick the address family, --dual-stack follows both;
+    # --deadline=SECONDS bounds the whole run
+    argv = []
+    for arg in sys.argv[1:]:
+        if arg == '-4':
+            family = socket.AF_INET
+        elif arg == '-6':
+            family = socket.AF_INET6
+        elif arg == '--dual-stack':
+            dual_stack_mode = True
+        elif arg == '--history':
+            history_path = DEFAULT_HISTORY_PATH
+        elif arg.startswith('--history='):
+            history_path = arg.split('=', 1)[1]
+        elif arg.startswith('--metrics='):
+            metrics_listen = arg.split('=', 1)[1]
+        elif arg.startswith('--influx-file='):
+            influx_file = arg.split('=', 1)[1]
+        elif arg.startswith('--deadline='):
+            seconds = float(arg.split('=', 1)[1])
+            if seconds <= 0:
+                print("Error: --deadline must be positive")
+                return
+            deadline = time.monotonic() + seconds
+        else:
+            argv.append(arg)
     
-    if len(sys.argv) > 1:
-        address = sys.argv[1]
-    if len(sys.argv) > 2:
-        pools_file = sys.argv[2]
-    if len(sys.argv) > 3:
-        num_snapshots = int(sys.argv[3])
-    if len(sys.argv) > 4:
-        interval = int(sys.argv[4])
+    if len(argv) > 0:
+        address = argv[0]
+    if len(argv) > 1:
+        pools_file = argv[1]
+    if len(argv) > 2:
+        num_snapshots = int(argv[2])
+    if len(argv) > 3:
+        interval = int(argv[3])
     
     # Load pools
     pools = load_pools(pools_file)
@@ -466,12 +562,30 @@ def main():
         print(f"Error: No pools loaded from {pools_file}")
         return
     
+    families = {}
+    if dual_stack_mode:
+        pools, families = dual_stack.split_pools(pools, deadline=deadline)
+    
     # Collect timeline data
-    timeline = collect_timeline(pools, address, num_snapshots, interval)
+    history_store = None
+    history_run = None
+    if history_path:
+        history_store = HistoryStore(history_path)
+        history_run = history_store.start_run('prevhash_timeline', client_info())
+    exporter = Exporter(metrics_listen, influx_file) if metrics_listen or influx_file else None
+    try:
+        timeline = collect_timeline(pools, address, num_snapshots, interval, history_run, exporter, family,
+                                    deadline)
+    finally:
+        if history_store is not None:
+            history_store.close()
+        if exporter is not None:
+            exporter.close()
     
     # Display results
     display_timeline_table(timeline, pools)
     analyze_timeline(timeline, pools)
+    compare_families(timeline, families)
     
     print("="*80)
     print("CONCLUSION")
@@ -0,0 +1,377 @@
+#!/usr/bin/env python3
+"""
+Offline IP Geolocation Database
+
+Answers IP -> ASN / country / provider lookups from a local dataset instead
+of ip-api.com, for machines without internet access (or to avoid its rate
+limit). Used by stratum_test.py for the "Testing from" vantage details and
+to check the country codes of PREDEFINED_SERVERS against where each pool's
+addresses actually are.
+
+You supply the dataset as a CSV/TSV of IPv4 ranges, for example
+iptoasn.com's ip2asn-v4.tsv (start, end, ASN, country, description) or a
+DB-IP lite CSV (start, end, country or ASN). compile turns it into a binary
+index once: sorted uint32 arrays of range starts, ends, ASNs and string
+table offsets. The index is memory-mapped and searched by bisection, so
+opening it is instant and a lookup takes microseconds.
+
+Usage:
+    # Compile once (writes ~/.atlaspool_tools/ipgeo.idx by default)
+    python3 geo_db.py compile ip2asn-v4.tsv
+
+    # Look up addresses
+    python3 geo_db.py lookup 1.1.1.1 8.8.8.8
+
+    # Check the country codes of the predefined pools
+    python3 geo_db.py check-pools
+
+    # From Python
+    from geo_db import GeoIndex
+    with GeoIndex() as index:
+        print(index.lookup('1.1.1.1'))
+
+Once compiled, stratum_test.py uses the index for its ASN lookup
+automatically.
+
+Requirements:
+  • Python 3.6+
+  • No external dependencies
+"""
+
+import os
+import re
+import sys
+import csv
+import mmap
+import time
+import json
+import socket
+import struct
+import argparse
+import ipaddress
+from array import array
+from bisect import bisect_right
+from typing import Optional, Dict, List, Tuple
+
+DEFAULT_INDEX_PATH = os.path.join(os.path.expanduser('~'), '.atlaspool_tools', 'ipgeo.idx')
+
+MAGIC = b'APGEOv1\n'
+
+# magic, ranges, strings, string blob bytes
+HEADER = struct.Struct('<8sIII')
+
+# Per-range uint32 columns, stored one after another
+COLUMNS = ('starts', 'ends', 'asns', 'countries', 'providers')
+
+# Placeholder values some datasets use for "no data"
+EMPTY_VALUES = {'', 'none', 'unknown', '-', 'zz'}
+
+# PREDEFINED_SERVERS codes that are not ISO 3166 country codes
+COUNTRY_ALIASES = {'UK': 'GB'}
+
+
+def parse_ipv4(value: str) -> Optional[int]:
+    """IPv4 address (dotted or integer form) as an int, or None for anything else"""
+    value = value.strip()
+    if value.isdigit():
+        number = int(value)
+        return number if number < 2 ** 32 else None
+    try:
+        address = ipaddress.ip_address(value)
+    except ValueError:
+        return None
+    return int(address) if address.version == 4 else None
+
+
+def _classify_fields(fields: List[str]) -> Tuple[int, str, str]:
+    """ASN, country and provider from the columns after a range's start and end"""
+    asn, country, provider = None, None, None
+    for field in fields:
+        field = field.strip()
+        if field.lower() in EMPTY_VALUES:
+            continue
+        if asn is None and re.fullmatch(r'(?i)(AS)?\d+', field):
+            asn = int(field.upper().lstrip('AS'))
+        elif country is None and re.fullmatch(r'[A-Za-z]{2}', field):
+            country = field.upper()
+        elif provider is None:
+            provider = field
+    return asn or 0, country or '', provider or ''
+
+
+def read_ranges(csv_path: str) -> Tuple[List[Tuple[int, int, int, str, str]], int]:
+    """
+    Parse a CSV/TSV of IPv4 ranges into (start, end, asn, country, provider)
+    tuples sorted by start. Header, comment and IPv6 rows are skipped and
+    counted. The delimiter is a tab if the first line contains one.
+    """
+    rows = []
+    skipped = 0
+    with open(csv_path, newline='', encoding='utf-8', errors='replace') as f:
+        first = f.readline()
+        f.seek(0)
+        delimiter = '\t' if '\t' in first else ','
+        for fields in csv.reader(f, delimiter=delimiter):
+            if not fields or fields[0].startswith('#') or len(fields) < 3:
+                skipped += 1
+                continue
+            start, end = parse_ipv4(fields[0]), parse_ipv4(fields[1])
+            if start is None or end is None or end < start:
+                skipped += 1
+                continue
+            rows.append((start, end) + _classify_fields(fields[2:]))
+    rows.sort()
+    return rows, skipped
+
+
+def compile_csv(csv_path: str, index_path: str = DEFAULT_INDEX_PATH) -> Tuple[int, int]:
+    """Compile csv_path into a binary index at index_path; returns (ranges, skipped rows)"""
+    rows, skipped = read_ranges(csv_path)
+
+    strings = {'': 0}
+    columns = {name: array('I') for name in COLUMNS}
+    for start, end, asn, country, provider in rows:
+        columns['starts'].append(start)
+        columns['ends'].append(end)
+        columns['asns'].append(asn)
+        columns['countries'].append(strings.setdefault(country, len(strings)))
+        columns['providers'].append(strings.setdefault(provider, len(strings)))
+
+    blob = bytearray()
+    offsets = array('I', [0])
+    for text in strings:  # insertion order = string index
+        blob += text.encode('utf-8')
+        offsets.append(len(blob))
+
+    if sys.byteorder != 'little':
+        for column in list(columns.values()) + [offsets]:
+            column.byteswap()
+
+    directory = os.path.dirname(os.path.abspath(index_path))
+    os.makedirs(directory, exist_ok=True)
+    tmp_path = f"{index_path}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, len(rows), len(strings), len(blob)))
+        for name in COLUMNS:
+            f.write(columns[name].tobytes())
+        f.write(offsets.tobytes())
+        f.write(bytes(blob))
+    os.replace(tmp_path, index_path)
+    return len(rows), skipped
+
+
+class GeoIndex:
+    """Memory-mapped binary index written by compile_csv()"""
+
+    def __init__(self, path: str = DEFAULT_INDEX_PATH):
+        self.path = path
+        self._file = open(path, 'rb')
+        try:
+            self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:  # empty file
+            self._file.close()
+            raise ValueError(f"{path} is not a geo index")
+        if len(self._map) < HEADER.size:  # e.g. a truncated compile
+            self.close()
+            raise ValueError(f"{path} is not a geo index (recompile it with geo_db.py compile)")
+        magic, self.count, string_count, blob_size = HEADER.unpack_from(self._map, 0)
+        expected_size = HEADER.size + 4 * (len(COLUMNS) * self.count + string_count + 1) + blob_size
+        if magic != MAGIC or len(self._map) != expected_size:
+            self.close()
+            raise ValueError(f"{path} is not a geo index (recompile it with geo_db.py compile)")
+
+        offset = HEADER.size
+        self._views = []
+        for name in COLUMNS:
+            setattr(self, f'_{name}', self._column(offset, self.count))
+            offset += 4 * self.count
+        self._offsets = self._column(offset, string_count + 1)
+        self._blob_start = offset + 4 * (string_count + 1)
+
+    def _column(self, offset: int, length: int):
+        """uint32 column at offset, zero-copy where the byte order allows"""
+        raw = memoryview(self._map)[offset:offset + 4 * length]
+        if sys.byteorder == 'little' and array('I').itemsize == 4:
+            view = raw.cast('I')
+            self._views.extend([raw, view])
+            return view
+        column = array('I')
+        column.frombytes(raw.tobytes())
+        raw.release()
+        if sys.byteorder != 'little':
+            column.byteswap()
+        return column
+
+    def _string(self, index: int) -> Optional[str]:
+        start = self._blob_start + self._offsets[index]
+        end = self._blob_start + self._offsets[index + 1]
+        return self._map[start:end].decode('utf-8') or None
+
+    def lookup(self, ip: str) -> Optional[Dict]:
+        """{'asn': 'AS13335', 'country': 'US', 'provider': ...} for an IPv4 address, or None"""
+        number = parse_ipv4(ip)
+        if number is None:
+            return None
+        i = bisect_right(self._starts, number) - 1
+        if i < 0 or number > self._ends[i]:
+            return None
+        asn = self._asns[i]
+        return {
+            'asn': f"AS{asn}" if asn else None,
+            'country': self._string(self._countries[i]),
+            'provider': self._string(self._providers[i])
+        }
+
+    def close(self):
+        for view in reversed(getattr(self, '_views', [])):
+            view.release()
+        if getattr(self, '_map', None) is not None:
+            self._map.close()
+            self._map = None
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+_default_index = None
+
+
+def default_index() -> Optional[GeoIndex]:
+    """The index at DEFAULT_INDEX_PATH (opened once), or None if none was compiled"""
+    global _default_index
+    if _default_index is None:
+        try:
+            _default_index = GeoIndex(DEFAULT_INDEX_PATH)
+        except (OSError, ValueError):
+            _default_index = False
+    return _default_index or None
+
+
+def resolve_ipv4(hostname: str) -> List[str]:
+    """IPv4 addresses of hostname (empty if it does not resolve)"""
+    try:
+        infos = socket.getaddrinfo(hostname, None, socket.AF_INET, socket.SOCK_STREAM)
+    except OSError:
+        return []
+    return sorted({info[4][0] for info in infos})
+
+
+def check_pool_countries(servers: List[Tuple], index: GeoIndex) -> List[Dict]:
+    """
+    Geolocate the resolved addresses of each (hostname, port, tls_port,
+    display_name, country_code) server and compare them with its country
+    code. status is 'ok', 'mismatch', 'unknown' (not in the index),
+    'unresolved' or 'anycast' (country code '*MANY*', not checked).
+    """
+    checks = []
+    for hostname, port, _, display_name, country_code in servers:
+        addresses = []
+        for ip in resolve_ipv4(hostname):
+            entry = index.lookup(ip) or {}
+            addresses.append({'ip': ip, 'country': entry.get('country'), 'asn': entry.get('asn'),
+                              'provider': entry.get('provider')})
+        expected = COUNTRY_ALIASES.get(country_code, country_code)
+        countries = {a['country'] for a in addresses if a['country']}
+        if not addresses:
+            status = 'unresolved'
+        elif not country_code.isalpha():
+            status = 'anycast'
+        elif not countries:
+            status = 'unknown'
+        else:
+            status = 'ok' if countries == {expected} else 'mismatch'
+        checks.append({
+            'hostname': hostname,
+            'port': port,
+            'display_name': display_name,
+            'country_code': country_code,
+            'status': status,
+            'addresses': addresses
+        })
+    return checks
+
+
+def cmd_compile(args) -> int:
+    started = time.monotonic()
+    ranges, skipped = compile_csv(args.csv, args.index)
+    size = os.path.getsize(args.index)
+    print(f"Compiled {ranges} IPv4 ranges ({skipped} rows skipped) into {args.index} "
+          f"({size / 1e6:.1f} MB) in {time.monotonic() - started:.1f}s")
+    return 0
+
+
+def cmd_lookup(args) -> int:
+    with GeoIndex(args.index) as index:
+        for ip in args.ip:
+            started = time.perf_counter()
+            entry = index.lookup(ip)
+            elapsed_us = (time.perf_counter() - started) * 1e6
+            if entry is None:
+                print(f"{ip:<16} not found ({elapsed_us:.0f} µs)")
+            else:
+                print(f"{ip:<16} {entry['country'] or '??':<3} {entry['asn'] or '-':<10} "
+                      f"{entry['provider'] or ''} ({elapsed_us:.0f} µs)")
+    return 0
+
+
+def cmd_check_pools(args) -> int:
+    from stratum_test import PREDEFINED_SERVERS
+
+    with GeoIndex(args.index) as index:
+        checks = check_pool_countries(PREDEFINED_SERVERS, index)
+    if args.json:
+        print(json.dumps(checks, indent=2))
+        return 0
+
+    mismatches = 0
+    for check in checks:
+        found = ', '.join(f"{a['ip']} {a['country'] or '??'} {a['asn'] or ''}".strip()
+                          for a in check['addresses']) or '-'
+        marker = {'ok': '✓', 'mismatch': 'X', 'anycast': '*'}.get(check['status'], '?')
+        print(f"{marker} {check['display_name']:<18} {check['country_code']:<7} {check['status']:<10} {found}")
+        mismatches += check['status'] == 'mismatch'
+    print(f"\n{mismatches} of {len(checks)} pools have addresses outside their listed country")
+    return 1 if mismatches else 0
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(
+        description='Offline IPv4 -> ASN/country index for the atlaspool tools',
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+Examples:
+  python3 geo_db.py compile ip2asn-v4.tsv
+  python3 geo_db.py lookup 1.1.1.1 8.8.8.8
+  python3 geo_db.py check-pools
+        """
+    )
+    parser.add_argument('--index', default=DEFAULT_INDEX_PATH,
+                        help=f'Binary index path (default: {DEFAULT_INDEX_PATH})')
+    sub = parser.add_subparsers(dest='command')
+
+    compile_parser = sub.add_parser('compile', help='Compile a CSV/TSV of IPv4 ranges into the binary index')
+    compile_parser.add_argument('csv', help='start,end,[asn],[country],[provider] per line (iptoasn.com and DB-IP formats work)')
+
+    lookup_parser = sub.add_parser('lookup', help='Look up IPv4 addresses')
+    lookup_parser.add_argument('ip', nargs='+')
+
+    check_parser = sub.add_parser('check-pools', help="Check PREDEFINED_SERVERS country codes against their resolved IPs")
+    check_parser.add_argument('--json', action='store_true', help='Output JSON')
+
+    args = parser.parse_args()
+    if not args.command:
+        parser.print_help()
+        return 1
+    try:
+        return {'compile': cmd_compile, 'lookup': cmd_lookup, 'check-pools': cmd_check_pools}[args.command](args)
+    except (OSError, ValueError) as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,351 @@
+#!/usr/bin/env python3
+"""
+Probe History Store
+
+Optional local time-series database for the tools in this repository
+(stratum_test.py, pool-mempool.py and findings/prevhash_timeline.py), so
+results can be compared over days and weeks without re-probing.
+
+Every tool invocation with --history is one run, tagged with the vantage it
+was measured from (public IP, ASN, location, provider). Each sample row holds
+its timestamp, the pool, the metric (ping, tcp_rtt, stratum, tls,
+tls_resumed, template, fees_sats, block_height, prevhash), an optional phase
+(dns, connect, tls, first_byte, reply), the value in ms (or sats/height) and
+the outcome ('ok' or 'fail', with the error or prevhash in detail).
+
+The database is SQLite in WAL mode, so queries can run while a monitor is
+writing. Samples are indexed by pool and time, and by metric and time.
+
+Usage:
+    # Record
+    python3 stratum_test.py --history
+    python3 pool-mempool.py --history
+    python3 findings/prevhash_timeline.py --history
+
+    # Query
+    python3 history_db.py percentiles --metric stratum --pct 95 --days 7
+    python3 history_db.py compare --metric stratum
+    python3 history_db.py runs
+
+    # From Python
+    from history_db import HistoryStore
+    with HistoryStore() as store:
+        run = store.start_run('stratum_test', vantage)
+        run.record_stratum_result(result)
+
+Requirements:
+  • Python 3.6+
+  • No external dependencies
+"""
+
+import os
+import sys
+import time
+import sqlite3
+import argparse
+from typing import Optional, Dict, List, Tuple, Iterable
+
+from quantile_sketch import QuantileSketch, all_samples, sketch_of
+
+DEFAULT_HISTORY_PATH = os.path.join(os.path.expanduser('~'), '.atlaspool_tools', 'history.sqlite3')
+
+PHASES = ['dns', 'connect', 'tls', 'first_byte', 'reply']
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY,
+    tool TEXT NOT NULL,
+    started REAL NOT NULL,
+    vantage_ip TEXT,
+    vantage_asn TEXT,
+    vantage_location TEXT,
+    vantage_provider TEXT
+);
+CREATE TABLE IF NOT EXISTS samples (
+    id INTEGER PRIMARY KEY,
+    run_id INTEGER NOT NULL REFERENCES runs(id),
+    ts REAL NOT NULL,
+    pool TEXT NOT NULL,
+    display_name TEXT,
+    metric TEXT NOT NULL,
+    phase TEXT,
+    value REAL,
+    outcome TEXT NOT NULL,
+    detail TEXT
+);
+CREATE INDEX IF NOT EXISTS samples_pool_ts ON samples (pool, ts);
+CREATE INDEX IF NOT EXISTS samples_metric_ts ON samples (metric, ts);
+"""
+
+
+def pool_key(host: str, port: int) -> str:
+    return f"{host}:{port}"
+
+
+class HistoryRun:
+    """One recorded tool invocation; the record_* methods add its samples"""
+
+    def __init__(self, store: 'HistoryStore', run_id: int):
+        self.store = store
+        self.run_id = run_id
+
+    def add_samples(self, rows: Iterable[Tuple]):
+        """Insert (ts, pool, display_name, metric, phase, value, outcome, detail) rows"""
+        with self.store.conn:
+            self.store.conn.executemany(
+                "INSERT INTO samples (run_id, ts, pool, display_name, metric, phase, value, outcome, detail) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                [(self.run_id,) + tuple(row) for row in rows])
+
+    def record_stratum_result(self, result: Dict, ts: Optional[float] = None):
+        """Record a stratum_test.py result dict (ping, TCP RTT, stratum and TLS samples with phases)"""
+        ts = time.time() if ts is None else ts
+        pool = pool_key(result['hostname'], result['port'])
+        name = result['display_name']
+        rows = []
+
+        def add(metric, values, phase=None):
+            rows.extend((ts, pool, name, metric, phase, value, 'ok', None) for value in all_samples(values))
+
+        add('ping', result.get('ping_times') or [])
+        add('tcp_rtt', result.get('tcp_rtt_times') or [])
+        add('stratum', result['stratum_times'])
+        for phase in PHASES:
+            add('stratum', result.get('phase_times', {}).get(phase) or [], phase)
+        successes = sketch_of(result['stratum_times']).count
+        failures = result.get('runs', successes) - successes
+        rows.extend((ts, pool, name, 'stratum', None, None, 'fail', None) for _ in range(max(0, failures)))
+
+        if result.get('tls_port'):
+            add('tls', result.get('tls_times') or [])
+            add('tls_resumed', result.get('tls_resumed_times') or [])
+            for phase in PHASES:
+                add('tls', result.get('tls_phase_times', {}).get(phase) or [], phase)
+                add('tls_resumed', result.get('tls_resumed_phase_times', {}).get(phase) or [], phase)
+            rows.extend((ts, pool, name, 'tls', None, None, 'fail', error)
+                        for error in result.get('tls_errors') or [])
+        self.add_samples(rows)
+
+    def record_template_result(self, result: Dict, ts: Optional[float] = None):
+        """Record a pool-mempool.py test_pool() result (template time, fees, block height)"""
+        ts = time.time() if ts is None else ts
+        pool = pool_key(result['hostname'], result['port'])
+        name = result['display_name']
+        if not result['success']:
+            self.add_samples([(ts, pool, name, 'template', None, None, 'fail', result['error'])])
+            return
+        self.add_samples([
+            (ts, pool, name, 'template', None, result['response_time_ms'], 'ok', None),
+            (ts, pool, name, 'fees_sats', None, result['transaction_fees_sats'], 'ok', None),
+            (ts, pool, name, 'block_height', None, result['block_height'], 'ok', None)
+        ])
+
+    def record_prevhash(self, name: str, result: Dict, ts: Optional[float] = None):
+        """Record a prevhash_timeline.py get_prevhash() result"""
+        ts = time.time() if ts is None else ts
+        pool = pool_key(result['host'], result['port'])
+        if result['prevhash']:
+            row = (ts, pool, name, 'prevhash', None, None, 'ok', result['prevhash'])
+        else:
+            row = (ts, pool, name, 'prevhash', None, None, 'fail', result['error'])
+        self.add_samples([row])
+
+
+class HistoryStore:
+    """SQLite (WAL) history database"""
+
+    def __init__(self, path: str = DEFAULT_HISTORY_PATH):
+        self.path = path
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self.conn = sqlite3.connect(path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        self.conn.close()
+
+    def start_run(self, tool: str, vantage: Optional[Dict] = None) -> HistoryRun:
+        """
+        Register a run. vantage is a dict with 'ipv4', 'asn', 'location' and
+        'provider' (as in stratum_test.py JSON output), or None if unknown.
+        """
+        vantage = vantage or {}
+        with self.conn:
+            cursor = self.conn.execute(
+                "INSERT INTO runs (tool, started, vantage_ip, vantage_asn, vantage_location, vantage_provider) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (tool, time.time(), vantage.get('ipv4'), vantage.get('asn'),
+                 vantage.get('location'), vantage.get('provider')))
+        return HistoryRun(self, cursor.lastrowid)
+
+    # -- queries ----------------------------------------------------------
+
+    def pool_stats(self, metric: str, since: float, until: Optional[float] = None,
+                   phase: Optional[str] = None, pool: Optional[str] = None) -> Dict[str, Dict]:
+        """
+        Per-pool statistics of one metric between since and until (epoch seconds).
+        Returns {pool: {'display_name', 'ok', 'failed', 'sketch'}}; values are
+        streamed into a QuantileSketch, so memory does not grow with the history.
+        """
+        until = time.time() if until is None else until
+        query = ("SELECT pool, display_name, value, outcome FROM samples "
+                 "WHERE metric = ? AND ts >= ? AND ts < ? AND phase IS ?")
+        params = [metric, since, until, phase]
+        if pool is not None:
+            query += " AND pool = ?"
+            params.append(pool)
+
+        stats = {}
+        for pool_name, display_name, value, outcome in self.conn.execute(query, params):
+            entry = stats.get(pool_name)
+            if entry is None:
+                entry = stats[pool_name] = {'display_name': display_name, 'ok': 0, 'failed': 0,
+                                            'sketch': QuantileSketch()}
+            if outcome == 'ok':
+                entry['ok'] += 1
+                if value is not None:
+                    entry['sketch'].add(value)
+            else:
+                entry['failed'] += 1
+        return stats
+
+    def runs(self, limit: int = 20) -> List[Tuple]:
+        """Most recent runs: (id, tool, started, vantage_ip, vantage_asn, vantage_location, samples)"""
+        return self.conn.execute(
+            "SELECT runs.id, tool, started, vantage_ip, vantage_asn, vantage_location, "
+            "(SELECT COUNT(*) FROM samples WHERE samples.run_id = runs.id) "
+            "FROM runs ORDER BY started DESC LIMIT ?", (limit,)).fetchall()
+
+
+def format_value(value: Optional[float]) -> str:
+    return "-" if value is None else f"{value:.1f}"
+
+
+def print_rows(headers: List[str], rows: List[List[str]]):
+    """Print a simple ASCII table"""
+    widths = [max(len(header), *(len(row[i]) for row in rows)) if rows else len(header)
+              for i, header in enumerate(headers)]
+    separator = "+" + "+".join("-" * (w + 2) for w in widths) + "+"
+    print(separator)
+    print("| " + " | ".join(h.ljust(w) for h, w in zip(headers, widths)) + " |")
+    print(separator)
+    for row in rows:
+        print("| " + " | ".join(v.ljust(w) for v, w in zip(row, widths)) + " |")
+    print(separator)
+
+
+def command_percentiles(store: HistoryStore, args):
+    since = time.time() - args.days * 86400
+    stats = store.pool_stats(args.metric, since, phase=args.phase, pool=args.pool)
+    pcts = args.pct or [50, 95, 99]
+    label = args.metric + (f"/{args.phase}" if args.phase else "")
+    print(f"{label} over the last {args.days:g} day(s)")
+    if not stats:
+        print("No samples recorded")
+        return
+
+    rows = []
+    for pool, entry in sorted(stats.items(), key=lambda item: item[1]['sketch'].quantile(0.5) or float('inf')):
+        total = entry['ok'] + entry['failed']
+        rows.append([entry['display_name'] or pool, pool, str(total),
+                     f"{entry['failed'] / total * 100:.0f}" if total else "-"]
+                    + [format_value(entry['sketch'].quantile(p / 100)) for p in pcts])
+    print_rows(["Pool Name", "Pool", "Samples", "Fail %"] + [f"p{p:g}" for p in pcts], rows)
+
+
+def command_compare(store: HistoryStore, args):
+    now = time.time()
+    window = args.days * 86400
+    current = store.pool_stats(args.metric, now - window, now, args.phase, args.pool)
+    previous = store.pool_stats(args.metric, now - 7 * 86400 - window, now - 7 * 86400, args.phase, args.pool)
+    q = args.pct / 100
+    label = args.metric + (f"/{args.phase}" if args.phase else "")
+    print(f"{label} p{args.pct:g}: last {args.days:g} day(s) vs the same window one week earlier")
+    if not current and not previous:
+        print("No samples recorded")
+        return
+
+    rows = []
+    for pool in sorted(set(current) | set(previous)):
+        now_value = current[pool]['sketch'].quantile(q) if pool in current else None
+        then_value = previous[pool]['sketch'].quantile(q) if pool in previous else None
+        change = "-"
+        if now_value is not None and then_value:
+            change = f"{(now_value - then_value) / then_value * 100:+.0f}%"
+        name = (current.get(pool) or previous.get(pool))['display_name'] or pool
+        rows.append([name, pool, format_value(then_value), format_value(now_value), change])
+    print_rows(["Pool Name", "Pool", "Last week", "Now", "Change"], rows)
+
+
+def command_runs(store: HistoryStore, args):
+    rows = []
+    for run_id, tool, started, ip, asn, location, samples in store.runs(args.limit):
+        rows.append([str(run_id), tool, time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(started)),
+                     ip or "-", asn or "-", location or "-", str(samples)])
+    print_rows(["Run", "Tool", "Started", "Vantage IP", "ASN", "Location", "Samples"], rows)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Query the probe history recorded with --history',
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+Examples:
+  p95 stratum latency per pool over the last 7 days:
+    python3 history_db.py percentiles --metric stratum --pct 95 --days 7
+
+  TCP connect phase percentiles for one pool:
+    python3 history_db.py percentiles --metric stratum --phase connect --pool solo.atlaspool.io:3333
+
+  Compare today's median stratum latency with the same day last week:
+    python3 history_db.py compare --metric stratum --pct 50
+
+  List recorded runs:
+    python3 history_db.py runs
+        """
+    )
+    parser.add_argument('--db', default=DEFAULT_HISTORY_PATH, help=f'Database path (default: {DEFAULT_HISTORY_PATH})')
+    commands = parser.add_subparsers(dest='command')
+
+    percentiles = commands.add_parser('percentiles', help='Per-pool percentiles of a metric')
+    percentiles.add_argument('--pct', type=float, action='append',
+                             help='Percentile to show (repeatable, default: 50 95 99)')
+    compare = commands.add_parser('compare', help='Compare a recent window with the same window a week earlier')
+    compare.add_argument('--pct', type=float, default=50, help='Percentile to compare (default: 50)')
+    for command in (percentiles, compare):
+        command.add_argument('--metric', default='stratum',
+                             help='ping, tcp_rtt, stratum, tls, tls_resumed, template, fees_sats or block_height '
+                                  '(default: stratum)')
+        command.add_argument('--phase', choices=PHASES, help='Only this latency phase of the metric')
+        command.add_argument('--pool', metavar='HOST:PORT', help='Only this pool')
+        command.add_argument('--days', type=float, default=None, help='Window length in days')
+    percentiles.set_defaults(days=7)
+    compare.set_defaults(days=1)
+
+    runs = commands.add_parser('runs', help='List recorded runs')
+    runs.add_argument('--limit', type=int, default=20, help='Number of runs to show (default: 20)')
+
+    args = parser.parse_args()
+    if args.command is None:
+        parser.print_help()
+        return 1
+
+    if not os.path.exists(args.db):
+        print(f"Error: no history database at {args.db} (record one with --history)", file=sys.stderr)
+        return 1
+
+    with HistoryStore(args.db) as store:
+        {'percentiles': command_percentiles, 'compare': command_compare, 'runs': command_runs}[args.command](store, args)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,344 @@
+#!/usr/bin/env python3
+"""
+ICMP Ping Engine
+
+Native ICMP echo for stratum_test.py, replacing one `ping` process per
+sample. A single socket sends sequence-numbered echo requests to every
+target and matches the replies, so a whole pool list is pinged in one pass
+with per-packet loss and jitter.
+
+IPv6 targets (address literals, or hostnames with family=AF_INET6) are
+pinged with ICMPv6 echo from a second socket of the same kind; the kernel
+fills in the ICMPv6 checksum.
+
+Socket selection:
+  • Linux unprivileged ICMP sockets (SOCK_DGRAM/IPPROTO_ICMP). Allowed when
+    the user's group is inside net.ipv4.ping_group_range.
+  • Raw ICMP sockets (SOCK_RAW) when running as root / with CAP_NET_RAW,
+    or on macOS where SOCK_DGRAM ICMP is also available.
+  • If neither can be opened, open_icmp_socket() returns None and callers
+    fall back to the `ping` command.
+
+Usage:
+    import icmp_ping
+
+    if icmp_ping.is_available():
+        stats = icmp_ping.ping_hosts(["solo.atlaspool.io", "solo.ckpool.org"], count=3)
+        print(stats["solo.atlaspool.io"]["times"], stats["solo.atlaspool.io"]["loss"])
+
+    # Command line
+    python3 icmp_ping.py solo.atlaspool.io solo.ckpool.org -c 5
+
+Requirements:
+  • Python 3.6+
+  • No external dependencies
+"""
+
+import socket
+import struct
+import select
+import sys
+import argparse
+import ipaddress
+import itertools
+import random
+import threading
+from typing import Optional, Dict, List, Tuple
+
+from stratum_client import now_ns
+import kernel_timestamps
+
+ICMP_ECHO_REQUEST = 8
+ICMP_ECHO_REPLY = 0
+ICMP6_ECHO_REQUEST = 128
+ICMP6_ECHO_REPLY = 129
+
+# Payload carried by every echo request (pads the packet to 64 bytes like ping)
+PAYLOAD = b"atlaspool-tools-icmp-ping".ljust(56, b".")
+
+# Cached result of is_available()
+_icmp_available = None
+
+# Echo identifiers handed out to ping_hosts() calls: concurrent calls in one
+# process must not share one, or raw sockets (which see every echo reply)
+# would match each other's replies
+_identifiers = itertools.count(random.randrange(0x10000))
+_identifiers_lock = threading.Lock()
+
+
+def next_identifier() -> int:
+    """A 16-bit echo identifier not used by the previous 65535 calls"""
+    with _identifiers_lock:
+        return next(_identifiers) & 0xFFFF
+
+
+def same_address(a: str, b: str) -> bool:
+    """True if two IP address strings are the same address (ignoring IPv6 zone and notation)"""
+    try:
+        return ipaddress.ip_address(a.split('%')[0]) == ipaddress.ip_address(b.split('%')[0])
+    except ValueError:
+        return a == b
+
+
+def checksum(data: bytes) -> int:
+    """Internet checksum (RFC 1071) of data"""
+    if len(data) % 2:
+        data += b"\x00"
+    total = sum(struct.unpack(f"!{len(data) // 2}H", data))
+    total = (total >> 16) + (total & 0xFFFF)
+    total += total >> 16
+    return ~total & 0xFFFF
+
+
+def build_echo_request(identifier: int, sequence: int, payload: bytes = PAYLOAD,
+                       family: int = socket.AF_INET) -> bytes:
+    """
+    Build an ICMP echo request packet with a valid checksum (ICMPv6 echo
+    with a zero checksum for AF_INET6; the kernel computes that one)
+    """
+    if family == socket.AF_INET6:
+        return struct.pack("!BBHHH", ICMP6_ECHO_REQUEST, 0, 0, identifier, sequence) + payload
+    header = struct.pack("!BBHHH", ICMP_ECHO_REQUEST, 0, 0, identifier, sequence)
+    csum = checksum(header + payload)
+    return struct.pack("!BBHHH", ICMP_ECHO_REQUEST, 0, csum, identifier, sequence) + payload
+
+
+def parse_echo_reply(packet: bytes, raw: bool, family: int = socket.AF_INET) -> Optional[Tuple[int, int]]:
+    """
+    Return (identifier, sequence) if packet is an ICMP echo reply, else None.
+    Raw IPv4 sockets deliver the IPv4 header in front of the ICMP message;
+    IPv6 sockets never include the IPv6 header.
+    """
+    if family == socket.AF_INET6:
+        if len(packet) < 8:
+            return None
+        icmp_type, _, _, identifier, sequence = struct.unpack("!BBHHH", packet[:8])
+        if icmp_type != ICMP6_ECHO_REPLY:
+            return None
+        return identifier, sequence
+    if raw:
+        if len(packet) < 20:
+            return None
+        header_len = (packet[0] & 0x0F) * 4
+        packet = packet[header_len:]
+    if len(packet) < 8:
+        return None
+    icmp_type, _, _, identifier, sequence = struct.unpack("!BBHHH", packet[:8])
+    if icmp_type != ICMP_ECHO_REPLY:
+        return None
+    return identifier, sequence
+
+
+def open_icmp_socket(family: int = socket.AF_INET) -> Optional[Tuple[socket.socket, bool]]:
+    """
+    Open an ICMP (or, for AF_INET6, ICMPv6) socket, preferring the
+    unprivileged SOCK_DGRAM kind.
+    Returns (socket, is_raw) or None if ICMP sockets are not permitted.
+    """
+    proto = getattr(socket, 'IPPROTO_ICMPV6', 58) if family == socket.AF_INET6 else socket.IPPROTO_ICMP
+    for sock_type in (socket.SOCK_DGRAM, socket.SOCK_RAW):
+        try:
+            sock = socket.socket(family, sock_type, proto)
+        except (OSError, AttributeError):
+            continue
+        return sock, sock_type == socket.SOCK_RAW
+    return None
+
+
+def is_available() -> bool:
+    """Check (once) whether native ICMP ping can be used"""
+    global _icmp_available
+
+    if _icmp_available is None:
+        opened = open_icmp_socket()
+        _icmp_available = opened is not None
+        if opened:
+            opened[0].close()
+    return _icmp_available
+
+
+def summarize(times: List[float], sent: int) -> Dict:
+    """Build the loss/jitter statistics for one target"""
+    received = len(times)
+    # Jitter: mean absolute difference between consecutive RTT samples (RFC 3550 style)
+    jitter = None
+    if received > 1:
+        jitter = sum(abs(b - a) for a, b in zip(times, times[1:])) / (received - 1)
+    return {
+        'sent': sent,
+        'received': received,
+        'loss': (sent - received) / sent if sent else None,
+        'jitter': jitter,
+        'times': times
+    }
+
+
+def ping_hosts(hosts: List[str], count: int = 3, interval: float = 0.2, timeout: float = 2,
+               family: int = socket.AF_INET, kernel_times: bool = False) -> Optional[Dict[str, Dict]]:
+    """
+    Ping every host count times from one ICMP socket (plus one ICMPv6
+    socket if any target is IPv6). Hostnames are resolved in family;
+    address literals are pinged in their own family.
+
+    Each round sends one echo to every target, then listens for replies for
+    `interval` seconds. After the last round, replies are awaited for up to
+    `timeout` seconds.
+
+    Returns {hostname: stats} where stats has 'address', 'sent', 'received',
+    'loss' (0.0-1.0), 'jitter' (ms or None), 'times' (RTTs in ms, send order)
+    and 'error'. Returns None if no ICMP socket can be opened.
+    
+    With kernel_times (Linux), replies are also timed by their kernel
+    receive timestamp (see kernel_timestamps.py), so a reply that waited in
+    the socket while others were processed is not counted as slower; stats
+    then add 'kernel_times' (ms, same rounds as 'times').
+    """
+    opened = open_icmp_socket()
+    if opened is None:
+        return None
+    sockets = {socket.AF_INET: opened}
+
+    results = {}
+    targets = {}  # address -> [hostnames]
+    families = {}  # address -> family
+    for host in dict.fromkeys(hosts):
+        try:
+            host_family = socket.AF_INET6 if ipaddress.ip_address(host).version == 6 else socket.AF_INET
+        except ValueError:
+            host_family = family
+        try:
+            info = socket.getaddrinfo(host, None, host_family, socket.SOCK_RAW)[0]
+        except (socket.gaierror, OSError):
+            results[host] = dict(summarize([], 0), address=None, error="DNS resolution failed")
+            continue
+        address = info[4][0]
+        if info[0] not in sockets:
+            sockets[info[0]] = open_icmp_socket(info[0])
+        if sockets[info[0]] is None:
+            results[host] = dict(summarize([], 0), address=address, error="ICMPv6 not permitted")
+            continue
+        results[host] = dict(summarize([], 0), address=address, error=None)
+        targets.setdefault(address, []).append(host)
+        families[address] = info[0]
+    sockets = {sock_family: opened for sock_family, opened in sockets.items() if opened is not None}
+    sock_families = {opened[0]: sock_family for sock_family, opened in sockets.items()}
+    kernel_times = kernel_times and all(kernel_timestamps.enable(sock) for sock in sock_families)
+
+    # With SOCK_DGRAM the kernel rewrites the identifier to the socket's port
+    # and only delivers our own replies; with SOCK_RAW we filter on it (and on
+    # the reply's source address) ourselves
+    identifier = next_identifier()
+    pending = {}  # (family, sequence) -> (address, round, send time)
+    replies = {address: {} for address in targets}  # address -> {round: rtt}
+    kernel_replies = {address: {} for address in targets}  # address -> {round: kernel rtt}
+    sequence = 0
+
+    def receive_until(deadline_ns: int):
+        while pending:
+            remaining = (deadline_ns - now_ns()) / 1e9
+            if remaining <= 0:
+                return
+            readable, _, _ = select.select(list(sock_families), [], [], remaining)
+            if not readable:
+                return
+            for sock in readable:
+                sock_family = sock_families[sock]
+                try:
+                    if kernel_times:
+                        packet, source, kernel_ns = kernel_timestamps.recvfrom(sock, 2048)
+                    else:
+                        packet, source = sock.recvfrom(2048)
+                except OSError:
+                    continue
+                received_ns = now_ns()
+                raw = sockets[sock_family][1]
+                reply = parse_echo_reply(packet, raw, sock_family)
+                if reply is None:
+                    continue
+                reply_id, reply_seq = reply
+                if raw and reply_id != identifier:
+                    continue
+                if (sock_family, reply_seq) not in pending:
+                    continue
+                if not same_address(source[0], pending[(sock_family, reply_seq)][0]):
+                    continue
+                address, round_index, sent_ns = pending.pop((sock_family, reply_seq))
+                replies[address][round_index] = (received_ns - sent_ns) / 1e6
+                if kernel_times and kernel_ns is not None:
+                    kernel_replies[address][round_index] = (kernel_ns - sent_ns) / 1e6
+
+    try:
+        for sock in sock_families:
+            sock.setblocking(False)
+        for round_index in range(count):
+            for address in targets:
+                sequence = (sequence + 1) & 0xFFFF
+                address_family = families[address]
+                packet = build_echo_request(identifier, sequence, family=address_family)
+                sent_ns = now_ns()
+                try:
+                    sockets[address_family][0].sendto(packet, (address, 0))
+                except OSError:
+                    continue
+                pending[(address_family, sequence)] = (address, round_index, sent_ns)
+
+            last_round = round_index == count - 1
+            wait = timeout if last_round else interval
+            receive_until(now_ns() + int(wait * 1e9))
+    finally:
+        for sock in sock_families:
+            sock.close()
+
+    for address, hostnames in targets.items():
+        times = [replies[address][r] for r in sorted(replies[address])]
+        for host in hostnames:
+            results[host].update(summarize(times, count))
+            if kernel_times:
+                results[host]['kernel_times'] = [kernel_replies[address][r] for r in sorted(kernel_replies[address])]
+
+    return results
+
+
+def ping_once(host: str, timeout: float = 2, family: int = socket.AF_INET) -> Optional[float]:
+    """
+    Send a single echo request to host.
+    Returns the round-trip time in milliseconds, or None on loss/error.
+    """
+    results = ping_hosts([host], count=1, timeout=timeout, family=family)
+    if not results or not results[host]['times']:
+        return None
+    return results[host]['times'][0]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Native ICMP ping of one or more hosts from a single socket')
+    parser.add_argument('hosts', nargs='+', help='Hostnames or IPv4/IPv6 addresses')
+    parser.add_argument('-6', dest='family', action='store_const', const=socket.AF_INET6, default=socket.AF_INET,
+                        help='Resolve hostnames to IPv6 addresses (ICMPv6 echo)')
+    parser.add_argument('-c', '--count', type=int, default=5, help='Echo requests per host (default: 5)')
+    parser.add_argument('-i', '--interval', type=float, default=0.2, help='Seconds between rounds (default: 0.2)')
+    parser.add_argument('-W', '--timeout', type=float, default=2, help='Seconds to wait for late replies (default: 2)')
+    args = parser.parse_args()
+
+    results = ping_hosts(args.hosts, args.count, args.interval, args.timeout, args.family)
+    if results is None:
+        print("Error: ICMP sockets are not permitted for this user.", file=sys.stderr)
+        print("  Linux: allow your group via sysctl net.ipv4.ping_group_range, or run as root.", file=sys.stderr)
+        sys.exit(1)
+
+    for host in args.hosts:
+        stats = results[host]
+        if stats['error']:
+            print(f"{host}: {stats['error']}")
+            continue
+        times = stats['times']
+        line = f"{host} ({stats['address']}): {stats['received']}/{stats['sent']} received, {stats['loss'] * 100:.0f}% loss"
+        if times:
+            line += f", rtt min/avg/max = {min(times):.2f}/{sum(times) / len(times):.2f}/{max(times):.2f} ms"
+        if stats['jitter'] is not None:
+            line += f", jitter {stats['jitter']:.2f} ms"
+        print(line)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""
+Kernel Receive Timestamps
+
+Linux SO_TIMESTAMPNS support for the latency probes. A reply time taken in
+Python after recv() returns includes however long the reading thread
+waited to be scheduled (and to get the GIL), which grows with the number of
+probes running at once. With SO_TIMESTAMPNS enabled, recvmsg() also returns
+the time the kernel received the data, so the reply time can be measured
+up to the packet's arrival instead of the thread's wake-up.
+
+Kernel timestamps are CLOCK_REALTIME; to_perf_ns() moves them onto the
+now_ns() (perf_counter) clock the probes use for send times, so the two
+can be subtracted directly. For TCP the timestamp is that of the last
+segment copied by the recv call.
+
+Only plain sockets can be read this way: TLS data is decrypted in
+userspace, and asyncio streams do their own reads.
+
+Usage:
+    import kernel_timestamps
+
+    if kernel_timestamps.enable(sock):
+        data, received_ns = kernel_timestamps.recv(sock, 8192)
+        # received_ns is on the now_ns() clock (None if the kernel sent no timestamp)
+
+Requirements:
+  • Python 3.6+
+  • Linux (enable() returns False elsewhere)
+  • No external dependencies
+"""
+
+import socket
+import ssl
+import struct
+import sys
+import time
+from typing import Optional, Tuple
+
+from stratum_client import now_ns
+
+# Socket option and control message type (the same number on Linux)
+SO_TIMESTAMPNS = getattr(socket, 'SO_TIMESTAMPNS', 35)
+SCM_TIMESTAMPNS = SO_TIMESTAMPNS
+
+# struct timespec: tv_sec, tv_nsec (native longs)
+TIMESPEC = struct.Struct("@ll")
+
+# Ancillary buffer size for one timespec
+_ANCILLARY_SIZE = socket.CMSG_SPACE(TIMESPEC.size) if hasattr(socket, 'CMSG_SPACE') else 64
+
+# time.time_ns() is Python 3.7+
+if hasattr(time, 'time_ns'):
+    wall_ns = time.time_ns
+else:
+    def wall_ns() -> int:
+        return int(time.time() * 1e9)
+
+
+def supported() -> bool:
+    """True if this platform has SO_TIMESTAMPNS and recvmsg()"""
+    return sys.platform.startswith('linux') and hasattr(socket.socket, 'recvmsg')
+
+
+def enable(sock) -> bool:
+    """
+    Turn on kernel receive timestamps for sock.
+    Returns False (and leaves sock alone) if they cannot be used on it.
+    """
+    if not supported() or sock is None or isinstance(sock, ssl.SSLSocket):
+        return False
+    try:
+        sock.setsockopt(socket.SOL_SOCKET, SO_TIMESTAMPNS, 1)
+    except OSError:
+        return False
+    return True
+
+
+def to_perf_ns(realtime_ns: int) -> int:
+    """Convert a CLOCK_REALTIME timestamp (ns) to the now_ns() clock"""
+    return realtime_ns - (wall_ns() - now_ns())
+
+
+def _timestamp(ancdata) -> Optional[int]:
+    """Kernel receive time (now_ns() clock) from recvmsg() ancillary data"""
+    for level, cmsg_type, data in ancdata:
+        if level == socket.SOL_SOCKET and cmsg_type == SCM_TIMESTAMPNS and len(data) >= TIMESPEC.size:
+            seconds, nanoseconds = TIMESPEC.unpack(data[:TIMESPEC.size])
+            return to_perf_ns(seconds * 1_000_000_000 + nanoseconds)
+    return None
+
+
+def recv(sock, bufsize: int, flags: int = 0) -> Tuple[bytes, Optional[int]]:
+    """
+    recv() that also returns the kernel receive time on the now_ns() clock
+    (None if the socket has no timestamps enabled). Raises like recv().
+    """
+    data, ancdata, _, _ = sock.recvmsg(bufsize, _ANCILLARY_SIZE, flags)
+    return data, _timestamp(ancdata)
+
+
+def recvfrom(sock, bufsize: int, flags: int = 0) -> Tuple[bytes, Tuple, Optional[int]]:
+    """recvfrom() that also returns the kernel receive time, as recv() does"""
+    data, ancdata, _, address = sock.recvmsg(bufsize, _ANCILLARY_SIZE, flags)
+    return data, address, _timestamp(ancdata)
@@ -0,0 +1,180 @@
+#!/usr/bin/env python3
+"""
+Latency Monitor
+
+Rolling per-pool latency statistics for stratum_test.py --monitor, which
+probes every pool on an interval and runs until interrupted.
+
+Each pool keeps the last `window` samples of every metric (ping, TCP RTT,
+stratum and TLS) in fixed-size ring buffers, plus a ring of probe outcomes
+for the failure rate, so memory stays bounded no matter how long the
+monitor runs. snapshot() summarizes the current window: p50/p95/p99,
+jitter and failure rate per pool.
+
+Usage:
+    from latency_monitor import LatencyMonitor
+
+    monitor = LatencyMonitor(window=1000)
+    for result in run_probes(servers):
+        monitor.add_result(result)
+    snapshot = monitor.snapshot()
+    write_snapshot(snapshot, "latency.json")
+
+Requirements:
+  • Python 3.6+
+  • No external dependencies
+"""
+
+import os
+import json
+import time
+import threading
+from collections import deque
+from typing import Optional, Dict, List
+
+from quantile_sketch import all_samples, sketch_of
+
+# Samples kept per pool and metric
+DEFAULT_WINDOW = 1000
+
+# Metrics tracked per pool, keyed by the result dict field that holds them
+METRICS = {
+    'ping': 'ping_times',
+    'tcp_rtt': 'tcp_rtt_times',
+    'stratum': 'stratum_times',
+    'tls': 'tls_times'
+}
+
+PERCENTILES = (50, 95, 99)
+
+
+def percentile(sorted_values: List[float], pct: float) -> Optional[float]:
+    """Percentile of an already sorted list (linear interpolation between ranks)"""
+    if not sorted_values:
+        return None
+    rank = (len(sorted_values) - 1) * pct / 100
+    lower = int(rank)
+    upper = min(lower + 1, len(sorted_values) - 1)
+    return sorted_values[lower] + (sorted_values[upper] - sorted_values[lower]) * (rank - lower)
+
+
+def jitter(values: List[float]) -> Optional[float]:
+    """Mean absolute difference between consecutive samples (RFC 3550 style)"""
+    if len(values) < 2:
+        return None
+    return sum(abs(b - a) for a, b in zip(values, values[1:])) / (len(values) - 1)
+
+
+class RollingWindow:
+    """Ring buffer holding the most recent samples of one metric"""
+
+    def __init__(self, size: int = DEFAULT_WINDOW):
+        self.samples = deque(maxlen=size)
+        self.total = 0
+
+    def add(self, value: float):
+        self.samples.append(value)
+        self.total += 1
+
+    def summary(self) -> Dict:
+        """count, min/max/mean, percentiles and jitter over the window (ms)"""
+        values = list(self.samples)
+        ordered = sorted(values)
+        summary = {
+            'count': len(values),
+            'total': self.total,
+            'min': ordered[0] if ordered else None,
+            'max': ordered[-1] if ordered else None,
+            'mean': sum(values) / len(values) if values else None,
+            'jitter': jitter(values)
+        }
+        for pct in PERCENTILES:
+            summary[f'p{pct}'] = percentile(ordered, pct)
+        return summary
+
+
+class PoolStats:
+    """Rolling windows for every metric of one pool, plus its failure rate"""
+
+    def __init__(self, result: Dict, window: int = DEFAULT_WINDOW):
+        self.hostname = result['hostname']
+        self.port = result['port']
+        self.display_name = result['display_name']
+        self.country_code = result.get('country_code', '??')
+        self.metrics = {metric: RollingWindow(window) for metric in METRICS}
+        self.outcomes = deque(maxlen=window)  # True = stratum probe failed
+        self.last_seen = None
+
+    def add_result(self, result: Dict, runs: int = 1):
+        """
+        Record one result dict from run_probes(). A run that produced no
+        stratum time counts as a failure.
+        """
+        for metric, key in METRICS.items():
+            for value in all_samples(result.get(key) or []):
+                self.metrics[metric].add(value)
+        succeeded = sketch_of(result['stratum_times']).count
+        self.outcomes.extend([False] * succeeded + [True] * max(0, runs - succeeded))
+        self.last_seen = time.time()
+
+    def failure_rate(self) -> Optional[float]:
+        if not self.outcomes:
+            return None
+        return sum(self.outcomes) / len(self.outcomes)
+
+    def summary(self) -> Dict:
+        return {
+            'host': self.hostname,
+            'port': self.port,
+            'display_name': self.display_name,
+            'country_code': self.country_code,
+            'probes': len(self.outcomes),
+            'failure_rate': self.failure_rate(),
+            'last_seen': self.last_seen,
+            'metrics': {metric: window.summary() for metric, window in self.metrics.items()}
+        }
+
+
+class LatencyMonitor:
+    """Per-pool rolling statistics fed with result dicts from run_probes()"""
+
+    def __init__(self, window: int = DEFAULT_WINDOW):
+        self.window = window
+        self.started = time.time()
+        self.rounds = 0
+        self.pools = {}
+        self._lock = threading.Lock()
+
+    def add_result(self, result: Dict, runs: int = 1):
+        key = (result['hostname'], result['port'])
+        with self._lock:
+            if key not in self.pools:
+                self.pools[key] = PoolStats(result, self.window)
+            self.pools[key].add_result(result, runs)
+
+    def end_round(self):
+        with self._lock:
+            self.rounds += 1
+
+    def snapshot(self) -> Dict:
+        """Summary of every pool's current window, sorted by median stratum time"""
+        with self._lock:
+            pools = [stats.summary() for stats in self.pools.values()]
+            rounds = self.rounds
+        pools.sort(key=lambda pool: (pool['metrics']['stratum']['p50'] is None,
+                                     pool['metrics']['stratum']['p50'] or 0))
+        return {
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+            'started': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime(self.started)),
+            'rounds': rounds,
+            'window': self.window,
+            'pools': pools
+        }
+
+
+def write_snapshot(snapshot: Dict, path: str):
+    """Write snapshot as JSON, replacing path atomically so readers never see a partial file"""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(snapshot, f, indent=2)
+    os.replace(tmp_path, path)
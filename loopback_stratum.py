@@ -0,0 +1,184 @@
+#!/usr/bin/env python3
+"""
+Loopback Stratum Responder
+
+A minimal in-process stratum server on 127.0.0.1, used by stratum_test.py
+--calibrate to measure how much of a stratum time is this machine's own
+overhead (Python socket setup, JSON encoding, thread wake-ups, TLS) rather
+than the network or the pool.
+
+The server answers mining.subscribe and mining.authorize immediately, with
+replies shaped like a real pool's, so probes run exactly the code paths
+they run against a pool. With tls=True it speaks TLS with a self-signed
+localhost certificate and key that `openssl` creates in a temporary
+directory when the server starts; nothing is stored, and clients must not
+verify it. Without openssl on PATH, TLS servers cannot be created
+(see tls_available()).
+
+Usage:
+    from loopback_stratum import LoopbackStratumServer
+
+    with LoopbackStratumServer() as server:
+        host, port = server.address
+        ...
+
+    # Command line (serves until interrupted)
+    python3 loopback_stratum.py --port 3333 --tls-port 3334
+
+Requirements:
+  • Python 3.6+
+  • No external dependencies (the openssl command line tool for TLS)
+"""
+
+import json
+import os
+import shutil
+import socket
+import socketserver
+import ssl
+import subprocess
+import sys
+import tempfile
+import threading
+import argparse
+from typing import Optional, Tuple
+
+# Certificate lifetime of the throwaway loopback key pair (days)
+CERT_DAYS = 1
+
+# Reply to mining.subscribe: subscriptions, extranonce1, extranonce2 size
+SUBSCRIBE_RESULT = [[["mining.set_difficulty", "1"], ["mining.notify", "1"]], "08000002", 4]
+
+
+def tls_available() -> bool:
+    """True if openssl is on PATH to create the loopback certificate"""
+    return shutil.which('openssl') is not None
+
+
+def server_context() -> ssl.SSLContext:
+    """
+    Server SSL context with a fresh self-signed localhost certificate
+    (raises OSError if openssl is missing or fails)
+    """
+    if not tls_available():
+        raise OSError("openssl not found, so no certificate for the loopback TLS server")
+    context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+    # load_cert_chain() only reads files; the key pair is deleted with the directory
+    with tempfile.TemporaryDirectory() as directory:
+        cert, key = os.path.join(directory, 'cert.pem'), os.path.join(directory, 'key.pem')
+        try:
+            subprocess.run(['openssl', 'req', '-x509', '-newkey', 'ec', '-pkeyopt', 'ec_paramgen_curve:prime256v1',
+                            '-nodes', '-keyout', key, '-out', cert, '-days', str(CERT_DAYS),
+                            '-subj', '/CN=localhost'],
+                           stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+                           check=True, timeout=30)
+        except (subprocess.CalledProcessError, subprocess.TimeoutExpired) as e:
+            raise OSError(f"openssl could not create the loopback certificate: {e}")
+        context.load_cert_chain(cert, key)
+    return context
+
+
+def reply_to(message: dict) -> Optional[dict]:
+    """Response to one stratum request (None for notifications and unknown methods without id)"""
+    msg_id = message.get('id')
+    if msg_id is None:
+        return None
+    method = message.get('method')
+    if method == 'mining.subscribe':
+        return {"id": msg_id, "result": SUBSCRIBE_RESULT, "error": None}
+    if method in ('mining.authorize', 'mining.configure', 'mining.suggest_difficulty'):
+        return {"id": msg_id, "result": True, "error": None}
+    return {"id": msg_id, "result": None, "error": [20, f"Unsupported method {method}", None]}
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    def setup(self):
+        if self.server.ssl_context is not None:
+            self.request = self.server.ssl_context.wrap_socket(self.request, server_side=True)
+        self.request.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        super().setup()
+
+    def handle(self):
+        for line in self.rfile:
+            try:
+                message = json.loads(line.decode('utf-8', 'replace'))
+            except json.JSONDecodeError:
+                continue
+            reply = reply_to(message) if isinstance(message, dict) else None
+            if reply is not None:
+                self.wfile.write(json.dumps(reply).encode('utf-8') + b"\n")
+                self.wfile.flush()
+
+
+class _Server(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def handle_error(self, request, client_address):
+        pass  # Probes close connections abruptly; nothing to report
+
+
+class LoopbackStratumServer:
+    """
+    Stratum responder on 127.0.0.1 (port 0 = any free port), served from a
+    daemon thread. With tls=True, raises OSError when no certificate can be
+    created (see tls_available()).
+    """
+
+    def __init__(self, port: int = 0, tls: bool = False):
+        ssl_context = server_context() if tls else None
+        self._server = _Server(('127.0.0.1', port), _Handler)
+        self._server.ssl_context = ssl_context
+        self._thread = None
+
+    @property
+    def address(self) -> Tuple[str, int]:
+        """(host, port) the server listens on"""
+        return self._server.server_address[:2]
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Serve a minimal stratum responder on 127.0.0.1')
+    parser.add_argument('--port', type=int, default=3333, help='Plain stratum port (default: 3333)')
+    parser.add_argument('--tls-port', type=int, default=0, help='Also serve TLS on this port (default: off)')
+    args = parser.parse_args()
+
+    tls_server = None
+    if args.tls_port:
+        try:
+            tls_server = LoopbackStratumServer(args.tls_port, tls=True)
+        except OSError as e:
+            print(f"Error: {e}", file=sys.stderr)
+            sys.exit(1)
+    servers = [LoopbackStratumServer(args.port).start()]
+    if tls_server is not None:
+        servers.append(tls_server.start())
+    for server in servers:
+        print(f"Listening on {server.address[0]}:{server.address[1]}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for server in servers:
+            server.stop()
+    sys.exit(0)
+
+
+if __name__ == "__main__":
+    main()
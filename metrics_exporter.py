@@ -0,0 +1,328 @@
+#!/usr/bin/env python3
+"""
+Metrics Exporter
+
+Publishes the measurements of stratum_test.py, pool-mempool.py and
+findings/prevhash_timeline.py for Prometheus and InfluxDB.
+
+  • MetricsRegistry: in-memory counters, gauges and histograms. The probes
+    update it as results arrive; a scrape only renders it, so scraping
+    never triggers network I/O.
+  • MetricsServer: stdlib http.server on a background thread serving the
+    registry at /metrics in the OpenMetrics text format (Prometheus reads
+    it natively).
+  • InfluxSink: appends every observation to a file in InfluxDB line
+    protocol, for Telegraf's tail input or `influx write`.
+  • Exporter: turns tool results into metrics for both outputs.
+
+Published metrics (latencies in seconds):
+  atlaspool_probe_latency_seconds{pool,name,probe}   histogram: ping, tcp_rtt, stratum, tls, tls_resumed
+  atlaspool_stratum_phase_seconds{pool,name,phase}   histogram: dns, connect, tls, first_byte, reply
+  atlaspool_probes_total{pool,name,probe}            counter: stratum/tls/template probes attempted
+  atlaspool_probe_failures_total{pool,name,probe}    counter: failed probes
+  atlaspool_template_fees_sats{pool,name}            gauge: transaction fees in the latest template
+  atlaspool_template_block_height{pool,name}         gauge: block height of the latest template
+  atlaspool_prevhash_agreement{pool,name}            gauge: 1 if the pool's prevhash matches the majority
+  atlaspool_prevhash_unique                          gauge: distinct prevhashes in the latest snapshot
+
+Usage:
+    from metrics_exporter import Exporter
+
+    exporter = Exporter(listen="127.0.0.1:9108", influx_file="metrics.lp")
+    exporter.observe_stratum_result(result)
+    # curl http://127.0.0.1:9108/metrics
+
+Requirements:
+  • Python 3.6+
+  • No external dependencies
+"""
+
+import time
+import threading
+from collections import Counter
+from http.server import HTTPServer, BaseHTTPRequestHandler
+from socketserver import ThreadingMixIn
+from typing import Optional, Dict, List, Tuple
+
+from quantile_sketch import all_samples, sketch_of
+
+# Histogram buckets in seconds (1 ms to 10 s)
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+OPENMETRICS_CONTENT_TYPE = 'application/openmetrics-text; version=1.0.0; charset=utf-8'
+
+DEFAULT_METRICS_HOST = '127.0.0.1'
+
+PHASES = ['dns', 'connect', 'tls', 'first_byte', 'reply']
+
+
+def _escape_label(value: str) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(labels: Tuple[Tuple[str, str], ...], extra: str = "") -> str:
+    parts = [f'{key}="{_escape_label(value)}"' for key, value in labels]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _format_number(value: float) -> str:
+    if value == float('inf'):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class MetricFamily:
+    """One counter, gauge or histogram with its labelled samples"""
+
+    def __init__(self, name: str, kind: str, help_text: str, buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        self.name = name
+        self.kind = kind
+        self.help = help_text
+        self.buckets = buckets
+        self.samples = {}  # label tuple -> value, or [bucket counts, sum, count] for histograms
+
+    def render(self) -> List[str]:
+        lines = [f"# TYPE {self.name} {self.kind}", f"# HELP {self.name} {self.help}"]
+        for labels, value in sorted(self.samples.items()):
+            if self.kind == 'counter':
+                lines.append(f"{self.name}_total{_format_labels(labels)} {_format_number(value)}")
+            elif self.kind == 'gauge':
+                lines.append(f"{self.name}{_format_labels(labels)} {_format_number(value)}")
+            else:
+                counts, total, count = value
+                cumulative = 0
+                for bound, bucket_count in zip(self.buckets + (float('inf'),), counts):
+                    cumulative += bucket_count
+                    le = f'le="{_format_number(float(bound))}"'
+                    lines.append(f"{self.name}_bucket{_format_labels(labels, le)} {cumulative}")
+                lines.append(f"{self.name}_sum{_format_labels(labels)} {_format_number(total)}")
+                lines.append(f"{self.name}_count{_format_labels(labels)} {count}")
+        return lines
+
+
+class MetricsRegistry:
+    """Thread-safe in-memory metric store rendered on every scrape"""
+
+    def __init__(self):
+        self._families = {}
+        self._lock = threading.Lock()
+
+    def _family(self, name: str, kind: str, help_text: str) -> MetricFamily:
+        family = self._families.get(name)
+        if family is None:
+            family = self._families[name] = MetricFamily(name, kind, help_text)
+        return family
+
+    @staticmethod
+    def _key(labels: Optional[Dict[str, str]]) -> Tuple[Tuple[str, str], ...]:
+        return tuple(sorted((labels or {}).items()))
+
+    def inc(self, name: str, help_text: str, labels: Optional[Dict[str, str]] = None, amount: float = 1):
+        """Add amount to a counter"""
+        with self._lock:
+            family = self._family(name, 'counter', help_text)
+            key = self._key(labels)
+            family.samples[key] = family.samples.get(key, 0) + amount
+
+    def set(self, name: str, help_text: str, value: float, labels: Optional[Dict[str, str]] = None):
+        """Set a gauge"""
+        with self._lock:
+            self._family(name, 'gauge', help_text).samples[self._key(labels)] = value
+
+    def observe(self, name: str, help_text: str, value: float, labels: Optional[Dict[str, str]] = None):
+        """Add one observation to a histogram"""
+        with self._lock:
+            family = self._family(name, 'histogram', help_text)
+            key = self._key(labels)
+            state = family.samples.get(key)
+            if state is None:
+                state = family.samples[key] = [[0] * (len(family.buckets) + 1), 0.0, 0]
+            index = next((i for i, bound in enumerate(family.buckets) if value <= bound), len(family.buckets))
+            state[0][index] += 1
+            state[1] += value
+            state[2] += 1
+
+    def render(self) -> str:
+        """OpenMetrics text exposition of every metric"""
+        with self._lock:
+            lines = []
+            for name in sorted(self._families):
+                lines.extend(self._families[name].render())
+        lines.append("# EOF")
+        return "\n".join(lines) + "\n"
+
+
+class _ThreadingHTTPServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+class MetricsServer:
+    """Serves a MetricsRegistry at http://host:port/metrics from a daemon thread"""
+
+    def __init__(self, registry: MetricsRegistry, port: int, host: str = DEFAULT_METRICS_HOST):
+        self.registry = registry
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(handler):
+                if handler.path.split('?')[0] not in ('/metrics', '/'):
+                    handler.send_error(404)
+                    return
+                body = registry.render().encode('utf-8')
+                handler.send_response(200)
+                handler.send_header('Content-Type', OPENMETRICS_CONTENT_TYPE)
+                handler.send_header('Content-Length', str(len(body)))
+                handler.end_headers()
+                handler.wfile.write(body)
+
+            def log_message(handler, format, *args):
+                pass  # keep the tools' console output clean
+
+        self.httpd = _ThreadingHTTPServer((host, port), Handler)
+        self.address = self.httpd.server_address
+        self.thread = threading.Thread(target=self.httpd.serve_forever, name='metrics-server', daemon=True)
+        self.thread.start()
+
+    def close(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+def _escape_tag(value: str) -> str:
+    return str(value).replace('\\', '\\\\').replace(',', '\\,').replace('=', '\\=').replace(' ', '\\ ')
+
+
+def _format_field(value) -> str:
+    if isinstance(value, bool):
+        return 'true' if value else 'false'
+    if isinstance(value, int):
+        return f"{value}i"
+    if isinstance(value, float):
+        return repr(value)
+    return '"' + str(value).replace('\\', '\\\\').replace('"', '\\"') + '"'
+
+
+class InfluxSink:
+    """Appends points to a file in InfluxDB line protocol (nanosecond timestamps)"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._file = open(path, 'a')
+
+    def write(self, measurement: str, tags: Dict[str, str], fields: Dict, ts: Optional[float] = None):
+        fields = {key: value for key, value in fields.items() if value is not None}
+        if not fields:
+            return
+        timestamp = int((time.time() if ts is None else ts) * 1e9)
+        tag_text = "".join(f",{key}={_escape_tag(value)}" for key, value in sorted(tags.items()) if value)
+        field_text = ",".join(f"{key}={_format_field(value)}" for key, value in fields.items())
+        with self._lock:
+            self._file.write(f"{measurement}{tag_text} {field_text} {timestamp}\n")
+            self._file.flush()
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+
+
+def parse_listen(listen: str) -> Tuple[str, int]:
+    """'9108' or 'host:9108' -> (host, port)"""
+    host, _, port = listen.rpartition(':')
+    return host or DEFAULT_METRICS_HOST, int(port)
+
+
+class Exporter:
+    """
+    Feeds tool results into a MetricsRegistry (served over HTTP when listen
+    is given) and/or an InfluxSink.
+    """
+
+    def __init__(self, listen: Optional[str] = None, influx_file: Optional[str] = None):
+        self.registry = MetricsRegistry()
+        self.server = None
+        self.influx = InfluxSink(influx_file) if influx_file else None
+        if listen:
+            host, port = parse_listen(listen)
+            self.server = MetricsServer(self.registry, port, host)
+
+    def close(self):
+        if self.server is not None:
+            self.server.close()
+        if self.influx is not None:
+            self.influx.close()
+
+    def _latency(self, labels: Dict[str, str], probe: str, values_ms: List[float], ts: float):
+        for value in all_samples(values_ms):
+            self.registry.observe('atlaspool_probe_latency_seconds', 'Probe latency by probe type',
+                                  value / 1000, dict(labels, probe=probe))
+            if self.influx is not None:
+                self.influx.write('atlaspool_probe', dict(labels, probe=probe), {'latency_ms': float(value)}, ts)
+
+    def _attempts(self, labels: Dict[str, str], probe: str, attempted: int, failed: int, ts: float):
+        self.registry.inc('atlaspool_probes', 'Probes attempted', dict(labels, probe=probe), attempted)
+        self.registry.inc('atlaspool_probe_failures', 'Probes that failed', dict(labels, probe=probe), failed)
+        if self.influx is not None and failed:
+            self.influx.write('atlaspool_probe_failure', dict(labels, probe=probe), {'count': failed}, ts)
+
+    def observe_stratum_result(self, result: Dict):
+        """Record a stratum_test.py result dict"""
+        ts = time.time()
+        labels = {'pool': f"{result['hostname']}:{result['port']}", 'name': result['display_name']}
+        successes = sketch_of(result['stratum_times']).count
+        runs = result.get('runs', successes)
+
+        self._latency(labels, 'ping', result.get('ping_times') or [], ts)
+        self._latency(labels, 'tcp_rtt', result.get('tcp_rtt_times') or [], ts)
+        self._latency(labels, 'stratum', result['stratum_times'], ts)
+        self._attempts(labels, 'stratum', runs, max(0, runs - successes), ts)
+        for phase in PHASES:
+            for value in all_samples(result.get('phase_times', {}).get(phase) or []):
+                self.registry.observe('atlaspool_stratum_phase_seconds', 'Stratum probe latency by phase',
+                                      value / 1000, dict(labels, phase=phase))
+
+        if result.get('tls_port'):
+            tls_ok = (sketch_of(result.get('tls_times') or []).count
+                      + sketch_of(result.get('tls_resumed_times') or []).count)
+            tls_failed = len(result.get('tls_errors') or [])
+            self._latency(labels, 'tls', result.get('tls_times') or [], ts)
+            self._latency(labels, 'tls_resumed', result.get('tls_resumed_times') or [], ts)
+            self._attempts(labels, 'tls', tls_ok + tls_failed, tls_failed, ts)
+
+    def observe_template_result(self, result: Dict):
+        """Record a pool-mempool.py test_pool() result"""
+        ts = time.time()
+        labels = {'pool': f"{result['hostname']}:{result['port']}", 'name': result['display_name']}
+        self._attempts(labels, 'template', 1, 0 if result['success'] else 1, ts)
+        if not result['success']:
+            return
+        self._latency(labels, 'template', [result['response_time_ms']], ts)
+        self.registry.set('atlaspool_template_fees_sats', 'Transaction fees in the latest block template',
+                          result['transaction_fees_sats'], labels)
+        if result['block_height'] is not None:
+            self.registry.set('atlaspool_template_block_height', 'Block height of the latest block template',
+                              result['block_height'], labels)
+        if self.influx is not None:
+            self.influx.write('atlaspool_template', labels, {
+                'fees_sats': result['transaction_fees_sats'],
+                'block_height': result['block_height'],
+                'total_payout_btc': result['total_payout_btc']
+            }, ts)
+
+    def observe_prevhash_snapshot(self, results: Dict[str, Dict]):
+        """Record one prevhash_timeline.py snapshot ({name: get_prevhash() result})"""
+        ts = time.time()
+        prevhashes = Counter(r['prevhash'] for r in results.values() if r['prevhash'])
+        majority = prevhashes.most_common(1)[0][0] if prevhashes else None
+        self.registry.set('atlaspool_prevhash_unique', 'Distinct prevhashes in the latest snapshot', len(prevhashes))
+        for name, result in results.items():
+            labels = {'pool': f"{result['host']}:{result['port']}", 'name': name}
+            self._attempts(labels, 'prevhash', 1, 0 if result['prevhash'] else 1, ts)
+            if not result['prevhash']:
+                continue
+            agrees = int(result['prevhash'] == majority)
+            self.registry.set('atlaspool_prevhash_agreement', 'Pool prevhash matches the majority (1) or not (0)',
+                              agrees, labels)
+            if self.influx is not None:
+                self.influx.write('atlaspool_prevhash', labels, {'agrees': agrees, 'prevhash': result['prevhash']}, ts)
@@ -16,8 +16,9 @@ Features:
   • Transaction fee calculation from coinbase outputs
   • Block height tracking to detect stale templates
   • Multiple runs for consistency analysis
-  • JSON output for automation
+  • JSON output for automation (--json, or streamed JSON Lines with --ndjson)
   • Detailed timing metrics
+  • IPv6 (-6), or IPv4 and IPv6 templates side by side (--dual-stack)
 
 Usage:
     # Single run
@@ -31,6 +32,12 @@ Usage:
     
     # Verbose output with coinbase details
     python3 pool-mempool.py -v
+    
+    # Each pool over IPv4 and IPv6
+    python3 pool-mempool.py --dual-stack
+    
+    # Finish within 15 seconds (pools without a template by then show TIMEOUT)
+    python3 pool-mempool.py --deadline 15
 
 Requirements:
   • Python 3.6+
@@ -39,20 +46,32 @@ Requirements:
 Version: 1.0
 """
 
-import socket
 import json
 import time
 import sys
+import socket
 import argparse
 import binascii
-from typing import Optional, Tuple, Dict, List
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Optional, Tuple, Dict, List, Callable
 from statistics import mean, median, stdev
 from datetime import datetime
 
+from stratum_client import StratumClient
+from probe_scheduler import ProbeScheduler
+from history_db import HistoryStore, DEFAULT_HISTORY_PATH
+from stratum_test import client_info
+from metrics_exporter import Exporter
+import dual_stack
+
 # Current block subsidy (after 2024 halving)
 BLOCK_SUBSIDY_BTC = 3.125
 
+# Default cap on pools tested at once (--concurrency)
+DEFAULT_CONCURRENCY = 20
+
+# Error of pools still outstanding at the --deadline
+DEADLINE_ERROR = 'TIMEOUT'
+
 # Pool configuration (from stratum_test.py)
 POOLS = [
     ("solo.atlaspool.io", 3333, "AtlasPool.io", "*MANY*"),
@@ -73,123 +92,43 @@ POOLS = [
 ]
 
 
-def connect_and_get_template(host: str, port: int, timeout: int = 10) -> Tuple[Optional[dict], Optional[float]]:
+def connect_and_get_template(host: str, port: int, timeout: int = 10,
+                             family: int = socket.AF_INET) -> Tuple[Optional[dict], Optional[float]]:
     """
-    Connect to pool and get block template.
+    Connect to pool (over family) and get block template.
     Returns (notify_params, elapsed_time_ms) or (None, None) on failure.
+    
+    The whole exchange shares one deadline of `timeout` seconds; each step
+    returns as soon as the expected reply or mining.notify arrives.
     """
-    sock = None
+    client = StratumClient(host, port, timeout, family)
     try:
-        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        sock.settimeout(timeout)
-        
         start_time = time.time()
-        sock.connect((host, port))
+        deadline = start_time + timeout
+        client.connect()
         
         # Send mining.subscribe
-        subscribe_msg = json.dumps({
-            "id": 1,
-            "method": "mining.subscribe",
-            "params": ["pool-mempool/1.0"]
-        }) + "\n"
-        
-        sock.sendall(subscribe_msg.encode('utf-8'))
-        
-        # Wait for response to arrive
-        time.sleep(0.2)
-        
-        # Receive subscribe response
-        response_parts = []
-        sock.settimeout(2)
-        
-        try:
-            for _ in range(2):
-                chunk = sock.recv(4096).decode('utf-8')
-                if chunk:
-                    response_parts.append(chunk)
-                    if '\n' in chunk and '"id":1' in chunk:
-                        break
-                time.sleep(0.1)
-        except socket.timeout:
-            pass
-        
-        response = ''.join(response_parts).strip()
-        if not response:
-            return None, None
-        
-        # Parse subscribe response
-        subscribe_ok = False
-        for line in response.split('\n'):
-            if line.strip():
-                try:
-                    data = json.loads(line)
-                    if data.get('id') == 1 and 'result' in data:
-                        subscribe_ok = True
-                        break
-                except json.JSONDecodeError:
-                    continue
-        
-        if not subscribe_ok:
+        subscribe_response = client.subscribe(["pool-mempool/1.0"], timeout=deadline - time.time())
+        if not subscribe_response or 'result' not in subscribe_response:
             return None, None
         
         # Send mining.authorize
-        authorize_msg = json.dumps({
-            "id": 2,
-            "method": "mining.authorize",
-            "params": ["bc1qxy2kgdygjrsqtzq2n0yrf2493p83kkfjhx0wlh", "x"]
-        }) + "\n"
-        
-        sock.sendall(authorize_msg.encode('utf-8'))
-        
-        # Wait for response to arrive
-        time.sleep(0.3)
-        
-        # Receive authorize response and mining.notify
-        response_parts = []
-        sock.settimeout(2)
+        authorize_response = client.authorize("bc1qxy2kgdygjrsqtzq2n0yrf2493p83kkfjhx0wlh", "x",
+                                              timeout=deadline - time.time())
+        if not authorize_response:
+            return None, None
         
-        try:
-            # Try to read multiple times to get complete response
-            for _ in range(3):
-                chunk = sock.recv(8192).decode('utf-8')
-                if chunk:
-                    response_parts.append(chunk)
-                    # If we got authorize response, break
-                    if '\n' in chunk and '"id":2' in chunk:
-                        break
-                time.sleep(0.1)
-        except socket.timeout:
-            pass  # Normal - no more data
-        
-        response = ''.join(response_parts).strip()
+        # Wait for the block template
+        notify_params = client.wait_for_notify(deadline - time.time())
         
         elapsed_time = (time.time() - start_time) * 1000
         
-        if not response:
-            return None, None
-        
-        # Look for mining.notify in response
-        notify_params = None
-        for line in response.split('\n'):
-            if line.strip():
-                try:
-                    data = json.loads(line)
-                    if data.get('method') == 'mining.notify':
-                        notify_params = data.get('params')
-                        break
-                except json.JSONDecodeError:
-                    continue
-        
         return notify_params, elapsed_time
         
     except Exception as e:
         return None, None
     finally:
-        if sock:
-            try:
-                sock.close()
-            except:
-                pass
+        client.close()
 
 
 def parse_coinbase_outputs(coinb2_hex: str, coinb1_hex: str = None) -> list:
@@ -300,7 +239,8 @@ def parse_block_height(coinb1_hex: str) -> Optional[int]:
         return None
 
 
-def test_pool(hostname: str, port: int, display_name: str, country_code: str, timeout: int = 10) -> Dict:
+def test_pool(hostname: str, port: int, display_name: str, country_code: str, timeout: int = 10,
+              family: int = socket.AF_INET) -> Dict:
     """
     Test a single pool and return mempool state.
     """
@@ -320,7 +260,7 @@ def test_pool(hostname: str, port: int, display_name: str, country_code: str, ti
     }
     
     try:
-        notify_params, elapsed_time = connect_and_get_template(hostname, port, timeout)
+        notify_params, elapsed_time = connect_and_get_template(hostname, port, timeout, family)
         
         if not notify_params or len(notify_params) < 9:
             result['error'] = 'No template received'
@@ -366,30 +306,96 @@ def test_pool(hostname: str, port: int, display_name: str, country_code: str, ti
         return result
 
 
-def test_all_pools(pools: List[Tuple], timeout: int = 10, max_workers: int = 20) -> List[Dict]:
+def timed_out_result(hostname: str, port: int, display_name: str, country_code: str) -> Dict:
+    """Result of a pool still outstanding at the --deadline"""
+    return {
+        'hostname': hostname,
+        'port': port,
+        'display_name': display_name,
+        'country_code': country_code,
+        'success': False,
+        'error': DEADLINE_ERROR,
+        'response_time_ms': None,
+        'block_height': None,
+        'total_payout_btc': None,
+        'transaction_fees_btc': None,
+        'transaction_fees_sats': None,
+        'output_count': None,
+    }
+
+
+def test_all_pools(pools: List[Tuple], timeout: int = 10, scheduler: Optional[ProbeScheduler] = None,
+                   on_result: Optional[Callable[[Dict], None]] = None,
+                   family: int = socket.AF_INET, deadline: Optional[float] = None) -> List[Dict]:
     """
-    Test all pools concurrently.
+    Test all pools concurrently, connecting over family (pools given by
+    address, as dual_stack.split_pools() returns them, use the address's family).
+    
+    Connections go through scheduler (per-pool rate limit and an adaptive
+    global in-flight cap); pass the same scheduler for every run.
+    on_result is called with each result as soon as that pool completes.
+    
+    With deadline (a time.monotonic() value), pools still outstanding then
+    are abandoned and get a TIMEOUT result (see timed_out_result).
     """
-    results = []
+    if scheduler is None:
+        scheduler = ProbeScheduler(max_in_flight=DEFAULT_CONCURRENCY)
     
-    with ThreadPoolExecutor(max_workers=max_workers) as executor:
-        # Submit all futures at once using dictionary comprehension
-        futures = {
-            executor.submit(test_pool, hostname, port, display_name, country_code, timeout): (hostname, display_name)
-            for hostname, port, display_name, country_code in pools
-        }
-        
-        # Collect results as they complete
-        for future in as_completed(futures):
-            try:
-                result = future.result()
-                results.append(result)
-            except Exception as e:
-                # Should not happen since test_pool catches exceptions
-                hostname, display_name = futures[future]
-                print(f"  Error testing {display_name}: {e}")
+    return scheduler.map(
+        lambda hostname, port, display_name, country_code: test_pool(hostname, port, display_name, country_code,
+                                                                     timeout, family),
+        pools,
+        key=lambda pool: pool[0],
+        error_of=lambda result: result['error'],
+        on_result=on_result,
+        deadline=deadline,
+        on_timeout=timed_out_result
+    )
+
+
+def print_family_comparison(results: List[Dict], families: Dict[str, Tuple[str, str]]):
+    """
+    Print each pool's IPv4 and IPv6 template side by side (--dual-stack):
+    response times, and whether both families got the same block height
+    and fees (a mismatch means different backends behind the two addresses).
+    """
+    pools = {}
+    for result in results:
+        if result['display_name'] in families:
+            name, label = families[result['display_name']]
+            pools.setdefault(name, {})[label] = result
+    if not pools:
+        return
     
-    return results
+    name_width = max(max(len(name) for name in pools), len("Pool Name"))
+    print()
+    print("IPv4 vs IPv6:")
+    print(f"  {'Pool Name'.ljust(name_width)}  {'IPv4 (ms)':>9}  {'IPv6 (ms)':>9}  {'Faster':<20}  Template")
+    for name, by_family in sorted(pools.items()):
+        times = {}
+        cells = []
+        for label in ('IPv4', 'IPv6'):
+            result = by_family.get(label)
+            if result is None:
+                cells.append('-')
+            elif result['success'] and result['response_time_ms'] is not None:
+                times[label] = result['response_time_ms']
+                cells.append(f"{result['response_time_ms']:.0f}")
+            else:
+                cells.append('FAILED')
+        if len(times) == 2:
+            winner = min(times, key=times.get)
+            faster = f"{winner} by {abs(times['IPv4'] - times['IPv6']):.0f} ms"
+        elif len(by_family) == 1:
+            faster = f"{next(iter(by_family))} only"
+        else:
+            faster = '-'
+        template = '-'
+        if len(times) == 2:
+            v4, v6 = by_family['IPv4'], by_family['IPv6']
+            same = (v4['block_height'], v4['transaction_fees_sats']) == (v6['block_height'], v6['transaction_fees_sats'])
+            template = 'same' if same else 'differs'
+        print(f"  {name.ljust(name_width)}  {cells[0]:>9}  {cells[1]:>9}  {faster:<20}  {template}")
 
 
 def print_results_table(results: List[Dict], run_number: int = None, verbose: bool = False):
@@ -458,6 +464,11 @@ def print_results_table(results: List[Dict], run_number: int = None, verbose: bo
                 fees_sats = 'N/A'.ljust(10)
             
             time_ms = f"{int(result['response_time_ms'])}".ljust(8) if result['response_time_ms'] else 'N/A'.ljust(8)
+        elif result['error'] == DEADLINE_ERROR:
+            height = DEADLINE_ERROR.ljust(10)
+            fees_btc = '-'.ljust(16)
+            fees_sats = '-'.ljust(10)
+            time_ms = '-'.ljust(8)
         else:
             height = 'FAILED'.ljust(10)
             fees_btc = (result['error'][:14] if result['error'] else 'Error').ljust(16)
@@ -523,27 +534,79 @@ def print_json_output(all_runs: List[List[Dict]]):
         }
         
         for result in results:
-            pool_data = {
-                'hostname': result['hostname'],
-                'port': result['port'],
-                'display_name': result['display_name'],
-                'country_code': result['country_code'],
-                'success': result['success'],
-                'error': result['error'],
-                'response_time_ms': result['response_time_ms'],
-                'block_height': result['block_height'],
-                'total_payout_btc': result['total_payout_btc'],
-                'transaction_fees_btc': result['transaction_fees_btc'],
-                'transaction_fees_sats': result['transaction_fees_sats'],
-                'output_count': result['output_count'],
-            }
-            run_data['pools'].append(pool_data)
+            run_data['pools'].append(pool_to_json(result))
         
         output['runs'].append(run_data)
     
     print(json.dumps(output, indent=2))
 
 
+def pool_to_json(result: Dict) -> Dict:
+    """
+    JSON representation of one pool result (shared by --json and --ndjson).
+    """
+    return {
+        'hostname': result['hostname'],
+        'port': result['port'],
+        'display_name': result['display_name'],
+        'country_code': result['country_code'],
+        'success': result['success'],
+        'error': result['error'],
+        'response_time_ms': result['response_time_ms'],
+        'block_height': result['block_height'],
+        'total_payout_btc': result['total_payout_btc'],
+        'transaction_fees_btc': result['transaction_fees_btc'],
+        'transaction_fees_sats': result['transaction_fees_sats'],
+        'output_count': result['output_count'],
+    }
+
+
+class NdjsonWriter:
+    """
+    Streams JSON Lines: one {"type": "pool"} record per pool as soon as it
+    completes, then a {"type": "summary"} record from finish(). Only running
+    totals are kept, so any number of runs and pools can be streamed.
+    """
+    
+    def __init__(self):
+        self.started = datetime.now().isoformat()
+        self.run_number = 0
+        self.pools = 0
+        self.successful = 0
+        self.max_height = None
+        self.best = None  # (display_name, transaction_fees_sats)
+    
+    def start_run(self, run_number: int):
+        self.run_number = run_number
+    
+    def write(self, result: Dict):
+        self.pools += 1
+        if result['success']:
+            self.successful += 1
+            if result['block_height'] is not None:
+                self.max_height = max(self.max_height or 0, result['block_height'])
+            fees = result['transaction_fees_sats']
+            if fees is not None and (self.best is None or fees > self.best[1]):
+                self.best = (result['display_name'], fees)
+        
+        record = {'type': 'pool', 'run_number': self.run_number, 'timestamp': datetime.now().isoformat()}
+        record.update(pool_to_json(result))
+        print(json.dumps(record), flush=True)
+    
+    def finish(self):
+        summary = {
+            'type': 'summary',
+            'timestamp': self.started,
+            'block_subsidy_btc': BLOCK_SUBSIDY_BTC,
+            'runs': self.run_number,
+            'pools_tested': self.pools,
+            'successful': self.successful,
+            'max_block_height': self.max_height,
+            'highest_fees': {'display_name': self.best[0], 'transaction_fees_sats': self.best[1]} if self.best else None
+        }
+        print(json.dumps(summary), flush=True)
+
+
 def main():
     parser = argparse.ArgumentParser(
         description='Compare mempool state across Bitcoin solo mining pools',
@@ -559,8 +622,23 @@ Examples:
   JSON output:
     python3 pool-mempool.py --json
   
+  Stream JSON Lines (one record per pool as it completes):
+    python3 pool-mempool.py --ndjson --runs 10
+  
   Verbose output:
     python3 pool-mempool.py -v
+  
+  Record fees and template times for trend analysis (query with history_db.py):
+    python3 pool-mempool.py --history
+  
+  Serve metrics to Prometheus during 100 runs, and log them for InfluxDB:
+    python3 pool-mempool.py --runs 100 --metrics 9109 --influx-file mempool.lp
+  
+  Compare each pool's IPv4 and IPv6 templates and response times:
+    python3 pool-mempool.py --dual-stack
+  
+  Finish within 15 seconds, reporting whatever has completed by then:
+    python3 pool-mempool.py --runs 3 --deadline 15
 
 What This Shows:
   • Transaction fees indicate mempool freshness and optimization
@@ -578,8 +656,31 @@ Note: Small fee differences (0.001-0.005 BTC) are normal due to:
     
     parser.add_argument('--runs', type=int, default=1, help='Number of test runs (default: 1)')
     parser.add_argument('--timeout', type=int, default=10, help='Connection timeout in seconds (default: 10)')
+    parser.add_argument('--deadline', type=float, metavar='SECONDS',
+                        help='Finish within SECONDS: pools still outstanding then are marked TIMEOUT, no further '
+                             'runs start, and results are printed from whatever completed')
     parser.add_argument('--json', action='store_true', help='Output results in JSON format')
+    parser.add_argument('--ndjson', action='store_true',
+                        help='Stream JSON Lines: one record per pool as it completes, then a summary record')
     parser.add_argument('-v', '--verbose', action='store_true', help='Verbose output with additional details')
+    parser.add_argument('--history', nargs='?', const=DEFAULT_HISTORY_PATH, metavar='PATH',
+                        help=f'Record template times, fees and block heights in a local SQLite history database '
+                             f'(default: {DEFAULT_HISTORY_PATH}). Query it with history_db.py')
+    parser.add_argument('--metrics', metavar='[HOST:]PORT',
+                        help='Serve fee, block height and template time metrics at http://HOST:PORT/metrics '
+                             '(OpenMetrics) while the runs last')
+    parser.add_argument('--influx-file', metavar='PATH',
+                        help='Append every result to PATH in InfluxDB line protocol')
+    parser.add_argument('--concurrency', type=int, default=DEFAULT_CONCURRENCY, metavar='N',
+                        help=f'Maximum pools tested at once (default: {DEFAULT_CONCURRENCY}). '
+                             'Adapts downwards on timeouts/resets; each pool is also rate limited')
+    family_group = parser.add_mutually_exclusive_group()
+    family_group.add_argument('-4', '--ipv4', dest='family', action='store_const', const=socket.AF_INET,
+                              default=socket.AF_INET, help='Connect over IPv4 (default)')
+    family_group.add_argument('-6', '--ipv6', dest='family', action='store_const', const=socket.AF_INET6,
+                              help='Connect over IPv6')
+    family_group.add_argument('--dual-stack', action='store_true',
+                              help='Test every pool over both IPv4 and IPv6 and compare them side by side')
     
     args = parser.parse_args()
     
@@ -590,33 +691,109 @@ Note: Small fee differences (0.001-0.005 BTC) are normal due to:
     if args.runs > 10:
         print("Warning: Running more than 10 times may take a while...")
     
-    all_runs = []
+    if args.concurrency < 1:
+        print("Error: --concurrency must be at least 1", file=sys.stderr)
+        return 1
+    
+    if args.json and args.ndjson:
+        print("Error: use either --json or --ndjson", file=sys.stderr)
+        return 1
+    
+    if args.deadline is not None and args.deadline <= 0:
+        print("Error: --deadline must be positive", file=sys.stderr)
+        return 1
+    deadline = time.monotonic() + args.deadline if args.deadline is not None else None
+    
+    def deadline_passed():
+        return deadline is not None and time.monotonic() >= deadline
+    
+    def pause_between_runs():
+        # 5 seconds between runs, but never past the deadline
+        time.sleep(5 if deadline is None else min(5, max(deadline - time.monotonic(), 0)))
+    
+    # Optional metrics export
+    exporter = None
+    if args.metrics or args.influx_file:
+        try:
+            exporter = Exporter(args.metrics, args.influx_file)
+        except (OSError, ValueError) as e:
+            print(f"Error: cannot start metrics export: {e}", file=sys.stderr)
+            return 1
     
-    for run in range(args.runs):
-        if not args.json:
-            if run > 0:
-                print(f"\nWaiting 5 seconds before next run...")
-                time.sleep(5)
+    # Optional history database: one history run for all test runs
+    history_store = HistoryStore(args.history) if args.history else None
+    history_run = history_store.start_run('pool-mempool', client_info()) if history_store else None
+    
+    try:
+        # --dual-stack: one entry per pool and address family
+        pools, families = dual_stack.split_pools(POOLS, deadline=deadline) if args.dual_stack else (POOLS, {})
+        
+        def record_history(results):
+            if history_run is not None:
+                for result in results:
+                    history_run.record_template_result(result)
+            if exporter is not None:
+                for result in results:
+                    exporter.observe_template_result(result)
+        
+        # Streaming JSON Lines output keeps nothing but running totals
+        if args.ndjson:
+            scheduler = ProbeScheduler(max_in_flight=args.concurrency)
+            writer = NdjsonWriter()
+            for run in range(args.runs):
+                if run > 0:
+                    pause_between_runs()
+                if run > 0 and deadline_passed():
+                    break
+                writer.start_run(run + 1)
+                record_history(test_all_pools(pools, timeout=args.timeout, scheduler=scheduler,
+                                              on_result=writer.write, family=args.family, deadline=deadline))
+            writer.finish()
+            return 0
+        
+        # One scheduler for all runs, so per-pool rate limits carry over
+        scheduler = ProbeScheduler(max_in_flight=args.concurrency)
+        all_runs = []
+        
+        for run in range(args.runs):
+            if not args.json:
+                if run > 0:
+                    print(f"\nWaiting 5 seconds before next run...")
+                    pause_between_runs()
             
-            if args.runs > 1:
-                print(f"\nStarting run {run + 1}/{args.runs}...")
-            else:
-                print(f"\nTesting {len(POOLS)} pools concurrently...")
-        
-        results = test_all_pools(POOLS, timeout=args.timeout)
-        all_runs.append(results)
-        
-        if not args.json:
-            print_results_table(results, run_number=(run + 1) if args.runs > 1 else None, verbose=args.verbose)
+            if run > 0 and deadline_passed():
+                if not args.json:
+                    print(f"Deadline reached after {run} of {args.runs} runs")
+                break
+            
+            if not args.json:
+                if args.runs > 1:
+                    print(f"\nStarting run {run + 1}/{args.runs}...")
+                else:
+                    print(f"\nTesting {len(pools)} pools concurrently...")
+            
+            results = test_all_pools(pools, timeout=args.timeout, scheduler=scheduler, family=args.family,
+                                     deadline=deadline)
+            all_runs.append(results)
+            record_history(results)
+            
+            if not args.json:
+                print_results_table(results, run_number=(run + 1) if args.runs > 1 else None, verbose=args.verbose)
+                print_family_comparison(results, families)
+    finally:
+        if history_store is not None:
+            history_store.close()
+        if exporter is not None:
+            exporter.close()
     
     # Print JSON output if requested
     if args.json:
         print_json_output(all_runs)
     
     # Print summary if multiple runs
-    if args.runs > 1 and not args.json:
+    if len(all_runs) > 1 and not args.json:
         print(f"\n{'=' * 100}")
-        print(f"MULTI-RUN SUMMARY ({args.runs} runs)")
+        print(f"MULTI-RUN SUMMARY ({len(all_runs)} runs)")
         print(f"{'=' * 100}")
         print()
         
@@ -0,0 +1,426 @@
+#!/usr/bin/env python3
+"""
+Probe Scheduler
+
+Shared rate limiting for the tools in this repository (stratum_test.py,
+verify_pool.py, pool-mempool.py and findings/prevhash_timeline.py), so they
+can probe many pools at high overall throughput without hammering any
+single one.
+
+Two limits apply to every connection a tool opens:
+  • Per-pool token bucket: each pool may receive at most `pool_rate`
+    connections per second (bursts up to `pool_burst`). Buckets are keyed by
+    hostname AND resolved IP, so two hostnames that point at the same server
+    share one budget. The IP comes from `resolve` (e.g. a DnsCache's
+    address(), so the scheduler keys on the addresses probes connect to and
+    never resolves on its own), else from one getaddrinfo() per host.
+  • Global in-flight cap: at most `max_in_flight` probes run at once. The cap
+    adapts AIMD-style: it grows by one after a cap's worth of clean probes and
+    halves (at most once per second) when probes see timeouts or connection
+    resets - the usual signs of local congestion or a pool pushing back.
+  • Optional global pacing: with `probe_gap`, probe starts are spaced at
+    least that many seconds apart (each gap randomized by +/- `jitter`), so
+    probes of different pools never fire as one synchronized burst.
+
+Every slot records when its probe started (wall clock) and how many probes
+were in flight at that moment, for analysing scheduling bias.
+
+For bounded runs (--deadline), map() takes a deadline and run_until() runs
+calls on daemon threads until one: calls still running then are abandoned
+rather than waited for, so neither they nor their sockets' timeouts keep a
+tool (or the process's exit) waiting.
+
+Usage:
+    from probe_scheduler import ProbeScheduler
+
+    scheduler = ProbeScheduler(max_in_flight=64)
+
+    # Rate-limit by the addresses a DnsCache resolved, without resolving again
+    scheduler = ProbeScheduler(max_in_flight=64, resolve=dns_cache.address)
+
+    # Threads
+    with scheduler.slot("solo.atlaspool.io") as slot:
+        error = probe(...)
+        slot.report(error)
+
+    results = scheduler.map(test_pool, pools, key=lambda pool: pool[0])
+
+    # Bounded: pools not done within 30 s get on_timeout(pool) instead
+    results = scheduler.map(test_pool, pools, key=lambda pool: pool[0],
+                            deadline=time.monotonic() + 30, on_timeout=timed_out_result)
+
+    # asyncio
+    async with scheduler.async_slot("solo.atlaspool.io") as slot:
+        ...
+
+    # Staggered: one probe start every 10 ms +/- 50%
+    scheduler = ProbeScheduler(max_in_flight=64, probe_gap=0.01, jitter=0.5)
+
+Requirements:
+  • Python 3.6+ (async_slot requires 3.7+)
+  • No external dependencies
+"""
+
+import socket
+import threading
+import time
+import random
+import asyncio
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Optional, Dict, List, Callable, Any
+
+# Defaults shared by the tools
+DEFAULT_POOL_RATE = 10.0      # connections per second per pool
+DEFAULT_POOL_BURST = 10       # connections allowed back to back per pool
+DEFAULT_MAX_IN_FLIGHT = 64    # global cap on concurrent probes
+DEFAULT_MIN_IN_FLIGHT = 4     # the adaptive cap never drops below this
+DEFAULT_PROBE_GAP = 0.0       # seconds between probe starts (0 = no pacing)
+DEFAULT_JITTER = 0.5          # +/- fraction applied to gaps and run intervals
+
+# Error text that signals congestion or a pool pushing back. Refused
+# connections and DNS failures are deliberately not included: a dead port
+# says nothing about load.
+CONGESTION_ERRORS = ('timeout', 'timed out', 'reset', 'broken pipe', 'too many')
+
+
+def jittered(seconds: float, jitter: float) -> float:
+    """seconds randomized uniformly by +/- jitter (a fraction of seconds)"""
+    if seconds <= 0 or jitter <= 0:
+        return max(seconds, 0.0)
+    return seconds * random.uniform(1 - jitter, 1 + jitter)
+
+
+def run_until(calls: List[Callable[[], Any]], deadline: float, max_workers: Optional[int] = None,
+              on_result: Optional[Callable[[int, Any], None]] = None) -> Dict[int, Any]:
+    """
+    Call every function in calls on daemon threads, up to max_workers at a
+    time (default: all at once), until deadline (a time.monotonic() value).
+    Returns {index in calls: return value} of the calls that finished by
+    then; calls not started by the deadline are skipped. on_result(index,
+    value) is called on the calling thread as calls finish, and an exception
+    raised by a call is re-raised there.
+    """
+    pending = list(enumerate(calls))
+    finished = []  # (index, value, exception) in completion order
+    cond = threading.Condition()
+    
+    def worker():
+        while True:
+            with cond:
+                if not pending or time.monotonic() >= deadline:
+                    return
+                index, call = pending.pop(0)
+            try:
+                outcome = (index, call(), None)
+            except Exception as e:
+                outcome = (index, None, e)
+            with cond:
+                finished.append(outcome)
+                cond.notify_all()
+    
+    for _ in range(min(max_workers or len(calls), len(calls))):
+        threading.Thread(target=worker, daemon=True).start()
+    
+    results = {}
+    while len(results) < len(calls):
+        with cond:
+            while len(finished) == len(results) and time.monotonic() < deadline:
+                cond.wait(deadline - time.monotonic())
+            new = finished[len(results):]
+        if not new:
+            break
+        for index, value, error in new:
+            if error is not None:
+                raise error
+            results[index] = value
+            if on_result is not None:
+                on_result(index, value)
+    return results
+
+
+def is_congestion_error(error: Any) -> bool:
+    """True if an exception or error message looks like a timeout or reset"""
+    if error is None:
+        return False
+    if isinstance(error, (socket.timeout, asyncio.TimeoutError, ConnectionResetError,
+                          ConnectionAbortedError, BrokenPipeError)):
+        return True
+    text = str(error).lower() or type(error).__name__.lower()
+    return any(marker in text for marker in CONGESTION_ERRORS)
+
+
+class TokenBucket:
+    """
+    Classic token bucket. reserve() takes a token immediately and returns how
+    long the caller must wait before using it, so the same bucket serves
+    threads (time.sleep) and coroutines (asyncio.sleep).
+    """
+
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self, tokens: float = 1) -> float:
+        """Take tokens (possibly going into debt) and return the wait in seconds"""
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= tokens
+            if self.tokens >= 0:
+                return 0.0
+            return -self.tokens / self.rate
+
+
+class Slot:
+    """
+    Handle for one scheduled probe; report() its outcome before leaving the
+    block. started_at (time.time()) and in_flight (probes running, this one
+    included) are set when the probe is let through.
+    """
+
+    def __init__(self):
+        self.error = None
+        self.started_at = None
+        self.in_flight = None
+
+    def report(self, error: Any = None):
+        """Record the probe's error (exception or message), or None on success"""
+        self.error = error
+
+
+class ProbeScheduler:
+    """Per-pool token buckets, optional global pacing and an adaptive global in-flight cap"""
+
+    def __init__(self, max_in_flight: int = DEFAULT_MAX_IN_FLIGHT, pool_rate: float = DEFAULT_POOL_RATE,
+                 pool_burst: int = DEFAULT_POOL_BURST, min_in_flight: int = DEFAULT_MIN_IN_FLIGHT,
+                 probe_gap: float = DEFAULT_PROBE_GAP, jitter: float = DEFAULT_JITTER,
+                 resolve: Optional[Callable[[str], Optional[str]]] = None):
+        self.max_in_flight = max(1, max_in_flight)
+        self.min_in_flight = max(1, min(min_in_flight, self.max_in_flight))
+        self.pool_rate = pool_rate
+        self.pool_burst = pool_burst
+        self.probe_gap = max(0.0, probe_gap)
+        self.jitter = min(max(jitter, 0.0), 1.0)
+        self._next_start = 0.0
+        self.cap = self.max_in_flight
+        self.in_flight = 0
+        self.completed = 0
+        self.congestion_events = 0
+        self._clean_streak = 0
+        self._last_decrease = 0.0
+        self._buckets = {}
+        self._address_of = resolve
+        self._addresses = {}
+        self._cond = threading.Condition()
+        self._async_waiters = []
+
+    # -- per-pool token buckets -------------------------------------------
+
+    def _resolve(self, host: str) -> Optional[str]:
+        """
+        Resolved IP for host: from the resolve callback if one was given,
+        else getaddrinfo() cached for the lifetime of the scheduler
+        """
+        if self._address_of is not None:
+            return self._address_of(host)
+        if host not in self._addresses:
+            try:
+                self._addresses[host] = socket.getaddrinfo(host, None, 0, socket.SOCK_STREAM)[0][4][0]
+            except (socket.gaierror, OSError):
+                self._addresses[host] = None
+        return self._addresses[host]
+
+    def _bucket(self, key: str) -> TokenBucket:
+        with self._cond:
+            if key not in self._buckets:
+                self._buckets[key] = TokenBucket(self.pool_rate, self.pool_burst)
+            return self._buckets[key]
+
+    def _reserve(self, host: str, cost: float) -> float:
+        """Take cost tokens from the host's and its IP's buckets; return the wait"""
+        keys = ['host:' + host]
+        address = self._resolve(host)
+        if address is not None and address != host:
+            keys.append('ip:' + address)
+        return max(self._bucket(key).reserve(cost) for key in keys)
+
+    def _pace(self) -> float:
+        """Claim the next probe start time; return the wait until it (0 without probe_gap)"""
+        if self.probe_gap <= 0:
+            return 0.0
+        with self._cond:
+            now = time.monotonic()
+            start = max(now, self._next_start)
+            self._next_start = start + jittered(self.probe_gap, self.jitter)
+            return start - now
+
+    # -- adaptive global cap ----------------------------------------------
+
+    def _try_enter(self, slot: Slot) -> bool:
+        with self._cond:
+            if self.in_flight < self.cap:
+                self.in_flight += 1
+                slot.started_at = time.time()
+                slot.in_flight = self.in_flight
+                return True
+            return False
+
+    def _leave(self, error: Any):
+        with self._cond:
+            self.in_flight -= 1
+            self.completed += 1
+            if is_congestion_error(error):
+                self.congestion_events += 1
+                self._clean_streak = 0
+                now = time.monotonic()
+                if now - self._last_decrease >= 1.0:
+                    self.cap = max(self.min_in_flight, self.cap // 2)
+                    self._last_decrease = now
+            else:
+                self._clean_streak += 1
+                if self._clean_streak >= self.cap and self.cap < self.max_in_flight:
+                    self.cap += 1
+                    self._clean_streak = 0
+            self._cond.notify_all()
+            waiters, self._async_waiters = self._async_waiters, []
+        for loop, future in waiters:
+            loop.call_soon_threadsafe(_wake, future)
+
+    # -- public API -------------------------------------------------------
+
+    def slot(self, host: str, cost: float = 1) -> '_ThreadSlot':
+        """
+        Context manager for one probe of host from a thread. Waits for the
+        pool's token bucket, the pacing gap and the global cap. cost is the
+        number of connections the probe opens.
+        """
+        return _ThreadSlot(self, host, cost)
+
+    def async_slot(self, host: str, cost: float = 1) -> '_AsyncSlot':
+        """asyncio version of slot(), for use with `async with`"""
+        return _AsyncSlot(self, host, cost)
+
+    def map(self, fn: Callable, items: List, key: Callable[[Any], str],
+            error_of: Optional[Callable[[Any], Any]] = None, on_result: Optional[Callable] = None,
+            deadline: Optional[float] = None, on_timeout: Optional[Callable] = None,
+            max_workers: Optional[int] = None) -> List:
+        """
+        Run fn(*item) for every item under the scheduler, using up to
+        max_workers threads (default: max_in_flight). key(item) gives the pool hostname and
+        error_of(result) the probe's error, if any, for the adaptive cap.
+        on_result is called in completion order; the returned list is in
+        the order of items.
+        
+        With deadline (a time.monotonic() value), items not finished by then
+        are abandoned (see run_until) and their result is on_timeout(*item),
+        passed to on_result after the finished ones.
+        """
+        def run(item):
+            with self.slot(key(item)) as slot:
+                result = fn(*item)
+                if error_of is not None:
+                    slot.report(error_of(result))
+                return result
+
+        if not items:
+            return []
+        max_workers = min(max_workers or self.max_in_flight, len(items))
+        if deadline is not None:
+            finished = run_until([lambda item=item: run(item) for item in items], deadline, max_workers,
+                                 on_result=(lambda index, result: on_result(result)) if on_result else None)
+            results = []
+            for index, item in enumerate(items):
+                if index not in finished:
+                    finished[index] = on_timeout(*item)
+                    if on_result is not None:
+                        on_result(finished[index])
+                results.append(finished[index])
+            return results
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = [executor.submit(run, item) for item in items]
+            if on_result is not None:
+                for future in as_completed(futures):
+                    on_result(future.result())
+            return [future.result() for future in futures]
+
+    def stats(self) -> Dict:
+        """Current scheduler state (for diagnostics)"""
+        with self._cond:
+            return {
+                'cap': self.cap,
+                'max_in_flight': self.max_in_flight,
+                'probe_gap': self.probe_gap,
+                'jitter': self.jitter,
+                'in_flight': self.in_flight,
+                'completed': self.completed,
+                'congestion_events': self.congestion_events
+            }
+
+
+def _wake(future):
+    if not future.done():
+        future.set_result(None)
+
+
+class _ThreadSlot:
+    def __init__(self, scheduler: ProbeScheduler, host: str, cost: float):
+        self.scheduler = scheduler
+        self.host = host
+        self.cost = cost
+        self.slot = Slot()
+
+    def __enter__(self) -> Slot:
+        wait = self.scheduler._reserve(self.host, self.cost)
+        if wait > 0:
+            time.sleep(wait)
+        wait = self.scheduler._pace()
+        if wait > 0:
+            time.sleep(wait)
+        with self.scheduler._cond:
+            while self.scheduler.in_flight >= self.scheduler.cap:
+                self.scheduler._cond.wait()
+            self.scheduler.in_flight += 1
+            self.slot.started_at = time.time()
+            self.slot.in_flight = self.scheduler.in_flight
+        return self.slot
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.scheduler._leave(exc_value if exc_value is not None else self.slot.error)
+        return False
+
+
+class _AsyncSlot:
+    def __init__(self, scheduler: ProbeScheduler, host: str, cost: float):
+        self.scheduler = scheduler
+        self.host = host
+        self.cost = cost
+        self.slot = Slot()
+
+    async def __aenter__(self) -> Slot:
+        scheduler = self.scheduler
+        loop = asyncio.get_event_loop()
+        if self.host not in scheduler._addresses:
+            await loop.run_in_executor(None, scheduler._resolve, self.host)
+        wait = scheduler._reserve(self.host, self.cost)
+        if wait > 0:
+            await asyncio.sleep(wait)
+        wait = scheduler._pace()
+        if wait > 0:
+            await asyncio.sleep(wait)
+        while not scheduler._try_enter(self.slot):
+            future = loop.create_future()
+            with scheduler._cond:
+                scheduler._async_waiters.append((loop, future))
+            # Re-check after registering so a release in between is not missed
+            if scheduler._try_enter(self.slot):
+                break
+            await future
+        return self.slot
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        self.scheduler._leave(exc_value if exc_value is not None else self.slot.error)
+        return False
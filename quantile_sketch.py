@@ -0,0 +1,279 @@
+#!/usr/bin/env python3
+"""
+Quantile Sketch
+
+Streaming latency statistics for stratum_test.py with flat memory, so a
+pool can be probed thousands of times (--runs N, --duration) without
+keeping every sample.
+
+QuantileSketch is a log-bucketed histogram (DDSketch style): a value v
+lands in bucket ceil(log(v) / log(gamma)), so every quantile it reports is
+within `relative_accuracy` (1% by default) of the true sample value. Count,
+mean, min, max and standard deviation are tracked exactly. Two sketches
+with the same accuracy merge by adding bucket counts, so per-run or
+per-host sketches can be combined later.
+
+SampleList is a list that keeps only the first `limit` samples but feeds
+every sample into a sketch, so existing code that expects lists of times
+(JSON arrays, len(), formatting) keeps working.
+
+Usage:
+    from quantile_sketch import QuantileSketch, SampleList
+
+    sketch = QuantileSketch()
+    for rtt in samples:
+        sketch.add(rtt)
+    print(sketch.quantile(0.99), sketch.stddev(), sketch.iqr())
+
+    times = SampleList()
+    times.append(52.1)
+    times.sketch.summary()
+
+Requirements:
+  • Python 3.6+
+  • No external dependencies
+"""
+
+import math
+from typing import Optional, Dict, Iterable, List
+
+DEFAULT_RELATIVE_ACCURACY = 0.01
+
+# Raw samples kept by a SampleList (the sketch sees all of them)
+DEFAULT_SAMPLE_LIMIT = 1000
+
+# Values at or below this (ms) are counted in a single zero bucket
+MIN_TRACKED_VALUE = 1e-3
+
+
+class QuantileSketch:
+    """Mergeable streaming quantile estimator with exact count/mean/min/max/stddev"""
+
+    def __init__(self, relative_accuracy: float = DEFAULT_RELATIVE_ACCURACY):
+        if not 0 < relative_accuracy < 1:
+            raise ValueError("relative_accuracy must be between 0 and 1")
+        self.relative_accuracy = relative_accuracy
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = math.log(self.gamma)
+        self.buckets = {}  # bucket index -> count
+        self.zero_count = 0
+        self.count = 0
+        self.min = None
+        self.max = None
+        self.mean = None
+        self._m2 = 0.0  # sum of squared deviations from the mean (Welford)
+
+    def __len__(self) -> int:
+        return self.count
+
+    def _index(self, value: float) -> int:
+        return int(math.ceil(math.log(value) / self._log_gamma))
+
+    def _value(self, index: int) -> float:
+        """Representative value of a bucket (relative error <= relative_accuracy)"""
+        return 2 * self.gamma ** index / (self.gamma + 1)
+
+    def add(self, value: float):
+        """Add one sample"""
+        if value <= MIN_TRACKED_VALUE:
+            self.zero_count += 1
+        else:
+            index = self._index(value)
+            self.buckets[index] = self.buckets.get(index, 0) + 1
+
+        self.count += 1
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+        if self.mean is None:
+            self.mean = float(value)
+        else:
+            delta = value - self.mean
+            self.mean += delta / self.count
+            self._m2 += delta * (value - self.mean)
+
+    def _add_many(self, value: float, count: int):
+        """Add count samples of the same value"""
+        if value <= MIN_TRACKED_VALUE:
+            self.zero_count += count
+        else:
+            index = self._index(value)
+            self.buckets[index] = self.buckets.get(index, 0) + count
+
+        total = self.count + count
+        if self.mean is None:
+            self.mean = float(value)
+        else:
+            delta = value - self.mean
+            self._m2 += delta * delta * self.count * count / total
+            self.mean += delta * count / total
+        self.count = total
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+
+    def shifted(self, offset: float) -> 'QuantileSketch':
+        """
+        Sketch of every sample minus offset (never below 0). Buckets are
+        re-keyed by their representative value; count, min, max, mean and
+        stddev stay exact unless samples are clamped at 0.
+        """
+        sketch = QuantileSketch(self.relative_accuracy)
+        if not self.count:
+            return sketch
+        if self.zero_count:
+            sketch._add_many(0.0, self.zero_count)
+        for index in sorted(self.buckets):
+            sketch._add_many(max(self._value(index) - offset, 0.0), self.buckets[index])
+        if self.min >= offset:
+            sketch.mean, sketch._m2 = self.mean - offset, self._m2
+        sketch.min = max(self.min - offset, 0.0)
+        sketch.max = max(self.max - offset, 0.0)
+        return sketch
+
+    def merge(self, other: 'QuantileSketch'):
+        """Add every sample of other into this sketch"""
+        if other.relative_accuracy != self.relative_accuracy:
+            raise ValueError("cannot merge sketches with different relative accuracy")
+        if not other.count:
+            return
+        for index, count in other.buckets.items():
+            self.buckets[index] = self.buckets.get(index, 0) + count
+        self.zero_count += other.zero_count
+
+        if not self.count:
+            self.mean, self._m2 = other.mean, other._m2
+        else:
+            total = self.count + other.count
+            delta = other.mean - self.mean
+            self._m2 += other._m2 + delta * delta * self.count * other.count / total
+            self.mean += delta * other.count / total
+        self.count += other.count
+        self.min = other.min if self.min is None else min(self.min, other.min)
+        self.max = other.max if self.max is None else max(self.max, other.max)
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Estimated q-quantile (0 <= q <= 1), or None if the sketch is empty"""
+        if not self.count:
+            return None
+        if q <= 0:
+            return self.min
+        if q >= 1:
+            return self.max
+
+        rank = q * (self.count - 1)
+        seen = self.zero_count
+        if seen > rank:
+            return self.min
+        for index in sorted(self.buckets):
+            seen += self.buckets[index]
+            if seen > rank:
+                return min(max(self._value(index), self.min), self.max)
+        return self.max
+
+    def stddev(self) -> Optional[float]:
+        """Sample standard deviation (exact), or None with fewer than 2 samples"""
+        if self.count < 2:
+            return None
+        return math.sqrt(self._m2 / (self.count - 1))
+
+    def iqr(self) -> Optional[float]:
+        """Interquartile range p75 - p25"""
+        if not self.count:
+            return None
+        return self.quantile(0.75) - self.quantile(0.25)
+
+    def summary(self) -> Dict:
+        """count, mean, min, max, p50/p90/p99, stddev and IQR (ms)"""
+        return {
+            'count': self.count,
+            'mean': self.mean,
+            'min': self.min,
+            'max': self.max,
+            'p50': self.quantile(0.50),
+            'p90': self.quantile(0.90),
+            'p99': self.quantile(0.99),
+            'stddev': self.stddev(),
+            'iqr': self.iqr()
+        }
+
+    def to_dict(self) -> Dict:
+        """Serializable state (see from_dict)"""
+        return {
+            'relative_accuracy': self.relative_accuracy,
+            'buckets': {str(index): count for index, count in self.buckets.items()},
+            'zero_count': self.zero_count,
+            'count': self.count,
+            'min': self.min,
+            'max': self.max,
+            'mean': self.mean,
+            'm2': self._m2
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> 'QuantileSketch':
+        sketch = cls(data['relative_accuracy'])
+        sketch.buckets = {int(index): count for index, count in data['buckets'].items()}
+        sketch.zero_count = data['zero_count']
+        sketch.count = data['count']
+        sketch.min = data['min']
+        sketch.max = data['max']
+        sketch.mean = data['mean']
+        sketch._m2 = data['m2']
+        return sketch
+
+    @classmethod
+    def of(cls, values: Iterable[float]) -> 'QuantileSketch':
+        """Sketch of an iterable of samples"""
+        sketch = cls()
+        for value in values:
+            sketch.add(value)
+        return sketch
+
+
+class SampleList(list):
+    """
+    List of samples that stores at most `limit` values but adds every
+    appended value to self.sketch.
+    """
+
+    def __init__(self, values: Iterable[float] = (), limit: int = DEFAULT_SAMPLE_LIMIT):
+        super().__init__()
+        self.limit = limit
+        self.sketch = QuantileSketch()
+        self.extend(values)
+
+    def append(self, value: float):
+        self.sketch.add(value)
+        if len(self) < self.limit:
+            super().append(value)
+
+    def extend(self, values: Iterable[float]):
+        for value in values:
+            self.append(value)
+
+
+def sketch_of(values: Iterable[float]) -> QuantileSketch:
+    """The sketch behind a SampleList, or a new sketch of any other iterable"""
+    if isinstance(values, SampleList):
+        return values.sketch
+    return QuantileSketch.of(values)
+
+
+def all_samples(values: Iterable[float]) -> List[float]:
+    """
+    Every sample behind values: the raw values, plus one bucket
+    representative per sample a SampleList dropped past its limit.
+    """
+    values = list(values) if not isinstance(values, SampleList) else values
+    sketch = sketch_of(values)
+    if sketch.count <= len(values):
+        return list(values)
+
+    kept = QuantileSketch(sketch.relative_accuracy)
+    for value in values:
+        kept.add(value)
+    samples = list(values)
+    samples.extend([0.0] * (sketch.zero_count - kept.zero_count))
+    for index in sorted(sketch.buckets):
+        value = min(max(sketch._value(index), sketch.min), sketch.max)
+        samples.extend([value] * (sketch.buckets[index] - kept.buckets.get(index, 0)))
+    return samples
@@ -0,0 +1,323 @@
+#!/usr/bin/env python3
+"""
+Stratum Client
+
+Minimal stratum (v1) client shared by the tools in this repository
+(stratum_test.py, verify_pool.py, pool-mempool.py, compare_coinbase.py and
+findings/prevhash_timeline.py).
+
+Messages are newline-framed JSON. Reads are deadline based: a call such as
+wait_for_response() or wait_for_notify() returns the moment the awaited id
+or method arrives, and gives up once its deadline passes. There are no fixed
+sleeps and no cap on the number of recv() calls, so a mining.notify split
+across several TCP segments is still picked up.
+
+Usage:
+    from stratum_client import StratumClient
+
+    with StratumClient("solo.atlaspool.io", 3333, timeout=10) as client:
+        client.connect()
+        subscribe = client.subscribe(["my-tool/1.0"])
+        reply = client.authorize("bc1q...", "x")
+        notify_params = client.wait_for_notify(timeout=10)
+
+Requirements:
+  • Python 3.6+
+  • No external dependencies
+"""
+
+import socket
+import json
+import time
+import ipaddress
+from typing import Optional, Dict, List, Callable, Any
+
+# time.perf_counter_ns() is Python 3.7+; fall back to perf_counter() on 3.6
+if hasattr(time, 'perf_counter_ns'):
+    now_ns = time.perf_counter_ns
+else:
+    def now_ns() -> int:
+        return int(time.perf_counter() * 1e9)
+
+
+def find_response(buffer: bytes, msg_id: int) -> Optional[Dict]:
+    """
+    Return the response to msg_id if a complete line containing it is in buffer.
+    Useful for callers that manage their own reads (e.g. asyncio streams).
+    """
+    for line in buffer.split(b"\n")[:-1]:
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            data = json.loads(line.decode('utf-8', 'replace'))
+        except json.JSONDecodeError:
+            continue
+        if isinstance(data, dict) and data.get('id') == msg_id and ('result' in data or 'error' in data):
+            return data
+    return None
+
+
+class StratumClient:
+    """
+    A single stratum connection with a receive buffer.
+
+    Every message read from the socket passes through _dispatch(), which
+    records the latest mining.notify params and mining.set_difficulty value
+    and keeps responses keyed by id, so replies that arrive out of order or
+    while waiting for something else are not lost.
+    """
+
+    def __init__(self, host: str, port: int, timeout: float = 10, family: int = socket.AF_INET):
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+        self.family = family
+        self.peer = None
+        self.sock = None
+        self.closed = False
+        self.notify_params = None
+        self.difficulty = None
+        self.first_byte_ns = None
+        self.first_byte_kernel_ns = None
+        self.last_recv_kernel_ns = None
+        self._recv = None
+        self._buffer = b""
+        self._next_id = 1
+        self._responses = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def connect(self):
+        """
+        Open the TCP connection over self.family (AF_INET by default,
+        AF_INET6, or AF_UNSPEC for every address in getaddrinfo() order;
+        an IPv4/IPv6 address literal always uses its own family). Addresses
+        are tried in turn; the one connected to is kept in self.peer.
+        Raises OSError (including socket.timeout) if none can be connected.
+        """
+        try:
+            ipaddress.ip_address(self.host)
+            family = socket.AF_UNSPEC
+        except ValueError:
+            family = self.family
+        error = None
+        for family, socktype, proto, _, sockaddr in socket.getaddrinfo(self.host, self.port, family,
+                                                                         socket.SOCK_STREAM):
+            sock = socket.socket(family, socktype, proto)
+            sock.settimeout(self.timeout)
+            try:
+                sock.connect(sockaddr)
+            except OSError as e:
+                sock.close()
+                error = e
+                continue
+            self.sock = sock
+            self.peer = sockaddr[0]
+            return self
+        raise error if error is not None else socket.gaierror(socket.EAI_NONAME, "No address")
+
+    def attach(self, sock: socket.socket):
+        """
+        Use an already connected socket (plain or TLS), e.g. when the caller
+        times DNS, TCP connect and TLS handshake separately.
+        """
+        self.sock = sock
+        self._recv = None
+        return self
+
+    def enable_kernel_timestamps(self) -> bool:
+        """
+        Read the connected socket with kernel receive timestamps (Linux,
+        plain sockets only; see kernel_timestamps.py). From then on
+        first_byte_kernel_ns and last_recv_kernel_ns hold the kernel's
+        receive time of the first and of the latest data read, on the
+        now_ns() clock. Returns False if timestamps are unavailable.
+        """
+        import kernel_timestamps  # imports this module
+        if not kernel_timestamps.enable(self.sock):
+            return False
+        self._recv = kernel_timestamps.recv
+        return True
+
+    def close(self):
+        """Close the connection (safe to call more than once)"""
+        if self.sock is not None:
+            try:
+                self.sock.close()
+            except OSError:
+                pass
+        self.sock = None
+        self.closed = True
+
+    def send(self, method: str, params: Optional[List] = None, msg_id: Optional[int] = None) -> int:
+        """
+        Send a request and return the id it was sent with.
+        Ids are allocated sequentially from 1 unless msg_id is given.
+        """
+        if msg_id is None:
+            msg_id = self._next_id
+        self._next_id = max(self._next_id, msg_id + 1)
+
+        message = json.dumps({
+            "id": msg_id,
+            "method": method,
+            "params": params if params is not None else []
+        }) + "\n"
+        self.sock.sendall(message.encode('utf-8'))
+        return msg_id
+
+    def _dispatch(self, data: Dict):
+        """Record notifications and responses as they are read"""
+        method = data.get('method')
+        if method == 'mining.notify':
+            self.notify_params = data.get('params')
+        elif method == 'mining.set_difficulty':
+            diff = (data.get('params') or [None])[0]
+            if diff is not None:
+                try:
+                    self.difficulty = float(diff)
+                except (TypeError, ValueError):
+                    pass
+        elif data.get('id') is not None and ('result' in data or 'error' in data):
+            self._responses[data['id']] = data
+
+    def _pop_line(self) -> Optional[Dict]:
+        """Return the next complete JSON message from the buffer, if any"""
+        while b"\n" in self._buffer:
+            line, self._buffer = self._buffer.split(b"\n", 1)
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                data = json.loads(line.decode('utf-8', 'replace'))
+            except json.JSONDecodeError:
+                continue
+            if isinstance(data, dict):
+                self._dispatch(data)
+                return data
+        return None
+
+    def drain(self) -> List[Dict]:
+        """Dispatch every complete message already buffered, without blocking"""
+        messages = []
+        data = self._pop_line()
+        while data is not None:
+            messages.append(data)
+            data = self._pop_line()
+        return messages
+
+    def read_message(self, deadline: float) -> Optional[Dict]:
+        """
+        Read the next message, waiting at most until deadline (a time.time() value).
+        Returns None on timeout or if the server closed the connection.
+        """
+        while True:
+            data = self._pop_line()
+            if data is not None:
+                return data
+
+            if self.sock is None:
+                return None
+
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                return None
+
+            self.sock.settimeout(remaining)
+            try:
+                if self._recv is not None:
+                    chunk, self.last_recv_kernel_ns = self._recv(self.sock, 8192)
+                else:
+                    chunk = self.sock.recv(8192)
+            except socket.timeout:
+                return None
+
+            if not chunk:
+                # Server closed the connection
+                self.close()
+                return None
+
+            if self.first_byte_ns is None:
+                self.first_byte_ns = now_ns()
+                self.first_byte_kernel_ns = self.last_recv_kernel_ns
+            self._buffer += chunk
+
+    def wait_for(self, predicate: Callable[[Dict], Any], timeout: Optional[float] = None) -> Optional[Dict]:
+        """Read messages until one satisfies predicate, or return None at the deadline"""
+        deadline = time.time() + (self.timeout if timeout is None else timeout)
+        while True:
+            data = self.read_message(deadline)
+            if data is None:
+                return None
+            if predicate(data):
+                return data
+
+    def wait_for_response(self, msg_id: int, timeout: Optional[float] = None) -> Optional[Dict]:
+        """Wait for the response to request msg_id"""
+        if msg_id in self._responses:
+            return self._responses.pop(msg_id)
+
+        data = self.wait_for(lambda d: msg_id in self._responses, timeout)
+        if data is None:
+            return None
+        return self._responses.pop(msg_id)
+
+    def wait_for_responses(self, msg_ids: List[int], timeout: Optional[float] = None) -> Dict[int, Dict]:
+        """
+        Wait for the responses to several pipelined requests under one deadline.
+        Returns {msg_id: response} for every reply received (missing ids timed out).
+        """
+        pending = set(msg_ids)
+        received = {}
+        deadline = time.time() + (self.timeout if timeout is None else timeout)
+        while True:
+            for msg_id in list(pending):
+                if msg_id in self._responses:
+                    received[msg_id] = self._responses.pop(msg_id)
+                    pending.discard(msg_id)
+            if not pending:
+                return received
+            if self.read_message(deadline) is None:
+                return received
+
+    def wait_for_method(self, method: str, timeout: Optional[float] = None) -> Optional[Dict]:
+        """Wait for the next server message with the given method"""
+        return self.wait_for(lambda d: d.get('method') == method, timeout)
+
+    def wait_for_notify(self, timeout: Optional[float] = None) -> Optional[List]:
+        """
+        Return mining.notify params, waiting for the first one if none has
+        been seen on this connection yet.
+        """
+        self.drain()
+        if self.notify_params is None:
+            self.wait_for_method('mining.notify', timeout)
+        return self.notify_params
+
+    def request(self, method: str, params: Optional[List] = None, timeout: Optional[float] = None) -> Optional[Dict]:
+        """Send a request and wait for its response"""
+        msg_id = self.send(method, params)
+        return self.wait_for_response(msg_id, timeout)
+
+    def subscribe(self, params: Optional[List] = None, timeout: Optional[float] = None) -> Optional[Dict]:
+        """Send mining.subscribe and return the response (or None)"""
+        return self.request('mining.subscribe', params, timeout)
+
+    def authorize(self, username: str, password: str = "x", timeout: Optional[float] = None) -> Optional[Dict]:
+        """Send mining.authorize and return the response (or None)"""
+        return self.request('mining.authorize', [username, password], timeout)
+
+    def authorize_many(self, usernames: List[str], password: str = "x",
+                       timeout: Optional[float] = None) -> List[Optional[Dict]]:
+        """
+        Pipeline one mining.authorize per username on this connection and
+        return the responses in the same order (None where no reply arrived).
+        """
+        msg_ids = [self.send('mining.authorize', [username, password]) for username in usernames]
+        received = self.wait_for_responses(msg_ids, timeout)
+        return [received.get(msg_id) for msg_id in msg_ids]
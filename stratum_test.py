@@ -9,18 +9,30 @@ latency (ping) and actual stratum protocol handshake times.
 Features:
   • Tests 20 popular solo mining pools worldwide
   • Concurrent testing for fast results (~10 seconds)
-  • Multiple runs for accuracy (--runs 1-3)
+  • Multiple runs for accuracy (--runs N or --duration SECONDS), with p50/p90/p99
+    and jitter (standard deviation, IQR) from a constant-memory quantile sketch
   • TLS connection testing (-t/--tls flag) for secure stratum connections
     - Supports TLS 1.3 (Python 3.7+) and TLS 1.2 (Python 3.6+)
     - Detailed error reporting for TLS failures
     - Optional certificate verification bypass (--no-verify-cert)
+    - Full vs resumed handshake latency (--tls-resume)
   • Address type verification (-v flag) tests all 5 Bitcoin address formats:
     - P2PKH (Legacy): 1...
     - P2SH (Script Hash): 3...
     - P2WPKH (SegWit): bc1q...
     - P2WSH (SegWit Script): bc1q... (longer)
     - P2TR (Taproot): bc1p...
-  • JSON output for automation (--json)
+  • Native ICMP ping engine with packet loss and jitter (falls back to the ping command)
+  • TCP handshake RTT baseline for every pool, including those that block ICMP
+  • Per-resolver DNS timing with a built-in async DNS client (--resolver)
+  • Every A/AAAA address of a pool probed separately, fastest endpoint reported (--all-addresses)
+  • IPv6 probing (-6), IPv4 vs IPv6 side by side (--dual-stack) and a Happy Eyeballs race (--happy-eyeballs)
+  • Per-phase latency breakdown: DNS, TCP connect, TLS handshake, first byte, reply (--phases)
+  • JSON output for automation (--json), or streamed as JSON Lines (--ndjson)
+  • asyncio probe engine for large endpoint lists (--async, --concurrency)
+  • Local SQLite history of every sample for trend queries (--history, history_db.py)
+  • OpenMetrics/Prometheus endpoint (--metrics) and InfluxDB line protocol file (--influx-file)
+  • Monitor mode with rolling p50/p95/p99, jitter and failure rate per pool (--monitor)
   • Single server testing mode
 
 Usage:
@@ -64,10 +76,28 @@ import urllib.request
 import urllib.error
 import binascii
 import threading
+import random
+import asyncio
 from typing import Optional, Tuple, Dict, List
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from concurrent.futures import ThreadPoolExecutor, Future, as_completed, TimeoutError as FutureTimeoutError
 from statistics import mean, median
 
+from stratum_client import StratumClient, find_response, now_ns
+import icmp_ping
+from probe_scheduler import ProbeScheduler, Slot, jittered, run_until, DEFAULT_JITTER
+from latency_monitor import LatencyMonitor, DEFAULT_WINDOW, write_snapshot
+from quantile_sketch import SampleList, sketch_of
+from history_db import HistoryStore, DEFAULT_HISTORY_PATH
+from metrics_exporter import Exporter
+import vantage_cache
+import geo_db
+from dns_cache import DnsCache
+import dns_client
+import dual_stack
+import tcp_info
+import kernel_timestamps
+from loopback_stratum import LoopbackStratumServer
+
 # Predefined servers for auto mode
 # Each entry is a tuple with the following fields:
 #   1. hostname (str): The server's hostname or IP address
@@ -106,6 +136,75 @@ PREDEFINED_SERVERS = [
 # Global flag to track if ping is available
 _ping_available = None
 
+# Time replies by their kernel receive timestamp as well (--kernel-timestamps, Linux)
+_kernel_timestamps = False
+
+# Probe pacing of the schedulers run_probes() creates (--probe-gap, --jitter);
+# without --probe-gap the gap spreads each run's probes over RUN_INTERVAL
+_probe_gap = None
+_probe_jitter = DEFAULT_JITTER
+
+# Seconds between one server's runs (randomized by the scheduler's jitter)
+RUN_INTERVAL = 0.1
+
+# Run each run's ping, TCP RTT, stratum and TLS probes at the same time (--parallel-probes),
+# giving up on the ones still outstanding run_deadline seconds after the run started
+_parallel_probes = False
+DEFAULT_RUN_DEADLINE = 10.0
+_run_deadline = DEFAULT_RUN_DEADLINE
+RUN_DEADLINE_ERROR = "Run deadline exceeded"
+
+# End of a bounded run (--deadline), as a time.monotonic() value: probes still
+# outstanding then are abandoned and their servers marked TIMEOUT
+_deadline = None
+DEADLINE_ERROR = "TIMEOUT"
+
+# Probes kept in a result's 'samples' log (long --duration runs stop logging)
+SAMPLE_LOG_LIMIT = 10000
+
+# Default cap on in-flight probes (--concurrency)
+DEFAULT_ASYNC_CONCURRENCY = 256
+
+# Handshake phases timed by probe_stratum_phases(), in order
+PHASES = ['dns', 'connect', 'tls', 'first_byte', 'reply']
+
+# Kernel TCP_INFO metrics read by probe_stratum_phases() after the reply (Linux only)
+TCP_INFO_METRICS = ['kernel_rtt', 'kernel_rttvar', 'server', 'retrans', 'total_retrans']
+
+# Reply times measured from kernel receive timestamps (--kernel-timestamps, plain TCP only)
+KERNEL_TIMESTAMP_METRICS = ['kernel_first_byte', 'kernel_reply']
+
+# Every per-probe metric kept as samples
+PROBE_METRICS = PHASES + TCP_INFO_METRICS + KERNEL_TIMESTAMP_METRICS
+
+# TCP connect (SYN -> SYN/ACK) RTT samples per host per run
+TCP_RTT_SAMPLES_PER_RUN = 3
+
+# Sample addresses used by -v to test which address types a pool accepts
+TEST_ADDRESSES = {
+    'P2PKH': '1A1zP1eP5QGefi2DMPTfTL5SLmv7DivfNa',
+    'P2SH': '3EExK1K1TF3v7zsFtQHt14XqexCwgmXM1y',
+    'P2WPKH': 'bc1qar0srrr7xfkvy5l643lydnw9re59gtzzwf5mdq',
+    'P2WSH': 'bc1qrp33g0q5c5txsp9arysrx4k6zdkfs4nce4xj0gdcccefvpysxf3qccfmv3',
+    'P2TR': 'bc1p5cyxnuxmeuwuvkwfem96lqzszd02n6xdcjrs20cac6yqjjwudpxqkedrcr',
+}
+
+# Connections per pool when address types are verified one per connection
+VERIFY_CONNECTIONS_PER_POOL = 2
+
+# Runs above which the table adds percentile and spread columns
+PERCENTILE_MIN_RUNS = 4
+
+# Loopback probes per probe type for --calibrate
+DEFAULT_CALIBRATION_RUNS = 20
+
+# Connect timeout of one Happy Eyeballs race (--happy-eyeballs), in seconds
+HAPPY_EYEBALLS_TIMEOUT = 5
+
+# Monitor mode (--monitor): seconds between probe rounds and between snapshots
+DEFAULT_MONITOR_INTERVAL = 60
+DEFAULT_SNAPSHOT_INTERVAL = 300
+
 # Per-hostname locks to prevent concurrent pings to the same host
 # This prevents race conditions while still allowing concurrent pings to different hosts
 _ping_locks = {}
@@ -185,14 +284,65 @@ def show_ping_warning():
     print()
 
 
-def ping_host(hostname: str, timeout: int = 2) -> Optional[float]:
+def _ping_command(hostname: str, timeout: int, system: str) -> List[str]:
+    """Build the platform-specific ping command for a single echo request"""
+    if system == 'windows':
+        return ['ping', '-n', '1', '-w', str(timeout * 1000), hostname]
+    # Unix-like systems (macOS, Linux)
+    # Don't use -W flag - it's inconsistent across platforms
+    if system == 'darwin' and ':' in hostname:
+        return ['ping6', '-c', '1', hostname]  # macOS ping is IPv4 only
+    return ['ping', '-c', '1', hostname]
+
+
+def _parse_ping_output(output: str, system: str) -> Optional[float]:
+    """
+    Extract the round-trip time in milliseconds from ping output.
+    Returns None if the output doesn't contain a usable time.
+    """
+    if not output or len(output) < 10:
+        return None
+    
+    try:
+        if system == 'windows':
+            import re
+            matches = re.findall(r'(\d+(?:\.\d+)?)\s*ms', output.lower())
+            if not matches:
+                return None
+            time_str = matches[-1]
+        else:
+            if 'time=' not in output:
+                return None
+            time_part = output.split('time=')[1]
+            time_str = time_part.split('ms')[0].strip().split()[0]
+        
+        return float(time_str)
+    except (IndexError, ValueError):
+        return None
+
+
+def ping_host(hostname: str, timeout: int = 2, kernel_times: Optional[List[float]] = None) -> Optional[float]:
     """
     Perform ICMP ping to hostname and return response time in milliseconds.
     Returns None if ping fails or is not supported.
     
-    Uses per-hostname locking to prevent race conditions while maintaining
-    concurrency across different hosts. Includes retry logic for reliability.
+    Uses the native ICMP engine (icmp_ping.py) when ICMP sockets are permitted.
+    Otherwise runs the ping command, with per-hostname locking to prevent race
+    conditions while maintaining concurrency across different hosts, and retry
+    logic for reliability.
+    
+    With kernel_times, the native engine also times the reply by its kernel
+    receive timestamp and appends that RTT to kernel_times (Linux only).
     """
+    if icmp_ping.is_available():
+        if kernel_times is None:
+            return icmp_ping.ping_once(hostname, timeout)
+        stats = icmp_ping.ping_hosts([hostname], count=1, timeout=timeout, kernel_times=True)
+        if not stats or not stats[hostname]['times']:
+            return None
+        kernel_times.extend(stats[hostname].get('kernel_times', []))
+        return stats[hostname]['times'][0]
+    
     # Check if ping is available (cached after first check)
     if not check_ping_available():
         return None
@@ -211,13 +361,7 @@ def ping_host(hostname: str, timeout: int = 2) -> Optional[float]:
         for attempt in range(3):
             try:
                 system = platform.system().lower()
-                
-                if system == 'windows':
-                    command = ['ping', '-n', '1', '-w', str(timeout * 1000), hostname]
-                else:
-                    # Unix-like systems (macOS, Linux)
-                    # Don't use -W flag - it's inconsistent across platforms
-                    command = ['ping', '-c', '1', hostname]
+                command = _ping_command(hostname, timeout, system)
                 
                 # Use subprocess.run with proper pipes (no temp files)
                 result = subprocess.run(
@@ -236,37 +380,15 @@ def ping_host(hostname: str, timeout: int = 2) -> Optional[float]:
                         continue
                     return None
                 
-                output = result.stdout
-                if not output or len(output) < 10:
+                ping_time = _parse_ping_output(result.stdout, system)
+                if ping_time is None:
                     # If this is not the last attempt, retry
                     if attempt < 2:
                         time.sleep(0.1)
                         continue
                     return None
                 
-                if system == 'windows':
-                    import re
-                    matches = re.findall(r'(\d+(?:\.\d+)?)\s*ms', output.lower())
-                    if matches:
-                        time_str = matches[-1]
-                    else:
-                        # If this is not the last attempt, retry
-                        if attempt < 2:
-                            time.sleep(0.1)
-                            continue
-                        return None
-                else:
-                    if 'time=' in output:
-                        time_part = output.split('time=')[1]
-                        time_str = time_part.split('ms')[0].strip().split()[0]
-                    else:
-                        # If this is not the last attempt, retry
-                        if attempt < 2:
-                            time.sleep(0.1)
-                            continue
-                        return None
-                
-                return float(time_str)
+                return ping_time
                 
             except subprocess.TimeoutExpired:
                 # Ping timed out - if not last attempt, retry
@@ -282,40 +404,182 @@ def ping_host(hostname: str, timeout: int = 2) -> Optional[float]:
         # All attempts failed
         return None
 
-def test_stratum_connection(hostname: str, port: int, timeout: int = 5) -> Optional[float]:
+def tcp_rtt_samples(hostname: str, port: int, count: int = TCP_RTT_SAMPLES_PER_RUN,
+                    timeout: int = 2, dns_cache: Optional[DnsCache] = None) -> List[float]:
     """
-    Test stratum server connection and return response time in milliseconds.
-    Returns None if connection fails.
+    Measure the TCP handshake round trip (SYN -> SYN/ACK) to hostname:port.
+    
+    The hostname is resolved once (through dns_cache if given), then each
+    sample times connect() only and closes the connection without sending
+    anything. Works for pools that drop ICMP. Returns the successful
+    samples in milliseconds.
     """
     try:
-        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        if dns_cache is not None:
+            addrinfo = dns_cache.lookup(hostname, port)
+        else:
+            addrinfo = socket.getaddrinfo(hostname, port, socket.AF_INET, socket.SOCK_STREAM)
+        family, socktype, proto, _, address = addrinfo[0]
+    except (socket.gaierror, OSError):
+        return []
+    
+    times = []
+    for _ in range(count):
+        sock = socket.socket(family, socktype, proto)
         sock.settimeout(timeout)
+        try:
+            start = now_ns()
+            sock.connect(address)
+            times.append((now_ns() - start) / 1e6)
+        except OSError:
+            pass
+        finally:
+            sock.close()
+    return times
+
+def make_tls_context(verify_cert: bool = True):
+    """Create the client SSL context used for TLS stratum probes"""
+    import ssl
+    
+    context = ssl.create_default_context()
+    if not verify_cert:
+        context.check_hostname = False
+        context.verify_mode = ssl.CERT_NONE
+    return context
+
+def _record_tcp_info(result: Dict, sock):
+    """Add the kernel TCP_INFO metrics of sock to a probe result (after 'reply' is set)"""
+    info = tcp_info.read(sock)
+    if info is None:
+        return
+    result['kernel_rtt'] = info['rtt_ms']
+    result['kernel_rttvar'] = info['rttvar_ms']
+    result['server'] = tcp_info.server_time(result['reply'], info)
+    result['retrans'] = info['retrans']
+    result['total_retrans'] = info['total_retrans']
+
+def probe_stratum_phases(hostname: str, port: int, timeout: int = 5, use_tls: bool = False,
+                         verify_cert: bool = True, ssl_context=None, session=None,
+                         dns_cache: Optional[DnsCache] = None, server_name: Optional[str] = None) -> Dict:
+    """
+    Perform one mining.subscribe handshake and time each phase separately
+    with perf_counter_ns.
+    
+    For TLS session resumption, pass the ssl_context and the 'session' of an
+    earlier probe made with that same context.
+    
+    With dns_cache, the probe connects to the cached addresses and 'dns'
+    stays None: resolution times are read from the cache instead (see
+    DnsCache.resolutions), so every total is a warm-DNS sample.
+    
+    server_name is the TLS name to send and verify when hostname is one
+    address of a pool (default: hostname).
+    
+    Returns dict of phase times in milliseconds (None if not reached):
+        dns:        getaddrinfo() for the hostname
+        connect:    TCP handshake to the resolved address
+        tls:        TLS handshake (TLS probes only)
+        first_byte: subscribe sent -> first response bytes received
+        reply:      subscribe sent -> complete subscribe reply received
+        total:      dns + connect + tls + reply (SSL context creation excluded;
+                    dns only without dns_cache)
+        error:      None if successful, error description if failed
+    and, read from the kernel's TCP_INFO after the reply (None if not Linux):
+        kernel_rtt, kernel_rttvar: smoothed RTT and RTT variance (ms)
+        server:     reply - kernel_rtt, the pool's processing time
+        retrans, total_retrans: unacknowledged / all retransmitted segments
+    and, with --kernel-timestamps on a plain connection (None otherwise):
+        kernel_first_byte, kernel_reply: first_byte and reply up to the
+                    kernel receive timestamp instead of recv() returning
+    TLS probes also return:
+        session:    ssl.SSLSession to resume on a later probe (or None)
+        resumed:    True if the server resumed the given session
+    """
+    result = {phase: None for phase in PROBE_METRICS}
+    result['total'] = None
+    result['error'] = None
+    result['session'] = None
+    result['resumed'] = None
+    
+    client = StratumClient(hostname, port, timeout)
+    try:
+        context = None
+        if use_tls:
+            # Build the SSL context outside the timed region
+            context = ssl_context if ssl_context is not None else make_tls_context(verify_cert)
         
-        start_time = time.time()
-        sock.connect((hostname, port))
+        t_start = now_ns()
+        if dns_cache is not None:
+            addrinfo = dns_cache.lookup(hostname, port)
+            t_resolved = t_start  # DNS is its own metric, not part of the total
+        else:
+            addrinfo = socket.getaddrinfo(hostname, port, socket.AF_INET, socket.SOCK_STREAM)
+            t_resolved = now_ns()
+            result['dns'] = (t_resolved - t_start) / 1e6
         
-        subscribe_msg = json.dumps({
-            "id": 1,
-            "method": "mining.subscribe",
-            "params": []
-        }) + "\n"
+        family, socktype, proto, _, address = addrinfo[0]
+        sock = socket.socket(family, socktype, proto)
+        sock.settimeout(timeout)
+        client.attach(sock)
+        if _kernel_timestamps and context is None:
+            client.enable_kernel_timestamps()
         
-        sock.sendall(subscribe_msg.encode('utf-8'))
-        response = sock.recv(4096)
-        elapsed_time = (time.time() - start_time) * 1000
+        t_connect = now_ns()
+        sock.connect(address)
+        t_connected = now_ns()
+        result['connect'] = (t_connected - t_connect) / 1e6
+        setup_ns = (t_resolved - t_start) + (t_connected - t_connect)
         
-        sock.close()
+        if context is not None:
+            # For certificate verification, we need a hostname (not IP)
+            server_hostname = server_name or (hostname if verify_cert else None)
+            sock = context.wrap_socket(sock, server_hostname=server_hostname,
+                                       do_handshake_on_connect=False, session=session)
+            client.attach(sock)
+            t_handshake = now_ns()
+            sock.do_handshake()
+            t_handshaken = now_ns()
+            result['tls'] = (t_handshaken - t_handshake) / 1e6
+            setup_ns += t_handshaken - t_handshake
         
-        if response:
-            try:
-                json.loads(response.decode('utf-8'))
-            except json.JSONDecodeError:
-                pass
+        t_sent = now_ns()
+        msg_id = client.send('mining.subscribe', [])
+        reply = client.wait_for_response(msg_id, timeout)
+        t_reply = now_ns()
         
-        return elapsed_time
+        if client.first_byte_ns is not None:
+            result['first_byte'] = (client.first_byte_ns - t_sent) / 1e6
+        if client.first_byte_kernel_ns is not None:
+            result['kernel_first_byte'] = (client.first_byte_kernel_ns - t_sent) / 1e6
         
-    except:
-        return None
+        if reply is None:
+            result['error'] = "No subscribe reply" if client.first_byte_ns is not None else "No response"
+            return result
+        
+        result['reply'] = (t_reply - t_sent) / 1e6
+        result['total'] = (setup_ns + (t_reply - t_sent)) / 1e6
+        if client.last_recv_kernel_ns is not None:
+            result['kernel_reply'] = (client.last_recv_kernel_ns - t_sent) / 1e6
+        _record_tcp_info(result, sock)
+        
+        if context is not None:
+            # Read after the reply: TLS 1.3 delivers session tickets post-handshake
+            result['session'] = sock.session
+            result['resumed'] = sock.session_reused
+        return result
+        
+    except Exception as e:
+        result['error'] = _describe_connection_error(e)
+        return result
+    finally:
+        client.close()
+
+def test_stratum_connection(hostname: str, port: int, timeout: int = 5) -> Optional[float]:
+    """
+    Test stratum server connection and return response time in milliseconds.
+    Returns None if connection fails.
+    """
+    return probe_stratum_phases(hostname, port, timeout)['total']
 
 def test_stratum_tls_connection(hostname: str, port: int, timeout: int = 5, verify_cert: bool = True) -> Tuple[Optional[float], Optional[str]]:
     """
@@ -333,75 +597,36 @@ def test_stratum_tls_connection(hostname: str, port: int, timeout: int = 5, veri
         - elapsed_time_ms: Time in milliseconds if successful, None if failed
         - error_message: None if successful, error description if failed
     """
-    try:
-        import ssl
-        
-        # Create SSL context
-        context = ssl.create_default_context()
-        
-        # Disable certificate verification if requested
-        if not verify_cert:
-            context.check_hostname = False
-            context.verify_mode = ssl.CERT_NONE
-        
-        # Create socket and wrap with TLS
-        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        sock.settimeout(timeout)
-        
-        start_time = time.time()
-        
-        # For certificate verification, we need a hostname (not IP)
-        # If verify_cert is False, we can use None for server_hostname
-        server_hostname = hostname if verify_cert else None
-        
-        # Connect and perform TLS handshake
-        with context.wrap_socket(sock, server_hostname=server_hostname) as tls_sock:
-            tls_sock.connect((hostname, port))
-            
-            subscribe_msg = json.dumps({
-                "id": 1,
-                "method": "mining.subscribe",
-                "params": []
-            }) + "\n"
-            
-            tls_sock.sendall(subscribe_msg.encode('utf-8'))
-            response = tls_sock.recv(4096)
-            elapsed_time = (time.time() - start_time) * 1000
-            
-            if response:
-                try:
-                    json.loads(response.decode('utf-8'))
-                except json.JSONDecodeError:
-                    pass
-        
-        return (elapsed_time, None)
-        
-    except Exception as e:
-        import ssl
-        error_type = type(e).__name__
-        error_msg = str(e)
-        
-        # Categorize common TLS errors
-        if isinstance(e, ssl.SSLCertVerificationError):
-            return (None, f"Certificate verification failed: {error_msg}")
-        elif isinstance(e, ssl.SSLError):
-            if "CERTIFICATE_VERIFY_FAILED" in error_msg:
-                return (None, "Certificate verification failed")
-            elif "certificate verify failed" in error_msg.lower():
-                return (None, "Certificate verification failed")
-            else:
-                return (None, f"SSL error: {error_msg}")
-        elif isinstance(e, socket.timeout):
-            return (None, "Connection timeout")
-        elif isinstance(e, ConnectionRefusedError):
-            return (None, "Connection refused")
-        elif isinstance(e, OSError):
-            if "Name or service not known" in error_msg or "nodename nor servname provided" in error_msg:
-                return (None, "DNS resolution failed")
-            else:
-                return (None, f"Network error: {error_msg}")
+    phases = probe_stratum_phases(hostname, port, timeout, use_tls=True, verify_cert=verify_cert)
+    return (phases['total'], phases['error'])
+
+def _describe_connection_error(e: Exception) -> str:
+    """Categorize a stratum/TLS connection exception into a readable error message"""
+    import ssl
+    error_type = type(e).__name__
+    error_msg = str(e)
+    
+    # Categorize common TLS errors
+    if isinstance(e, ssl.SSLCertVerificationError):
+        return f"Certificate verification failed: {error_msg}"
+    elif isinstance(e, ssl.SSLError):
+        if "CERTIFICATE_VERIFY_FAILED" in error_msg:
+            return "Certificate verification failed"
+        elif "certificate verify failed" in error_msg.lower():
+            return "Certificate verification failed"
+        else:
+            return f"SSL error: {error_msg}"
+    elif isinstance(e, (socket.timeout, asyncio.TimeoutError)):
+        return "Connection timeout"
+    elif isinstance(e, ConnectionRefusedError):
+        return "Connection refused"
+    elif isinstance(e, OSError):
+        if "Name or service not known" in error_msg or "nodename nor servname provided" in error_msg:
+            return "DNS resolution failed"
         else:
-            return (None, f"{error_type}: {error_msg}")
+            return f"Network error: {error_msg}"
+    else:
+        return f"{error_type}: {error_msg}"
 
 def get_public_ip() -> Optional[str]:
     """Get the public IPv4 address"""
@@ -417,7 +642,19 @@ def get_public_ip() -> Optional[str]:
         return None
 
 def get_asn_info(ip: str) -> Optional[Dict[str, str]]:
-    """Get ASN information for an IP address"""
+    """
+    Get ASN information for an IP address, from the offline geo index
+    (geo_db.py) when one has been compiled, otherwise from ip-api.com
+    """
+    index = geo_db.default_index()
+    entry = index.lookup(ip) if index else None
+    if entry and entry['asn']:
+        return {
+            'asn': entry['asn'],
+            'provider': entry['provider'] or '',
+            'location': entry['country'] or ''
+        }
+    
     try:
         url = f'http://ip-api.com/json/{ip}?fields=status,as,isp,city,regionName,country'
         req = urllib.request.Request(
@@ -449,202 +686,1070 @@ def get_asn_info(ip: str) -> Optional[Dict[str, str]]:
     except:
         return None
 
-def verify_address_type(hostname: str, port: int, address: str, timeout: int = 5) -> Optional[bool]:
+def lookup_vantage() -> Tuple[Optional[str], Optional[Dict[str, str]]]:
+    """
+    Public IPv4 and ASN details of this machine. A fresh vantage cache entry
+    for the current local address skips both HTTP lookups; complete lookups
+    are written back to the cache.
+    """
+    key = vantage_cache.local_address()
+    cached = vantage_cache.load(key)
+    if cached is not None:
+        return cached.get('ipv4'), cached.get('asn_info')
+    
+    ipv4 = get_public_ip()
+    asn_info = get_asn_info(ipv4) if ipv4 else None
+    if ipv4 and asn_info:
+        vantage_cache.store(key, {'ipv4': ipv4, 'asn_info': asn_info})
+    return ipv4, asn_info
+
+def start_vantage_lookup() -> Future:
+    """Run lookup_vantage() in a background thread so it overlaps the probes"""
+    executor = ThreadPoolExecutor(max_workers=1)
+    future = executor.submit(lookup_vantage)
+    executor.shutdown(wait=False)
+    return future
+
+def vantage_result(vantage: Future) -> Tuple[Optional[str], Optional[Dict]]:
+    """Result of start_vantage_lookup(), or (None, None) if the --deadline passes first"""
+    try:
+        return vantage.result(timeout=time_left())
+    except FutureTimeoutError:
+        return None, None
+
+def verify_address_type(hostname: str, port: int, address: str, timeout: int = 5,
+                        family: int = socket.AF_INET) -> Optional[bool]:
     """
     Verify if a pool supports a specific address type.
     Returns True if supported, False if rejected, None if unknown/error.
+    hostname may be an address (e.g. from the DNS cache); family applies
+    to names only.
     """
-    sock = None
+    client = StratumClient(hostname, port, timeout, family)
     try:
-        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        sock.settimeout(timeout)
-        
         try:
-            sock.connect((hostname, port))
+            client.connect()
         except (socket.timeout, ConnectionRefusedError, OSError):
             return None  # Connection failed
         
-        # Subscribe
-        subscribe_msg = json.dumps({
-            "id": 1,
-            "method": "mining.subscribe",
-            "params": []
-        }) + "\n"
-        
+        # Subscribe - returns as soon as the id 1 reply arrives
         try:
-            sock.sendall(subscribe_msg.encode('utf-8'))
-            # Wait for response to arrive
-            time.sleep(0.2)
-            
-            # Read response in chunks
-            response_parts = []
-            sock.settimeout(3)
-            for _ in range(2):
-                chunk = sock.recv(4096).decode('utf-8')
-                if chunk:
-                    response_parts.append(chunk)
-                    if '\n' in chunk and '"id":1' in chunk:
-                        break
-                time.sleep(0.1)
-            
-            subscribe_response = ''.join(response_parts)
-        except (socket.timeout, OSError):
+            subscribe_response = client.subscribe(timeout=3)
+        except OSError:
             return None  # Network error
         
-        if not subscribe_response:
-            return None
-        
-        # Check if subscribe succeeded
-        subscribe_ok = False
-        for line in subscribe_response.split('\n'):
-            if line.strip():
-                try:
-                    data = json.loads(line)
-                    if data.get('id') == 1 and 'result' in data:
-                        subscribe_ok = True
-                        break
-                except json.JSONDecodeError:
-                    continue
-        
-        if not subscribe_ok:
+        if not subscribe_response or 'result' not in subscribe_response:
             return None  # Can't connect properly
         
         # Authorize
-        authorize_msg = json.dumps({
-            "id": 2,
-            "method": "mining.authorize",
-            "params": [address, "x"]
-        }) + "\n"
-        
         try:
-            sock.sendall(authorize_msg.encode('utf-8'))
-            # Wait for response
-            time.sleep(0.3)
-            
-            # Read response in chunks
-            response_parts = []
-            sock.settimeout(2)
-            for _ in range(3):
-                chunk = sock.recv(8192).decode('utf-8')
-                if chunk:
-                    response_parts.append(chunk)
-                    if '\n' in chunk and '"id":2' in chunk:
-                        break
-                time.sleep(0.1)
-            
-            response = ''.join(response_parts)
-        except (socket.timeout, OSError):
+            data = client.authorize(address, "x", timeout=3)
+        except OSError:
             return None  # Network error
         
-        if not response:
-            return None
-        
-        # Check authorization result
-        for line in response.split('\n'):
-            if line.strip():
-                try:
-                    data = json.loads(line)
-                    if data.get('id') == 2:
-                        result = data.get('result')
-                        error = data.get('error')
-                        
-                        # If there's an error, it's rejected
-                        if error:
-                            return False
-                        
-                        # If result is True, it's supported
-                        if result == True:
-                            return True
-                        
-                        # If result is False but no error, unclear
-                        return None
-                except json.JSONDecodeError:
-                    continue
+        return _authorize_status(data)
         
-        # No clear response
+    except Exception:
         return None
+    finally:
+        client.close()
+
+
+def _authorize_status(data: Optional[Dict]) -> Optional[bool]:
+    """
+    Interpret a mining.authorize reply.
+    Returns True if supported, False if rejected, None if unknown/no reply.
+    """
+    if not data:
+        return None  # No clear response
+    
+    # If there's an error, it's rejected
+    if data.get('error'):
+        return False
+    
+    # If result is True, it's supported
+    if data.get('result') == True:
+        return True
+    
+    # If result is False but no error, unclear
+    return None
+
+
+def verify_address_types_pipelined(hostname: str, port: int, addresses: Dict[str, str],
+                                   timeout: int = 8, family: int = socket.AF_INET) -> Dict[str, Optional[bool]]:
+    """
+    Verify several address types on one subscribed connection.
+    
+    All mining.authorize requests are sent back to back with their own ids and
+    the replies are matched by id. Types missing from the returned dict got no
+    reply (e.g. the pool closed the connection after one authorize) and should
+    be retried on their own connection.
+    """
+    client = StratumClient(hostname, port, timeout, family)
+    try:
+        client.connect()
+        subscribe_response = client.subscribe(timeout=3)
+        if not subscribe_response or 'result' not in subscribe_response:
+            return {}
         
+        addr_types = list(addresses)
+        replies = client.authorize_many([addresses[t] for t in addr_types], "x", timeout=timeout)
+        return {
+            addr_type: _authorize_status(reply)
+            for addr_type, reply in zip(addr_types, replies)
+            if reply is not None
+        }
     except Exception:
-        return None
+        return {}
     finally:
-        if sock:
-            try:
-                sock.close()
-            except:
-                pass
+        client.close()
 
 
-def test_address_types(hostname: str, port: int) -> Dict[str, Optional[bool]]:
+def test_address_types(hostname: str, port: int, dns_cache: Optional[DnsCache] = None,
+                       scheduler: Optional[ProbeScheduler] = None) -> Dict[str, Optional[bool]]:
     """
     Test all 5 Bitcoin address types against a pool.
     Returns dict with address type names as keys and support status as values.
     Values: True = supported, False = not supported, None = unknown
-    """
-    test_addresses = {
-        'P2PKH': '1A1zP1eP5QGefi2DMPTfTL5SLmv7DivfNa',
-        'P2SH': '3EExK1K1TF3v7zsFtQHt14XqexCwgmXM1y',
-        'P2WPKH': 'bc1qar0srrr7xfkvy5l643lydnw9re59gtzzwf5mdq',
-        'P2WSH': 'bc1qrp33g0q5c5txsp9arysrx4k6zdkfs4nce4xj0gdcccefvpysxf3qccfmv3',
-        'P2TR': 'bc1p5cyxnuxmeuwuvkwfem96lqzszd02n6xdcjrs20cac6yqjjwudpxqkedrcr',
-    }
     
-    results = {}
-    for addr_type, address in test_addresses.items():
-        # Use longer timeout for verification (8 seconds instead of 5)
-        results[addr_type] = verify_address_type(hostname, port, address, timeout=8)
-        # Longer delay between tests to avoid rate limiting (0.5s instead of 0.2s)
-        time.sleep(0.5)
+    The authorizes are pipelined on a single connection. Any type that got no
+    reply there is retried on separate connections, at most
+    VERIFY_CONNECTIONS_PER_POOL at a time.
     
-    return results
+    With dns_cache, connections go to the cached address, over the cache's
+    address family, like every other probe. Every connection holds its own
+    slot of scheduler (the run's, so the pool's token bucket and the global
+    cap apply); retries still running at the --deadline are abandoned.
+    """
+    if scheduler is None:
+        scheduler = ProbeScheduler(max_in_flight=VERIFY_CONNECTIONS_PER_POOL)
+    target, family = hostname, socket.AF_INET
+    if dns_cache is not None:
+        target, family = dns_cache.address(hostname) or hostname, dns_cache.family
+    with scheduler.slot(hostname):
+        results = verify_address_types_pipelined(target, port, TEST_ADDRESSES, timeout=8, family=family)
+    
+    missing = [addr_type for addr_type in TEST_ADDRESSES if addr_type not in results]
+    if missing:
+        statuses = scheduler.map(
+            lambda addr_type: verify_address_type(target, port, TEST_ADDRESSES[addr_type], 8, family),
+            [(addr_type,) for addr_type in missing],
+            key=lambda item: hostname,
+            deadline=_deadline,
+            on_timeout=lambda addr_type: None,
+            max_workers=VERIFY_CONNECTIONS_PER_POOL
+        )
+        results.update(zip(missing, statuses))
+    
+    # Keep the canonical column order
+    return {addr_type: results.get(addr_type) for addr_type in TEST_ADDRESSES}
 
 
+def _record_phases(store: Dict[str, List[float]], phases: Dict):
+    """Append the measured phase times of one successful probe to store"""
+    for phase in PROBE_METRICS:
+        if phases.get(phase) is not None:
+            store[phase].append(phases[phase])
+
+def _new_tls_samples() -> Dict:
+    """Empty TLS sample lists of a result dict"""
+    return {
+        'tls_times': SampleList(),
+        'tls_errors': [],
+        'tls_phase_times': {phase: SampleList() for phase in PROBE_METRICS},
+        'tls_resumed_times': SampleList(),
+        'tls_resumed_phase_times': {phase: SampleList() for phase in PROBE_METRICS},
+        'tls_resume_rejected': 0
+    }
+
+def time_left() -> Optional[float]:
+    """Seconds until the --deadline (never below 0), or None without one"""
+    if _deadline is None:
+        return None
+    return max(_deadline - time.monotonic(), 0.0)
+
+def deadline_passed() -> bool:
+    """True once the --deadline has passed"""
+    return _deadline is not None and time.monotonic() >= _deadline
+
+def _verify_until_deadline(hostname: str, port: int, dns_cache: Optional[DnsCache] = None,
+                           scheduler: Optional[ProbeScheduler] = None) -> Dict[str, Optional[bool]]:
+    """
+    test_address_types(), abandoned at the --deadline: every type is then
+    unknown (None)
+    """
+    if _deadline is None:
+        return test_address_types(hostname, port, dns_cache, scheduler)
+    finished = run_until([lambda: test_address_types(hostname, port, dns_cache, scheduler)], _deadline)
+    return finished.get(0, {addr_type: None for addr_type in TEST_ADDRESSES})
+
+def _run_schedule(runs: int, duration: Optional[float] = None):
+    """
+    Yield run numbers: runs times, or (with duration) until duration
+    seconds have elapsed, however many runs that takes. No run starts
+    after the --deadline.
+    """
+    deadline = time.monotonic() + duration if duration else None
+    run = 0
+    while (run < runs) if deadline is None else (time.monotonic() < deadline):
+        if deadline_passed():
+            return
+        yield run
+        run += 1
+
+def _record_tls_probe(samples: Dict, phases: Dict, attempted_resume: bool):
+    """
+    File one TLS probe under full-handshake or resumed samples.
+    A resumption the server declined is a full handshake.
+    """
+    if phases['error'] is not None:
+        samples['tls_errors'].append(phases['error'])
+    if phases['total'] is None:
+        return
+    if attempted_resume and phases['resumed']:
+        samples['tls_resumed_times'].append(phases['total'])
+        _record_phases(samples['tls_resumed_phase_times'], phases)
+    else:
+        if attempted_resume:
+            samples['tls_resume_rejected'] += 1
+        samples['tls_times'].append(phases['total'])
+        _record_phases(samples['tls_phase_times'], phases)
+
+def _log_sample(samples: List[Dict], metric: str, run: int, value: Optional[float],
+                error: Optional[str] = None, slot: Optional[Slot] = None, ts: Optional[float] = None):
+    """
+    Append one probe to a result's sample log: when it started (the slot's
+    start, else ts), its run, metric, value in ms, error and the number of
+    probes in flight when it started
+    """
+    if len(samples) >= SAMPLE_LOG_LIMIT:
+        return
+    samples.append({
+        'ts': slot.started_at if slot is not None and slot.started_at is not None else ts,
+        'run': run,
+        'metric': metric,
+        'ms': value,
+        'error': error,
+        'in_flight': slot.in_flight if slot is not None else None
+    })
+
+def _stagger(scheduler: ProbeScheduler) -> float:
+    """Random start offset of one server's first run, so servers do not all start at once"""
+    offset = random.uniform(0, RUN_INTERVAL) if scheduler.jitter > 0 else 0.0
+    return offset if _deadline is None else min(offset, time_left())
+
+def _scheduler_probe_gap(servers: List[Tuple], test_tls: bool = False) -> float:
+    """
+    Probe gap for a new scheduler: --probe-gap if given, else one run's
+    probe starts across all servers (ping, TCP RTT, stratum and TLS each)
+    spread evenly over RUN_INTERVAL, so default runs do not start in bursts
+    """
+    if _probe_gap is not None:
+        return _probe_gap
+    probes = len(servers) * (4 if test_tls else 3)
+    return RUN_INTERVAL / probes if probes else 0.0
+
+def _probe_timeout() -> Optional[float]:
+    """
+    Seconds a run's probes may take before they are abandoned: the run
+    deadline with --parallel-probes, capped by what is left of the
+    --deadline (None: no limit)
+    """
+    timeouts = [t for t in (_run_deadline if _parallel_probes else None, time_left()) if t is not None]
+    return min(timeouts) if timeouts else None
+
+def _late_error() -> str:
+    """Error recorded for an abandoned probe: which deadline it missed"""
+    return DEADLINE_ERROR if deadline_passed() else RUN_DEADLINE_ERROR
+
+def _run_probes_bounded(probes: List[Tuple], run: int, timeout: float, record_late) -> None:
+    """
+    Run probes at the same time on daemon threads and record them.
+    probes are (metric, probe, record) tuples: probe() is called on a worker
+    thread and record(run, outcome) on this one, in probes order, once all
+    probes finished or timeout seconds passed. Probes still running then are
+    abandoned: record_late(run, metric, started) marks them instead, and
+    whatever they measure later is dropped.
+    """
+    started = time.time()
+    finished = run_until([probe for _, probe, _ in probes], time.monotonic() + timeout)
+    for index, (metric, _, record) in enumerate(probes):
+        if index in finished:
+            record(run, finished[index])
+        else:
+            record_late(run, metric, started)
+
+class _RunRecorder:
+    """
+    One server's samples while test_server_multiple_runs() or
+    async_test_server_multiple_runs() probes it. Each engine runs the probes;
+    the record_* methods add their outcomes (always on the engine's own
+    thread or event loop, so abandoned probes add nothing) and result()
+    builds the result dict.
+    """
+    
+    def __init__(self, hostname: str, dns_cache: DnsCache, tls_resume: bool = False):
+        self.hostname = hostname
+        self.dns_cache = dns_cache
+        self.dns_mark = dns_cache.mark()
+        self.tls_resume = tls_resume
+        self.ping_times = SampleList()
+        self.ping_kernel_times = SampleList()
+        self.stratum_times = SampleList()
+        self.tcp_rtt_times = SampleList()
+        self.phase_times = {phase: SampleList() for phase in PROBE_METRICS}
+        self.tls_samples = _new_tls_samples()
+        self.tls_session = None  # Last TLS session, resumed by the next probe (tls_resume)
+        self.samples = []
+        self.completed_runs = 0
+        self.timed_out = False
+        # Loss and jitter over every ping, as icmp_ping.ping_hosts() reports them
+        self.pings_sent = 0
+        self.pings_received = 0
+        self.last_ping = None
+        self.ping_jitter_total = 0.0
+    
+    def record_ping(self, run: int, outcome: Tuple):
+        slot, ping_time, kernel = outcome
+        _log_sample(self.samples, 'ping', run, ping_time, slot=slot)
+        self.pings_sent += 1
+        if ping_time is not None:
+            self.ping_times.append(ping_time)
+            self.pings_received += 1
+            if self.last_ping is not None:
+                self.ping_jitter_total += abs(ping_time - self.last_ping)
+            self.last_ping = ping_time
+        self.ping_kernel_times.extend(kernel or [])
+    
+    def record_rtt(self, run: int, outcome: Tuple):
+        slot, rtt_samples = outcome
+        self.tcp_rtt_times.extend(rtt_samples)
+        for rtt in rtt_samples:
+            _log_sample(self.samples, 'tcp_rtt', run, rtt, slot=slot)
+    
+    def record_stratum(self, run: int, outcome: Tuple):
+        slot, phases = outcome
+        _log_sample(self.samples, 'stratum', run, phases['total'], phases['error'], slot)
+        if phases['total'] is not None:
+            self.stratum_times.append(phases['total'])
+            _record_phases(self.phase_times, phases)
+    
+    def record_tls(self, run: int, outcome: Tuple):
+        slot, tls_phases, attempted_resume = outcome
+        _log_sample(self.samples, 'tls', run, tls_phases['total'], tls_phases['error'], slot)
+        _record_tls_probe(self.tls_samples, tls_phases, attempted_resume)
+        if self.tls_resume:
+            self.tls_session = tls_phases['session'] or self.tls_session
+    
+    def record_late(self, run: int, metric: str, started: float):
+        error = _late_error()
+        self.timed_out = self.timed_out or error == DEADLINE_ERROR
+        _log_sample(self.samples, metric, run, None, error, ts=started)
+        if metric == 'tls':
+            self.tls_samples['tls_errors'].append(error)
+    
+    def result(self, port: int, tls_port: int, display_name: str, country_code: str,
+               runs: int, duration: Optional[float] = None) -> Dict:
+        """
+        The result dict, with the 'dns' phase holding the hostname's
+        resolutions while probed. With native ICMP it also carries
+        'ping_loss' (0.0-1.0) and 'ping_jitter' (mean change in ms between
+        consecutive replies) over the per-run pings.
+        """
+        self.phase_times['dns'].extend(self.dns_cache.resolutions(self.hostname, self.dns_mark))
+        result = {
+            'hostname': self.hostname,
+            'port': port,
+            'tls_port': tls_port,
+            'display_name': display_name,
+            'country_code': country_code,
+            'runs': self.completed_runs,
+            'ping_times': self.ping_times,
+            'ping_kernel_times': self.ping_kernel_times,
+            'tcp_rtt_times': self.tcp_rtt_times,
+            'stratum_times': self.stratum_times,
+            'phase_times': self.phase_times,
+            'samples': self.samples,
+            # Cut short by the --deadline: probes abandoned or runs never started
+            'timed_out': self.timed_out or (deadline_passed() and duration is None
+                                            and self.completed_runs < runs),
+            **self.tls_samples
+        }
+        if self.pings_sent and icmp_ping.is_available():
+            result['ping_loss'] = (self.pings_sent - self.pings_received) / self.pings_sent
+            result['ping_jitter'] = (self.ping_jitter_total / (self.pings_received - 1)
+                                     if self.pings_received > 1 else None)
+        return result
+
 def test_server_multiple_runs(hostname: str, port: int, display_name: str, 
                                runs: int, country_code: str = "??", verify: bool = False,
-                               tls_port: int = 0, test_tls: bool = False, verify_cert: bool = True) -> Dict:
-    """Test a server multiple times and return statistics"""
-    ping_times = []
-    stratum_times = []
-    tls_times = []
-    tls_errors = []
-    
-    for _ in range(runs):
-        ping_time = ping_host(hostname)
-        stratum_time = test_stratum_connection(hostname, port)
+                               tls_port: int = 0, test_tls: bool = False, verify_cert: bool = True,
+                               use_ping: bool = True, scheduler: Optional[ProbeScheduler] = None,
+                               tls_resume: bool = False, duration: Optional[float] = None,
+                               dns_cache: Optional[DnsCache] = None, server_name: Optional[str] = None) -> Dict:
+    """
+    Test a server multiple times and return statistics.
+    use_ping=False skips the per-run ping.
+    Every connection to the pool goes through scheduler (per-pool rate limit
+    and global in-flight cap); run_probes() passes one shared by all servers.
+    
+    With tls_resume, the first TLS probe is a full handshake and later runs
+    resume its session (one extra resumed probe is made when runs == 1).
+    
+    With duration, runs is ignored and the server is probed back to back
+    until duration seconds have passed. Sample lists are SampleLists: they
+    keep the first samples, and their sketches cover every run.
+    
+    Probes connect to addresses from dns_cache (run_probes() passes one it
+    prefetched), so stratum times exclude DNS and the 'dns' phase holds
+    the resolutions of the hostname made while the server was probed.
+    
+    When hostname is one address of a pool (--all-addresses), server_name
+    is the pool's hostname, used for TLS.
+    
+    The first run starts after a random offset and runs are RUN_INTERVAL
+    apart, both randomized by the scheduler's jitter. Every probe, pings
+    included, holds a scheduler slot while it runs and is logged in the
+    result's 'samples' with its start time (see _log_sample).
+    
+    With --parallel-probes a run's probes are started together on worker
+    threads instead of one after another (see _run_probes_bounded). With
+    --deadline, probes still running at the deadline are abandoned, no
+    further runs start, and the result's 'timed_out' is set.
+    """
+    if dns_cache is None:
+        dns_cache = DnsCache()
+    if scheduler is None:
+        scheduler = ProbeScheduler(resolve=dns_cache.address)
+    recorder = _RunRecorder(hostname, dns_cache, tls_resume)
+    tls_context = make_tls_context(verify_cert) if test_tls and tls_resume else None
+    
+    # Each probe returns its outcome, which the recorder's matching record_* adds
+    def ping_probe():
+        kernel = [] if _kernel_timestamps else None
+        with scheduler.slot(hostname) as slot:
+            ping_time = ping_host(dns_cache.address(hostname) or hostname, kernel_times=kernel)
+        return slot, ping_time, kernel
+    
+    def rtt_probe():
+        with scheduler.slot(hostname, cost=TCP_RTT_SAMPLES_PER_RUN) as slot:
+            return slot, tcp_rtt_samples(hostname, port, dns_cache=dns_cache)
+    
+    def stratum_probe():
+        with scheduler.slot(hostname) as slot:
+            phases = probe_stratum_phases(hostname, port, dns_cache=dns_cache)
+            slot.report(phases['error'])
+        return slot, phases
+    
+    def tls_probe():
+        session = recorder.tls_session
+        with scheduler.slot(hostname) as slot:
+            tls_phases = probe_stratum_phases(hostname, tls_port, use_tls=True, verify_cert=verify_cert,
+                                              ssl_context=tls_context, session=session,
+                                              dns_cache=dns_cache, server_name=server_name)
+            slot.report(tls_phases['error'])
+        return slot, tls_phases, session is not None
+    
+    probes = []
+    if use_ping:
+        probes.append(('ping', ping_probe, recorder.record_ping))
+    probes.append(('tcp_rtt', rtt_probe, recorder.record_rtt))
+    probes.append(('stratum', stratum_probe, recorder.record_stratum))
+    # Test TLS if requested and port is available
+    if test_tls and tls_port > 0:
+        probes.append(('tls', tls_probe, recorder.record_tls))
+    
+    time.sleep(_stagger(scheduler))
+    for run in _run_schedule(runs, duration):
+        if _parallel_probes:
+            _run_probes_bounded(probes, run, _probe_timeout(), recorder.record_late)
+        elif _deadline is not None:
+            for probe in probes:
+                _run_probes_bounded([probe], run, _probe_timeout(), recorder.record_late)
+        else:
+            for _, probe, record in probes:
+                record(run, probe())
+        
+        recorder.completed_runs = run + 1
+        
+        # Small, jittered delay between runs
+        if runs > 1 or duration:
+            time.sleep(jittered(RUN_INTERVAL, scheduler.jitter))
+    
+    if recorder.completed_runs == 1 and recorder.tls_session is not None and not deadline_passed():
+        recorder.record_tls(recorder.completed_runs, tls_probe())
+    
+    result = recorder.result(port, tls_port, display_name, country_code, runs, duration)
+    
+    # Optionally test address type compatibility (one scheduler slot per connection)
+    if verify and not deadline_passed():
+        result['address_types'] = _verify_until_deadline(hostname, port, dns_cache, scheduler)
+    
+    return result
+
+# ---------------------------------------------------------------------------
+# asyncio probe engine (--async)
+#
+# Runs ping, plain stratum and TLS stratum probes as coroutines instead of one
+# thread per server, so thousands of endpoints can be probed from one process.
+# A shared ProbeScheduler caps the number of probes in flight across all
+# servers and rate limits connections to each pool.
+# Results use the same dict layout as test_server_multiple_runs().
+# ---------------------------------------------------------------------------
+
+async def async_ping_host(hostname: str, timeout: int = 2,
+                          locks: Optional[Dict[str, asyncio.Lock]] = None,
+                          kernel_times: Optional[List[float]] = None) -> Optional[float]:
+    """
+    Asynchronous version of ping_host() using an asyncio subprocess.
+    Returns response time in milliseconds or None if ping fails.
+    
+    Pings to the same hostname are serialized through the optional locks dict,
+    mirroring the per-hostname locking of the threaded engine.
+    
+    Uses the native ICMP engine (in the default executor) when available,
+    appending kernel-timestamped RTTs to kernel_times as ping_host() does.
+    """
+    if icmp_ping.is_available():
+        loop = asyncio.get_event_loop()
+        return await loop.run_in_executor(None, ping_host, hostname, timeout, kernel_times)
+    
+    if not check_ping_available():
+        return None
+    
+    host_lock = None
+    if locks is not None:
+        host_lock = locks.setdefault(hostname, asyncio.Lock())
+    
+    system = platform.system().lower()
+    command = _ping_command(hostname, timeout, system)
+    
+    async def attempt_ping() -> Optional[float]:
+        proc = await asyncio.create_subprocess_exec(
+            *command,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE
+        )
+        try:
+            stdout, _ = await asyncio.wait_for(proc.communicate(), timeout + 1)
+        except asyncio.TimeoutError:
+            proc.kill()
+            await proc.wait()
+            return None
+        if proc.returncode != 0:
+            return None
+        return _parse_ping_output(stdout.decode('utf-8', 'replace'), system)
+    
+    # Retry up to 3 times for reliability (same policy as ping_host)
+    for attempt in range(3):
+        try:
+            if host_lock is not None:
+                async with host_lock:
+                    ping_time = await attempt_ping()
+            else:
+                ping_time = await attempt_ping()
+        except OSError:
+            ping_time = None
         
         if ping_time is not None:
-            ping_times.append(ping_time)
-        if stratum_time is not None:
-            stratum_times.append(stratum_time)
+            return ping_time
+        if attempt < 2:
+            await asyncio.sleep(0.1)
+    
+    return None
+
+async def async_tcp_rtt_samples(hostname: str, port: int, count: int = TCP_RTT_SAMPLES_PER_RUN,
+                                timeout: int = 2, dns_cache: Optional[DnsCache] = None) -> List[float]:
+    """
+    Asynchronous version of tcp_rtt_samples().
+    Returns the successful TCP handshake samples in milliseconds.
+    """
+    loop = asyncio.get_event_loop()
+    try:
+        if dns_cache is not None:
+            addrinfo = await asyncio.wait_for(dns_cache.alookup(hostname, port), timeout)
+        else:
+            addrinfo = await asyncio.wait_for(
+                loop.getaddrinfo(hostname, port, family=socket.AF_INET, type=socket.SOCK_STREAM), timeout)
+    except (asyncio.TimeoutError, OSError):
+        return []
+    family, socktype, proto, _, address = addrinfo[0]
+    
+    times = []
+    for _ in range(count):
+        sock = socket.socket(family, socktype, proto)
+        sock.setblocking(False)
+        try:
+            start = now_ns()
+            await asyncio.wait_for(loop.sock_connect(sock, address), timeout)
+            times.append((now_ns() - start) / 1e6)
+        except (asyncio.TimeoutError, OSError):
+            pass
+        finally:
+            sock.close()
+    return times
+
+async def async_probe_stratum_phases(hostname: str, port: int, timeout: int = 5, use_tls: bool = False,
+                                     verify_cert: bool = True, dns_cache: Optional[DnsCache] = None,
+                                     server_name: Optional[str] = None) -> Dict:
+    """
+    Asynchronous version of probe_stratum_phases().
+    Returns the same dict of phase times in milliseconds plus 'total' and 'error'.
+    """
+    result = {phase: None for phase in PROBE_METRICS}
+    result['total'] = None
+    result['error'] = None
+    
+    loop = asyncio.get_event_loop()
+    sock = None
+    writer = None
+    try:
+        context = None
+        if use_tls:
+            # Build the SSL context outside the timed region
+            context = make_tls_context(verify_cert)
         
-        # Test TLS if requested and port is available
-        if test_tls and tls_port > 0:
-            tls_time, tls_error = test_stratum_tls_connection(hostname, tls_port, verify_cert=verify_cert)
-            if tls_time is not None:
-                tls_times.append(tls_time)
-            if tls_error is not None:
-                tls_errors.append(tls_error)
+        t_start = now_ns()
+        if dns_cache is not None:
+            addrinfo = await asyncio.wait_for(dns_cache.alookup(hostname, port), timeout)
+            t_resolved = t_start  # DNS is its own metric, not part of the total
+        else:
+            addrinfo = await asyncio.wait_for(
+                loop.getaddrinfo(hostname, port, family=socket.AF_INET, type=socket.SOCK_STREAM), timeout)
+            t_resolved = now_ns()
+            result['dns'] = (t_resolved - t_start) / 1e6
         
-        # Small delay between runs
-        if runs > 1:
-            time.sleep(0.1)
-    
-    result = {
-        'hostname': hostname,
-        'port': port,
-        'tls_port': tls_port,
-        'display_name': display_name,
-        'country_code': country_code,
-        'ping_times': ping_times,
-        'stratum_times': stratum_times,
-        'tls_times': tls_times,
-        'tls_errors': tls_errors
-    }
+        family, socktype, proto, _, address = addrinfo[0]
+        sock = socket.socket(family, socktype, proto)
+        sock.setblocking(False)
+        
+        t_connect = now_ns()
+        await asyncio.wait_for(loop.sock_connect(sock, address), timeout)
+        t_connected = now_ns()
+        result['connect'] = (t_connected - t_connect) / 1e6
+        setup_ns = (t_resolved - t_start) + (t_connected - t_connect)
+        
+        # Hand the connected socket to a stream (performs the TLS handshake if requested)
+        t_handshake = now_ns()
+        if context is not None:
+            reader, writer = await asyncio.wait_for(
+                asyncio.open_connection(sock=sock, ssl=context, server_hostname=server_name or hostname),
+                timeout)
+            t_handshaken = now_ns()
+            result['tls'] = (t_handshaken - t_handshake) / 1e6
+            setup_ns += t_handshaken - t_handshake
+        else:
+            reader, writer = await asyncio.open_connection(sock=sock)
+        sock = None  # Owned by the stream now
+        
+        subscribe_msg = json.dumps({
+            "id": 1,
+            "method": "mining.subscribe",
+            "params": []
+        }) + "\n"
+        
+        t_sent = now_ns()
+        writer.write(subscribe_msg.encode('utf-8'))
+        await writer.drain()
+        
+        # Read until the complete id 1 reply has arrived
+        deadline = time.time() + timeout
+        buffer = b""
+        reply = None
+        while reply is None:
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                break
+            try:
+                chunk = await asyncio.wait_for(reader.read(8192), remaining)
+            except asyncio.TimeoutError:
+                break
+            if not chunk:
+                break
+            if result['first_byte'] is None:
+                result['first_byte'] = (now_ns() - t_sent) / 1e6
+            buffer += chunk
+            reply = find_response(buffer, 1)
+        t_reply = now_ns()
+        
+        if reply is None:
+            result['error'] = "No subscribe reply" if buffer else "No response"
+            return result
+        
+        result['reply'] = (t_reply - t_sent) / 1e6
+        result['total'] = (setup_ns + (t_reply - t_sent)) / 1e6
+        _record_tcp_info(result, writer.get_extra_info('socket'))
+        return result
+        
+    except Exception as e:
+        result['error'] = _describe_connection_error(e)
+        return result
+    finally:
+        if writer is not None:
+            writer.close()
+        if sock is not None:
+            sock.close()
+
+async def async_test_stratum_connection(hostname: str, port: int, timeout: int = 5) -> Optional[float]:
+    """
+    Asynchronous version of test_stratum_connection().
+    Returns response time in milliseconds or None if connection fails.
+    """
+    return (await async_probe_stratum_phases(hostname, port, timeout))['total']
+
+async def async_test_stratum_tls_connection(hostname: str, port: int, timeout: int = 5,
+                                            verify_cert: bool = True) -> Tuple[Optional[float], Optional[str]]:
+    """
+    Asynchronous version of test_stratum_tls_connection().
+    Returns (elapsed_time_ms, error_message) tuple.
+    """
+    phases = await async_probe_stratum_phases(hostname, port, timeout, use_tls=True, verify_cert=verify_cert)
+    return (phases['total'], phases['error'])
+
+async def _async_run_probes_bounded(probes: List[Tuple], run: int, timeout: float, record_late) -> None:
+    """
+    Asynchronous version of _run_probes_bounded(): probes are coroutine
+    functions, run as tasks, and the ones still running after timeout
+    seconds are cancelled (releasing their scheduler slots).
+    """
+    started = time.time()
+    tasks = [(metric, asyncio.ensure_future(probe()), record) for metric, probe, record in probes]
+    await asyncio.wait([task for _, task, _ in tasks], timeout=timeout)
+    for metric, task, record in tasks:
+        if task.done():
+            record(run, task.result())
+        else:
+            task.cancel()
+            record_late(run, metric, started)
+
+async def async_test_server_multiple_runs(scheduler: ProbeScheduler, hostname: str, port: int,
+                                          display_name: str, runs: int, country_code: str = "??",
+                                          verify: bool = False, tls_port: int = 0, test_tls: bool = False,
+                                          verify_cert: bool = True,
+                                          ping_locks: Optional[Dict[str, asyncio.Lock]] = None,
+                                          use_ping: bool = True, tls_resume: bool = False,
+                                          duration: Optional[float] = None,
+                                          dns_cache: Optional[DnsCache] = None,
+                                          server_name: Optional[str] = None) -> Dict:
+    """
+    Asynchronous version of test_server_multiple_runs().
+    Every individual probe holds a scheduler slot while it runs.
+    
+    asyncio streams cannot resume a TLS session, so with tls_resume the TLS
+    probes run the blocking probe_stratum_phases() in the default executor.
+    
+    With --parallel-probes a run's probes are gathered as tasks, and those
+    still running at the run deadline (or the --deadline) are cancelled.
+    """
+    if dns_cache is None:
+        dns_cache = DnsCache()
+    recorder = _RunRecorder(hostname, dns_cache, tls_resume)
+    tls_context = make_tls_context(verify_cert) if test_tls and tls_resume else None
+    loop = asyncio.get_event_loop()
+    
+    # As in test_server_multiple_runs(): probes return outcomes, the recorder adds them
+    async def ping_probe():
+        kernel = [] if _kernel_timestamps else None
+        async with scheduler.async_slot(hostname) as slot:
+            ping_time = await async_ping_host(dns_cache.address(hostname) or hostname, locks=ping_locks,
+                                              kernel_times=kernel)
+        return slot, ping_time, kernel
+    
+    async def rtt_probe():
+        async with scheduler.async_slot(hostname, cost=TCP_RTT_SAMPLES_PER_RUN) as slot:
+            return slot, await async_tcp_rtt_samples(hostname, port, dns_cache=dns_cache)
+    
+    async def stratum_probe():
+        async with scheduler.async_slot(hostname) as slot:
+            phases = await async_probe_stratum_phases(hostname, port, dns_cache=dns_cache)
+            slot.report(phases['error'])
+        return slot, phases
+    
+    async def tls_probe():
+        session = recorder.tls_session
+        async with scheduler.async_slot(hostname) as slot:
+            if tls_resume:
+                tls_phases = await loop.run_in_executor(
+                    None, lambda: probe_stratum_phases(hostname, tls_port, use_tls=True, verify_cert=verify_cert,
+                                                       ssl_context=tls_context, session=session,
+                                                       dns_cache=dns_cache, server_name=server_name))
+            else:
+                tls_phases = await async_probe_stratum_phases(hostname, tls_port, use_tls=True,
+                                                              verify_cert=verify_cert, dns_cache=dns_cache,
+                                                              server_name=server_name)
+            slot.report(tls_phases['error'])
+        return slot, tls_phases, session is not None
+    
+    probes = []
+    if use_ping:
+        probes.append(('ping', ping_probe, recorder.record_ping))
+    probes.append(('tcp_rtt', rtt_probe, recorder.record_rtt))
+    probes.append(('stratum', stratum_probe, recorder.record_stratum))
+    # Test TLS if requested and port is available
+    if test_tls and tls_port > 0:
+        probes.append(('tls', tls_probe, recorder.record_tls))
+    
+    await asyncio.sleep(_stagger(scheduler))
+    for run in _run_schedule(runs, duration):
+        if _parallel_probes:
+            await _async_run_probes_bounded(probes, run, _probe_timeout(), recorder.record_late)
+        elif _deadline is not None:
+            for probe in probes:
+                await _async_run_probes_bounded([probe], run, _probe_timeout(), recorder.record_late)
+        else:
+            for _, probe, record in probes:
+                record(run, await probe())
+        
+        recorder.completed_runs = run + 1
+        
+        # Small, jittered delay between runs
+        if runs > 1 or duration:
+            await asyncio.sleep(jittered(RUN_INTERVAL, scheduler.jitter))
+    
+    if recorder.completed_runs == 1 and recorder.tls_session is not None and not deadline_passed():
+        recorder.record_tls(recorder.completed_runs, await tls_probe())
+    
+    result = recorder.result(port, tls_port, display_name, country_code, runs, duration)
+    
+    # Address verification is still blocking - run it in the default executor,
+    # taking one scheduler slot per connection from there
+    if verify and not deadline_passed():
+        result['address_types'] = await loop.run_in_executor(None, _verify_until_deadline, hostname, port,
+                                                             dns_cache, scheduler)
+    
+    return result
+
+async def probe_servers_async(servers: List[Tuple], runs: int = 1, verify: bool = False,
+                              test_tls: bool = False, verify_cert: bool = True,
+                              concurrency: int = DEFAULT_ASYNC_CONCURRENCY,
+                              on_result=None, use_ping: bool = True,
+                              scheduler: Optional[ProbeScheduler] = None, tls_resume: bool = False,
+                              duration: Optional[float] = None,
+                              dns_cache: Optional[DnsCache] = None,
+                              server_names: Optional[Dict[str, str]] = None) -> List[Dict]:
+    """
+    Probe a list of servers with the asyncio engine.
+    
+    Args:
+        servers: List of (hostname, port, tls_port, display_name, country_code) tuples
+        concurrency: Global cap on probes in flight across all servers
+        on_result: Optional callback invoked with each result as it completes
+        use_ping: Ping each host per run
+        scheduler: Shared rate limiter (default: a new one capped at concurrency)
+        tls_resume: Resume the first TLS session on later runs
+        duration: Probe each server for this many seconds instead of runs times
+        dns_cache: Shared DNS cache (default: a new one)
+        server_names: TLS name per probed (host, port), for hosts that are addresses of a pool
+    
+    Returns:
+        List of result dicts in completion order
+    """
+    if dns_cache is None:
+        dns_cache = DnsCache()
+    if scheduler is None:
+        scheduler = ProbeScheduler(max_in_flight=concurrency, probe_gap=_scheduler_probe_gap(servers, test_tls),
+                                   jitter=_probe_jitter, resolve=dns_cache.address)
+    ping_locks = {}
+    
+    # Servers start in random order (see run_probes)
+    tasks = [
+        async_test_server_multiple_runs(scheduler, host, port, name, runs, cc, verify,
+                                        tls_port, test_tls, verify_cert, ping_locks, use_ping, tls_resume,
+                                        duration, dns_cache, (server_names or {}).get((host, port)))
+        for host, port, tls_port, name, cc in random.sample(servers, len(servers))
+    ]
+    
+    results = []
+    for future in asyncio.as_completed(tasks):
+        result = await future
+        results.append(result)
+        if on_result is not None:
+            on_result(result)
+    
+    return results
+
+def run_probes(servers: List[Tuple], runs: int = 1, verify: bool = False, test_tls: bool = False,
+               verify_cert: bool = True, use_async: bool = False,
+               concurrency: int = DEFAULT_ASYNC_CONCURRENCY, on_result=None,
+               scheduler: Optional[ProbeScheduler] = None, tls_resume: bool = False,
+               duration: Optional[float] = None, dns_cache: Optional[DnsCache] = None,
+               server_names: Optional[Dict[str, str]] = None) -> List[Dict]:
+    """
+    Probe a list of servers with the threaded or asyncio engine.
+    on_result is invoked with each result dict as soon as that server completes.
+    
+    All connections go through one ProbeScheduler: a token bucket per pool
+    and a global in-flight cap (starting at concurrency) that backs off when
+    probes time out or get reset. Servers are started in random order, each
+    after a random offset, and probe starts are paced across all servers
+    (see _scheduler_probe_gap), so no pool is always probed inside the same
+    burst.
+    
+    Every host is pinged once per run, through the scheduler like the other
+    probes. When native ICMP is available, results also carry 'ping_loss'
+    and 'ping_jitter' over those pings.
+    
+    With duration, each server is probed repeatedly for that many seconds
+    instead of a fixed number of runs.
+    
+    Every hostname is resolved once up front, concurrently, into dns_cache
+    (a new DnsCache unless one is shared across calls, as --monitor does).
+    Probes connect to the cached addresses until their TTL expires, in the
+    cache's address family, and each result's 'address' is the one probed.
+    
+    server_names maps (host, port) of servers that are addresses of a pool
+    (see expand_server_addresses) to the pool's hostname: it is used for TLS and
+    returned in the result as 'pool_hostname'.
+    """
+    server_names = server_names or {}
+    if dns_cache is None:
+        dns_cache = DnsCache()
+    dns_mark = dns_cache.mark()
+    dns_cache.prefetch((server[0] for server in servers), _deadline)
+    
+    if scheduler is None:
+        scheduler = ProbeScheduler(max_in_flight=concurrency, probe_gap=_scheduler_probe_gap(servers, test_tls),
+                                   jitter=_probe_jitter, resolve=dns_cache.address)
+    
+    def finish(result):
+        # Include the prefetch, which ran before the server's probes started
+        result['phase_times']['dns'] = SampleList(dns_cache.resolutions(result['hostname'], dns_mark))
+        result['address'] = dns_cache.address(result['hostname'])
+        if (result['hostname'], result['port']) in server_names:
+            result['pool_hostname'] = server_names[(result['hostname'], result['port'])]
+        if on_result is not None:
+            on_result(result)
+    
+    if use_async:
+        return asyncio.run(probe_servers_async(servers, runs, verify, test_tls, verify_cert,
+                                               concurrency, finish, True, scheduler, tls_resume, duration,
+                                               dns_cache, server_names))
+    
+    results = []
+    # One thread per server (up to the in-flight cap); the scheduler decides
+    # how many probes actually run at once
+    max_workers = max(1, min(len(servers), scheduler.max_in_flight))
+    
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {
+            executor.submit(test_server_multiple_runs, host, port, name, runs, cc, verify, tls_port, test_tls, verify_cert, True, scheduler, tls_resume, duration, dns_cache, server_names.get((host, port))): (host, port, tls_port, name, cc)
+            for host, port, tls_port, name, cc in random.sample(servers, len(servers))
+        }
+        
+        for future in as_completed(futures):
+            result = future.result()
+            results.append(result)
+            finish(result)
+    
+    return results
+
+def expand_server_addresses(servers: List[Tuple], dns_cache: DnsCache,
+                            per_family: bool = False) -> Tuple[List[Tuple], Dict[Tuple, str]]:
+    """
+    Expand each server into one server per A/AAAA address of its hostname
+    (--all-addresses), so anycast and round-robin endpoints are probed
+    separately, or with per_family into its first IPv4 and first IPv6
+    address (--dual-stack). Returns the expanded servers and a map of
+    (address, port) -> pool hostname for run_probes(); hosts that do not
+    resolve (or are still resolving at the --deadline) are kept as they are.
+    """
+    if _deadline is None:
+        resolved = {index: dns_cache.all_addresses(server[0]) for index, server in enumerate(servers)}
+    else:
+        resolved = run_until([lambda host=server[0]: dns_cache.all_addresses(host) for server in servers], _deadline)
+    
+    expanded = []
+    server_names = {}
+    for index, (host, port, tls_port, name, cc) in enumerate(servers):
+        addresses = resolved.get(index, [])
+        if per_family:
+            firsts = {}
+            for address in addresses:
+                firsts.setdefault(dual_stack.address_family(address), address)
+            addresses = list(firsts.values())
+        if not addresses or addresses == [host]:
+            expanded.append((host, port, tls_port, name, cc))
+            continue
+        for address in addresses:
+            expanded.append((address, port, tls_port, name, cc))
+            server_names[(address, port)] = host
+    return expanded, server_names
+
+def probe_targets(servers: List[Tuple], dns_cache: Optional[DnsCache], all_addresses: bool = False,
+                  dual_stack_mode: bool = False) -> Tuple[List[Tuple], Optional[Dict[Tuple, str]], Optional[DnsCache]]:
+    """
+    Servers to probe, their pool hostnames (see expand_server_addresses)
+    and the DNS cache to probe with, for --all-addresses / --dual-stack
+    """
+    if not all_addresses and not dual_stack_mode:
+        return servers, None, dns_cache
+    dns_cache = dns_cache or DnsCache()
+    expanded, server_names = expand_server_addresses(servers, dns_cache, per_family=not all_addresses)
+    return expanded, server_names, dns_cache
+
+def run_happy_eyeballs(servers: List[Tuple], runs: int = 1, dns_cache: Optional[DnsCache] = None,
+                       scheduler: Optional[ProbeScheduler] = None) -> List[Dict]:
+    """
+    Race IPv6 against IPv4 to every server runs times (dual_stack.happy_eyeballs)
+    and summarize each server's races: which family wins and by how much.
+    Races to one pool run back to back; pools are raced concurrently.
+    With --resolver, the addresses raced are those the resolvers returned.
+    With --deadline, races still running then are abandoned and each pool
+    is summarized from the races it finished.
+    """
+    if scheduler is None:
+        scheduler = ProbeScheduler(resolve=dns_cache.address if dns_cache is not None else None)
+    
+    def race(server, races):
+        host, port = server[0], server[1]
+        addresses = None
+        if dns_cache is not None and dns_cache.resolvers:
+            addresses = dns_cache.all_addresses(host)
+        for _ in range(runs):
+            if deadline_passed():
+                break
+            timeout = HAPPY_EYEBALLS_TIMEOUT if _deadline is None else min(HAPPY_EYEBALLS_TIMEOUT, time_left())
+            # A race opens up to two connections (the winner and the other family)
+            with scheduler.slot(host, cost=2) as slot:
+                outcome = dual_stack.happy_eyeballs(host, port, timeout, addresses=addresses)
+                slot.report(outcome['error'])
+            races.append(outcome)
+    
+    if not servers:
+        return []
+    races = [[] for _ in servers]
+    max_workers = max(1, min(len(servers), scheduler.max_in_flight))
+    if _deadline is None:
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            list(executor.map(race, servers, races))
+    else:
+        run_until([lambda server=server, done=done: race(server, done) for server, done in zip(servers, races)],
+                  _deadline, max_workers)
+    return [dict(dual_stack.summarize_races(list(done)), host=server[0], port=server[1], display_name=server[3])
+            for server, done in zip(servers, races)]
+
+def sort_results(results: List[Dict], by_pool: bool = False):
+    """
+    Sort results by average stratum time (no results last, AtlasPool first
+    in ties). With by_pool, the addresses of one pool stay together, pools
+    ordered by their fastest address.
+    """
+    def avg(result):
+        return sketch_of(result['stratum_times']).mean if result['stratum_times'] else float('inf')
     
-    # Optionally test address type compatibility
-    if verify:
-        result['address_types'] = test_address_types(hostname, port)
+    def pool(result):
+        return result.get('pool_hostname', result['hostname']), result['port']
     
-    return result
+    best = {}
+    for r in results:
+        best[pool(r)] = min(best.get(pool(r), float('inf')), avg(r))
+    
+    results.sort(key=lambda x: (
+        (best[pool(x)], pool(x)) if by_pool else (),
+        not x['stratum_times'],  # No results last
+        avg(x),
+        x['display_name'] != 'AtlasPool.io'  # AtlasPool first in ties
+    ))
 
 def format_time_single(time_ms: Optional[float]) -> str:
     """Format single time value for display"""
@@ -657,11 +1762,13 @@ def format_time_multi(times: List[float]) -> str:
     if not times:
         return "N/A"
     
-    avg = mean(times)
-    min_t = min(times)
-    max_t = max(times)
+    # The sketch covers every sample, even those a SampleList did not keep
+    sketch = sketch_of(times)
+    avg = sketch.mean
+    min_t = sketch.min
+    max_t = sketch.max
     
-    if len(times) == 1:
+    if sketch.count == 1:
         return f"{int(round(avg))}"
     else:
         return f"{int(round(avg))} ({int(round(min_t))}-{int(round(max_t))})"
@@ -674,6 +1781,35 @@ def format_time_for_result(result: Dict, use_ping: bool = False) -> str:
         # If ping failed but stratum succeeded, ICMP is blocked
         if use_ping and result['stratum_times']:
             return "BLOCKED"
+        if not use_ping and result.get('timed_out'):
+            return DEADLINE_ERROR
+        return "N/A"
+    
+    if len(times) == 1:
+        formatted = format_time_single(times[0])
+    else:
+        formatted = format_time_multi(times)
+    
+    # Native ICMP engine reports packet loss
+    if use_ping and result.get('ping_loss'):
+        formatted += f" {result['ping_loss'] * 100:.0f}% loss"
+    return formatted
+
+def format_time_for_tcp_rtt(result: Dict) -> str:
+    """Format TCP handshake RTT from result dict"""
+    times = result.get('tcp_rtt_times', [])
+    if not times:
+        return "N/A"
+    
+    if len(times) == 1:
+        return format_time_single(times[0])
+    else:
+        return format_time_multi(times)
+
+def format_time_for_kernel_ping(result: Dict) -> str:
+    """Format kernel-timestamped ping RTT from result dict"""
+    times = result.get('ping_kernel_times', [])
+    if not times:
         return "N/A"
     
     if len(times) == 1:
@@ -692,14 +1828,117 @@ def format_time_for_tls(result: Dict) -> str:
     
     # If TLS port exists but no successful times
     if not tls_times:
-        return "FAILED"
+        return DEADLINE_ERROR if result.get('timed_out') else "FAILED"
     
     if len(tls_times) == 1:
         return format_time_single(tls_times[0])
     else:
         return format_time_multi(tls_times)
 
-def print_table(results: List[Dict], runs: int, verify: bool = False, show_tls: bool = False):
+def format_time_for_tls_resumed(result: Dict) -> str:
+    """Format resumed TLS time from result dict"""
+    if result.get('tls_port', 0) == 0:
+        return "-"
+    
+    times = result.get('tls_resumed_times', [])
+    if not times:
+        # The server completed handshakes but never resumed the session
+        return "NO RESUME" if result.get('tls_resume_rejected') else "FAILED"
+    
+    if len(times) == 1:
+        return format_time_single(times[0])
+    else:
+        return format_time_multi(times)
+
+def format_time_for_phase(result: Dict, phase: str, key: str = 'phase_times') -> str:
+    """Format one latency phase from result dict"""
+    times = result.get(key, {}).get(phase, [])
+    if not times:
+        return "-" if key.startswith('tls_') and result.get('tls_port', 0) == 0 else "N/A"
+    
+    if len(times) == 1:
+        return format_time_single(times[0])
+    else:
+        return format_time_multi(times)
+
+def format_percentiles(times: List[float]) -> str:
+    """Format p50/p90/p99 of a sample list"""
+    if not times:
+        return "N/A"
+    sketch = sketch_of(times)
+    return "/".join(f"{int(round(sketch.quantile(q)))}" for q in (0.50, 0.90, 0.99))
+
+def format_spread(times: List[float]) -> str:
+    """Format jitter of a sample list as standard deviation / interquartile range"""
+    if not times:
+        return "N/A"
+    sketch = sketch_of(times)
+    stddev = sketch.stddev()
+    if stddev is None:
+        return "-"
+    return f"{stddev:.1f}/{sketch.iqr():.1f}"
+
+def percentile_columns(results: List[Dict], show_tls: bool = False) -> List[Tuple[str, List[str]]]:
+    """Build the (header, values) columns with stratum (and TLS) percentiles and jitter"""
+    columns = [
+        ("Stratum p50/p90/p99 (ms)", [format_percentiles(r['stratum_times']) for r in results]),
+        ("Stratum σ/IQR (ms)", [format_spread(r['stratum_times']) for r in results]),
+    ]
+    if show_tls:
+        columns.append(("TLS p50/p90/p99 (ms)",
+                        ["-" if r.get('tls_port', 0) == 0 else format_percentiles(r.get('tls_times', []))
+                         for r in results]))
+        columns.append(("TLS σ/IQR (ms)",
+                        ["-" if r.get('tls_port', 0) == 0 else format_spread(r.get('tls_times', []))
+                         for r in results]))
+    return columns
+
+def cold_stratum_avg(result: Dict) -> Optional[float]:
+    """
+    Stratum time with a cold DNS cache: average resolution time plus the
+    average (cached-address) stratum time. None unless both were measured.
+    """
+    dns = _phase_avg(result, 'dns')
+    if dns is None or not result['stratum_times']:
+        return None
+    return dns + sketch_of(result['stratum_times']).mean
+
+def phase_columns(results: List[Dict], show_tls: bool = False,
+                  show_resume: bool = False) -> List[Tuple[str, List[str]]]:
+    """Build the (header, values) columns of the per-phase latency breakdown"""
+    columns = [
+        ("DNS (ms)", [format_time_for_phase(r, 'dns') for r in results]),
+        ("Cold (ms)", [format_time_single(cold_stratum_avg(r)) for r in results]),
+        ("TCP (ms)", [format_time_for_phase(r, 'connect') for r in results]),
+        ("TTFB (ms)", [format_time_for_phase(r, 'first_byte') for r in results]),
+        ("Reply (ms)", [format_time_for_phase(r, 'reply') for r in results]),
+    ]
+    if any(r.get('phase_times', {}).get('server') for r in results):
+        columns.append(("Kernel RTT (ms)", [format_time_for_phase(r, 'kernel_rtt') for r in results]))
+        columns.append(("Server (ms)", [format_time_for_phase(r, 'server') for r in results]))
+    if show_tls:
+        columns.append(("TLS HS (ms)", [format_time_for_phase(r, 'tls', 'tls_phase_times') for r in results]))
+    if show_tls and show_resume:
+        columns.append(("Resumed HS (ms)",
+                        [format_time_for_phase(r, 'tls', 'tls_resumed_phase_times') for r in results]))
+    return columns
+
+def kernel_timestamp_columns(results: List[Dict], show_phases: bool = False) -> List[Tuple[str, List[str]]]:
+    """
+    Kernel-timestamped ping and reply columns beside their userspace
+    counterparts (nothing without --kernel-timestamps samples)
+    """
+    columns = []
+    if any(r.get('ping_kernel_times') for r in results):
+        columns.append(("Kernel Ping (ms)", [format_time_for_kernel_ping(r) for r in results]))
+    if any(r.get('phase_times', {}).get('kernel_reply') for r in results):
+        if not show_phases:
+            columns.append(("Reply (ms)", [format_time_for_phase(r, 'reply') for r in results]))
+        columns.append(("Kernel Reply (ms)", [format_time_for_phase(r, 'kernel_reply') for r in results]))
+    return columns
+
+def print_table(results: List[Dict], runs: int, verify: bool = False, show_tls: bool = False,
+                show_phases: bool = False, show_resume: bool = False):
     """Print results in a formatted ASCII table"""
     if not results:
         return
@@ -727,20 +1966,50 @@ def print_table(results: List[Dict], runs: int, verify: bool = False, show_tls:
     ping_width = max(len(v) for v in ping_values)
     ping_width = max(ping_width, len("Ping (ms)"))
     
+    tcp_rtt_values = [format_time_for_tcp_rtt(r) for r in results]
+    tcp_rtt_width = max(len(v) for v in tcp_rtt_values)
+    tcp_rtt_width = max(tcp_rtt_width, len("TCP RTT (ms)"))
+    
     stratum_values = [format_time_for_result(r, use_ping=False) for r in results]
     stratum_width = max(len(v) for v in stratum_values)
     stratum_width = max(stratum_width, len("Stratum (ms)"))
     
-    # TLS column width
+    # Leave room for the "Avg (Min-Max)" subheader
+    if runs > 1:
+        ping_width = max(ping_width, len("Avg (Min-Max)"))
+        tcp_rtt_width = max(tcp_rtt_width, len("Avg (Min-Max)"))
+        stratum_width = max(stratum_width, len("Avg (Min-Max)"))
+    
+    # TLS column width (full handshakes only when resumption is measured)
+    tls_header = "TLS Full (ms)" if show_resume else "TLS (ms)"
     tls_width = 0
     tls_values = []
     if has_tls:
         tls_values = [format_time_for_tls(r) for r in results]
         if tls_values:  # Only calculate width if we have values
             tls_width = max(len(v) for v in tls_values)
-            tls_width = max(tls_width, len("TLS (ms)"))
+            tls_width = max(tls_width, len(tls_header))
         else:
-            tls_width = len("TLS (ms)")
+            tls_width = len(tls_header)
+        if runs > 1:
+            tls_width = max(tls_width, len("Avg (Min-Max)"))
+    
+    # Extra measurement columns: list of (header, values, width, subheader)
+    extra_columns = []
+    columns = []
+    if runs >= PERCENTILE_MIN_RUNS:
+        for header, values in percentile_columns(results, has_tls):
+            extra_columns.append((header, values, max([len(header)] + [len(v) for v in values]), ""))
+    if has_tls and show_resume:
+        columns.append(("TLS Resumed (ms)", [format_time_for_tls_resumed(r) for r in results]))
+    if show_phases:
+        columns.extend(phase_columns(results, has_tls, show_resume))
+    columns.extend(kernel_timestamp_columns(results, show_phases))
+    for header, values in columns:
+        width = max([len(header)] + [len(v) for v in values])
+        if runs > 1:
+            width = max(width, len("Avg (Min-Max)"))
+        extra_columns.append((header, values, width, "Avg (Min-Max)"))
     
     # Address type column widths (if verification enabled)
     addr_widths = {}
@@ -750,9 +2019,11 @@ def print_table(results: List[Dict], runs: int, verify: bool = False, show_tls:
             addr_widths[addr_type] = max(len(addr_type), 3)  # At least 3 for checkmark/X
     
     # Build separator
-    separator = f"+{'-' * (max_name_len + 2)}+{'-' * (country_width + 2)}+{'-' * (max_host_len + 2)}+{'-' * (port_width + 2)}+{'-' * (ping_width + 2)}+{'-' * (stratum_width + 2)}"
+    separator = f"+{'-' * (max_name_len + 2)}+{'-' * (country_width + 2)}+{'-' * (max_host_len + 2)}+{'-' * (port_width + 2)}+{'-' * (ping_width + 2)}+{'-' * (tcp_rtt_width + 2)}+{'-' * (stratum_width + 2)}"
     if has_tls:
         separator += f"+{'-' * (tls_width + 2)}"
+    for _, _, width, _ in extra_columns:
+        separator += f"+{'-' * (width + 2)}"
     if has_verification:
         for addr_type in addr_types:
             separator += f"+{'-' * (addr_widths[addr_type] + 2)}"
@@ -761,18 +2032,22 @@ def print_table(results: List[Dict], runs: int, verify: bool = False, show_tls:
     print(separator)
     
     # Header
-    header_line = f"| {'Pool Name'.ljust(max_name_len)} | {'CC'.ljust(country_width)} | {'Host'.ljust(max_host_len)} | {'Port'.ljust(port_width)} | {'Ping (ms)'.ljust(ping_width)} | {'Stratum (ms)'.ljust(stratum_width)} |"
+    header_line = f"| {'Pool Name'.ljust(max_name_len)} | {'CC'.ljust(country_width)} | {'Host'.ljust(max_host_len)} | {'Port'.ljust(port_width)} | {'Ping (ms)'.ljust(ping_width)} | {'TCP RTT (ms)'.ljust(tcp_rtt_width)} | {'Stratum (ms)'.ljust(stratum_width)} |"
     if has_tls:
-        header_line += f" {'TLS (ms)'.ljust(tls_width)} |"
+        header_line += f" {tls_header.ljust(tls_width)} |"
+    for header, _, width, _ in extra_columns:
+        header_line += f" {header.ljust(width)} |"
     if has_verification:
         for addr_type in addr_types:
             header_line += f" {addr_type.ljust(addr_widths[addr_type])} |"
     print(header_line)
     
     if runs > 1:
-        subheader = f"| {' '.ljust(max_name_len)} | {' '.ljust(country_width)} | {' '.ljust(max_host_len)} | {' '.ljust(port_width)} | {'Avg (Min-Max)'.ljust(ping_width)} | {'Avg (Min-Max)'.ljust(stratum_width)} |"
+        subheader = f"| {' '.ljust(max_name_len)} | {' '.ljust(country_width)} | {' '.ljust(max_host_len)} | {' '.ljust(port_width)} | {'Avg (Min-Max)'.ljust(ping_width)} | {'Avg (Min-Max)'.ljust(tcp_rtt_width)} | {'Avg (Min-Max)'.ljust(stratum_width)} |"
         if has_tls:
             subheader += f" {'Avg (Min-Max)'.ljust(tls_width)} |"
+        for _, _, width, column_subheader in extra_columns:
+            subheader += f" {column_subheader.ljust(width)} |"
         if has_verification:
             for addr_type in addr_types:
                 subheader += f" {' '.ljust(addr_widths[addr_type])} |"
@@ -784,15 +2059,20 @@ def print_table(results: List[Dict], runs: int, verify: bool = False, show_tls:
     for i, result in enumerate(results):
         country_code = result.get('country_code', '??').ljust(country_width)
         ping_str = ping_values[i].ljust(ping_width)
+        tcp_rtt_str = tcp_rtt_values[i].ljust(tcp_rtt_width)
         stratum_str = stratum_values[i].ljust(stratum_width)
         
-        row = f"| {result['display_name'].ljust(max_name_len)} | {country_code} | {result['hostname'].ljust(max_host_len)} | {str(result['port']).ljust(port_width)} | {ping_str} | {stratum_str} |"
+        row = f"| {result['display_name'].ljust(max_name_len)} | {country_code} | {result['hostname'].ljust(max_host_len)} | {str(result['port']).ljust(port_width)} | {ping_str} | {tcp_rtt_str} | {stratum_str} |"
         
         # Add TLS column
         if has_tls:
             tls_str = tls_values[i].ljust(tls_width)
             row += f" {tls_str} |"
         
+        # Add extra measurement columns
+        for _, values, width, _ in extra_columns:
+            row += f" {values[i].ljust(width)} |"
+        
         # Add verification columns
         if has_verification:
             addr_types_result = result.get('address_types', {})
@@ -817,6 +2097,23 @@ def print_table(results: List[Dict], runs: int, verify: bool = False, show_tls:
         print("  P2WPKH = SegWit (bc1q...), P2WSH = SegWit Script (bc1q... long)")
         print("  P2TR = Taproot (bc1p...)")
 
+def print_tls_resumption(results: List[Dict]):
+    """Print how much a resumed TLS handshake saves per pool on reconnect"""
+    rows = [r for r in results if r.get('tls_times') and r.get('tls_resumed_times')]
+    declined = [r for r in results if r.get('tls_resume_rejected') and not r.get('tls_resumed_times')]
+    if not rows and not declined:
+        return
+    
+    print("\nTLS Session Resumption (reconnect cost):")
+    print("-" * 80)
+    for r in sorted(rows, key=lambda x: sketch_of(x['tls_resumed_times']).mean):
+        full = sketch_of(r['tls_times']).mean
+        resumed = sketch_of(r['tls_resumed_times']).mean
+        print(f"  • {r['display_name']}: full {full:.1f} ms, resumed {resumed:.1f} ms "
+              f"(saves {full - resumed:.1f} ms)")
+    for r in declined:
+        print(f"  • {r['display_name']}: server did not resume the session (every reconnect is a full handshake)")
+
 def print_tls_errors(results: List[Dict]):
     """Print TLS error details for failed connections"""
     # Collect all TLS failures with errors
@@ -853,10 +2150,169 @@ def print_tls_errors(results: List[Dict]):
         print("  💡 Tip: If testing IP addresses, use --no-verify-cert to skip certificate validation")
         print("     Example: python3 stratum_test.py -t --no-verify-cert")
 
-def print_summary(results: List[Dict]):
+def print_fastest_endpoints(results: List[Dict]):
+    """Print the fastest address of every pool that has more than one (--all-addresses)"""
+    pools = {}
+    for r in results:
+        if 'pool_hostname' in r:
+            pools.setdefault((r['pool_hostname'], r['port']), []).append(r)
+    pools = {pool: rows for pool, rows in pools.items() if len(rows) > 1}
+    if not pools:
+        return
+    
+    print("\nFastest Endpoint per Pool:")
+    print("-" * 80)
+    for (pool, port), rows in pools.items():
+        print(f"  • {rows[0]['display_name']} ({pool}:{port}, {len(rows)} addresses)")
+        for label, key in (("Stratum", 'stratum_times'), ("TLS", 'tls_times')):
+            probed = [r for r in rows if key == 'stratum_times' or r.get('tls_port', 0) > 0]
+            timed = sorted((sketch_of(r[key]).mean, r['hostname']) for r in probed if r.get(key))
+            if not timed:
+                continue
+            fastest_ms, fastest = timed[0]
+            line = f"    {label}: {fastest} ({fastest_ms:.1f} ms)"
+            if len(timed) > 1:
+                slowest_ms, slowest = timed[-1]
+                line += f", {slowest_ms - fastest_ms:.1f} ms faster than {slowest}"
+            unreachable = len(probed) - len(timed)
+            if unreachable:
+                line += f", {unreachable} unreachable"
+            print(line)
+
+def print_family_comparison(results: List[Dict], show_tls: bool = False):
+    """Print each pool's IPv4 and IPv6 latency side by side (--dual-stack)"""
+    pools = {}
+    for r in results:
+        if 'pool_hostname' in r:
+            family = dual_stack.family_label(dual_stack.address_family(r['hostname']))
+            pools.setdefault((r['pool_hostname'], r['port']), {'name': r['display_name']}).setdefault(family, []).append(r)
+    if not pools:
+        return
+    
+    metrics = [("TCP RTT", 'tcp_rtt_times'), ("Stratum", 'stratum_times')]
+    if show_tls:
+        metrics.append(("TLS", 'tls_times'))
+    
+    def best(rows, key):
+        times = [sketch_of(r[key]).mean for r in rows if r.get(key)]
+        return min(times) if times else None
+    
+    print("\nIPv4 vs IPv6:")
+    print("-" * 80)
+    faster = {'IPv4': 0, 'IPv6': 0}
+    for (pool, port), families in pools.items():
+        print(f"  • {families['name']} ({pool}:{port})")
+        for label, key in metrics:
+            cells = []
+            values = {}
+            for family in ('IPv4', 'IPv6'):
+                if family not in families:
+                    cells.append(f"{family} no address")
+                    continue
+                values[family] = best(families[family], key)
+                cells.append(f"{family} {values[family]:.1f} ms" if values[family] is not None else f"{family} N/A")
+            line = f"    {label + ':':<9} {', '.join(cells)}"
+            if len(values) == 2 and None not in values.values():
+                winner = min(values, key=values.get)
+                line += f" -> {winner} faster by {abs(values['IPv4'] - values['IPv6']):.1f} ms"
+                if key == 'stratum_times':
+                    faster[winner] += 1
+            print(line)
+    compared = faster['IPv4'] + faster['IPv6']
+    if compared:
+        print(f"\n  Stratum: IPv6 faster for {faster['IPv6']} of {compared} dual-stack pool(s)")
+
+def print_happy_eyeballs(summaries: List[Dict]):
+    """Print which address family wins the Happy Eyeballs race to each pool (--happy-eyeballs)"""
+    if not summaries:
+        return
+    print(f"\nHappy Eyeballs (RFC 8305: IPv6 first, {dual_stack.CONNECTION_ATTEMPT_DELAY * 1000:.0f} ms attempt delay):")
+    print("-" * 80)
+    for summary in summaries:
+        # No race at all: the --deadline passed before this pool's first race
+        text = dual_stack.describe_summary(summary) if summary['races'] else "not raced (deadline reached)"
+        print(f"  • {summary['display_name']} ({summary['host']}:{summary['port']}): {text}")
+
+def print_resolver_report(dns_cache: Optional[DnsCache]):
+    """Print per-resolver query latency and the hostnames resolvers disagree on (--resolver)"""
+    if dns_cache is None or not dns_cache.resolvers:
+        return
+    queries = list(dns_cache.queries)
+    print()
+    print("DNS resolvers (A and AAAA queries; probes use the fastest resolver's answer):")
+    for stats in dns_client.resolver_summary(queries):
+        latency = "no answers"
+        if stats['median_ms'] is not None:
+            latency = f"median {stats['median_ms']:.1f} ms, max {stats['max_ms']:.1f} ms"
+        print(f"  {stats['resolver']:<24} {stats['answered']}/{stats['queries']} answered, {latency}")
+    
+    differences = dns_client.answer_differences(queries)
+    if differences:
+        print("  Resolvers return different addresses for:")
+        for hostname, by_resolver in differences.items():
+            answers = "; ".join(f"{resolver} -> {', '.join(addresses)}" for resolver, addresses in by_resolver.items())
+            print(f"    {hostname}: {answers}")
+
+def _phase_avg(result: Dict, phase: str, key: str = 'phase_times') -> Optional[float]:
+    """Average time of one phase, or None if it was never measured"""
+    times = result.get(key, {}).get(phase, [])
+    return sketch_of(times).mean if times else None
+
+def print_phase_summary(results: List[Dict], recommended: Dict, show_tls: bool = False):
+    """Print the fastest pool per latency phase and the breakdown of the recommended pool"""
+    print()
+    print("Fastest by phase:")
+    for label, phase, key in [("DNS lookup", 'dns', 'phase_times'),
+                              ("TCP connect", 'connect', 'phase_times'),
+                              ("TLS handshake", 'tls', 'tls_phase_times'),
+                              ("Server reply", 'reply', 'phase_times'),
+                              ("Server time", 'server', 'phase_times')]:
+        if key == 'tls_phase_times' and not show_tls:
+            continue
+        measured = [r for r in results if _phase_avg(r, phase, key) is not None]
+        if not measured:
+            continue
+        fastest = min(measured, key=lambda r: _phase_avg(r, phase, key))
+        print(f"  {label + ':':<15} {fastest['display_name']} ({_phase_avg(fastest, phase, key):.1f} ms)")
+    
+    parts = []
+    for label, phase in [("DNS", 'dns'), ("TCP", 'connect'), ("TTFB", 'first_byte'), ("reply", 'reply'),
+                         ("kernel RTT", 'kernel_rtt'), ("server", 'server')]:
+        value = _phase_avg(recommended, phase)
+        if value is not None:
+            parts.append(f"{label} {value:.1f}")
+    if parts:
+        print()
+        print(f"{recommended['display_name']} breakdown (ms): {', '.join(parts)}")
+        if _phase_avg(recommended, 'server') is not None:
+            print("  (reply = subscribe sent to full reply received; server = reply - kernel TCP RTT)")
+        else:
+            print("  (reply = subscribe sent to full reply received, i.e. network RTT + server time)")
+    retrans = sketch_of(recommended.get('phase_times', {}).get('total_retrans', []))
+    retransmits = round(retrans.mean * retrans.count) if retrans.count else 0
+    if retransmits:
+        print(f"  TCP retransmits: {retransmits} segment(s) over {retrans.count} connection(s)")
+    cold = cold_stratum_avg(recommended)
+    if cold is not None:
+        warm = sketch_of(recommended['stratum_times']).mean
+        print(f"  Warm DNS (cached address): {warm:.1f} ms, cold DNS (resolve first): {cold:.1f} ms")
+
+def network_baseline(result: Dict) -> Optional[Tuple[float, str]]:
+    """
+    Network-only round trip for a pool as (ms, source): ICMP ping when it
+    answers, otherwise the TCP handshake RTT. None if neither was measured.
+    """
+    if result.get('ping_times'):
+        return sketch_of(result['ping_times']).mean, "ping"
+    if result.get('tcp_rtt_times'):
+        return sketch_of(result['tcp_rtt_times']).mean, "TCP RTT"
+    return None
+
+def print_summary(results: List[Dict], show_phases: bool = False, show_tls: bool = False):
     """Print summary of fastest servers"""
     # Filter out failed results
     valid_ping = [r for r in results if r['ping_times']]
+    valid_tcp_rtt = [r for r in results if r.get('tcp_rtt_times')]
     valid_stratum = [r for r in results if r['stratum_times']]
     
     if not valid_ping and not valid_stratum:
@@ -866,26 +2322,39 @@ def print_summary(results: List[Dict]):
     print("-" * 60)
     
     if valid_ping:
-        fastest_ping = min(valid_ping, key=lambda x: mean(x['ping_times']))
-        ping_time = mean(fastest_ping['ping_times'])
-        print(f"Fastest Ping:    {fastest_ping['display_name']} ({int(round(ping_time))} ms)")
+        fastest_ping = min(valid_ping, key=lambda x: sketch_of(x['ping_times']).mean)
+        ping_time = sketch_of(fastest_ping['ping_times']).mean
+        jitter = fastest_ping.get('ping_jitter')
+        jitter_msg = f", jitter {jitter:.1f} ms" if jitter is not None else ""
+        print(f"Fastest Ping:    {fastest_ping['display_name']} ({int(round(ping_time))} ms{jitter_msg})")
+    
+    if valid_tcp_rtt:
+        fastest_tcp = min(valid_tcp_rtt, key=lambda x: sketch_of(x['tcp_rtt_times']).mean)
+        print(f"Fastest TCP RTT: {fastest_tcp['display_name']} ({int(round(sketch_of(fastest_tcp['tcp_rtt_times']).mean))} ms)")
     
     if valid_stratum:
         # Find fastest and all within 3ms
-        fastest_stratum = min(valid_stratum, key=lambda x: mean(x['stratum_times']))
-        fastest_time = mean(fastest_stratum['stratum_times'])
+        fastest_stratum = min(valid_stratum, key=lambda x: sketch_of(x['stratum_times']).mean)
+        fastest_time = sketch_of(fastest_stratum['stratum_times']).mean
         threshold = fastest_time + 3  # 3ms threshold
         
         # Get all servers within 3ms of fastest
         competitive_servers = [
             r for r in valid_stratum 
-            if mean(r['stratum_times']) <= threshold
+            if sketch_of(r['stratum_times']).mean <= threshold
         ]
         
         # Sort by stratum time
-        competitive_servers.sort(key=lambda x: mean(x['stratum_times']))
+        competitive_servers.sort(key=lambda x: sketch_of(x['stratum_times']).mean)
         
         print(f"Fastest Stratum: {fastest_stratum['display_name']} ({int(round(fastest_time))} ms)")
+        
+        # Split the fastest stratum time into network path and stratum overhead
+        baseline = network_baseline(fastest_stratum)
+        if baseline is not None:
+            baseline_ms, source = baseline
+            print(f"                 network {baseline_ms:.1f} ms ({source}) + stratum overhead "
+                  f"{max(0.0, fastest_time - baseline_ms):.1f} ms")
         print()
         
         if len(competitive_servers) == 1:
@@ -894,11 +2363,43 @@ def print_summary(results: List[Dict]):
         else:
             print(f"RECOMMENDED POOLS (within 3ms of fastest):")
             for i, server in enumerate(competitive_servers, 1):
-                server_time = mean(server['stratum_times'])
+                server_time = sketch_of(server['stratum_times']).mean
                 # Show actual time with decimal for transparency
                 print(f"  {i}. {server['display_name']} - {server['hostname']}:{server['port']} ({server_time:.1f} ms)")
             print()
             print(f"All {len(competitive_servers)} pools above offer similar performance from your location.")
+        
+        if show_phases:
+            print_phase_summary(results, fastest_stratum, show_tls)
+    
+    print_scheduling_delay(results)
+
+def print_scheduling_delay(results: List[Dict]):
+    """
+    With --kernel-timestamps: how much later than the kernel received them
+    replies were seen in Python, i.e. the delay the timestamps took out
+    """
+    delays = []
+    for r in results:
+        phase_times = r.get('phase_times', {})
+        if len(phase_times.get('kernel_reply', [])) == len(phase_times.get('reply', [])):
+            delays.extend(u - k for u, k in zip(phase_times.get('reply', []), phase_times.get('kernel_reply', [])))
+        if len(r.get('ping_kernel_times', [])) == len(r.get('ping_times', [])):
+            delays.extend(u - k for u, k in zip(r.get('ping_times', []), r.get('ping_kernel_times', [])))
+    if not delays:
+        return
+    print()
+    print(f"Kernel timestamps: replies reached Python {mean(delays):.2f} ms (avg), {max(delays):.2f} ms (max) "
+          f"after the kernel received them")
+
+def print_deadline_note(results: List[Dict]):
+    """With --deadline: which servers it cut short (marked TIMEOUT when nothing completed)"""
+    timed_out = [r['display_name'] for r in results if r.get('timed_out')]
+    if not timed_out:
+        return
+    print()
+    print(f"Deadline reached: {len(timed_out)} of {len(results)} server(s) cut short ({', '.join(timed_out)}). "
+          f"Results are from the probes that completed in time.")
 
 def print_intro():
     """Print introductory text"""
@@ -946,77 +2447,121 @@ def print_network_info(ipv4: Optional[str], asn_info: Optional[Dict]):
         elif asn_info.get('asn'):
             print(f"Network: {asn_info['asn']}")
 
-def test_all_servers(runs: int = 1, verify: bool = False, test_tls: bool = False, verify_cert: bool = True):
+def record_history(path: Optional[str], results: List[Dict], vantage: Optional[Dict],
+                   exporter: Optional[Exporter] = None):
+    """
+    Append results to the history database at path and feed them to
+    exporter (each is skipped when None).
+    """
+    if exporter is not None:
+        for result in results:
+            exporter.observe_stratum_result(result)
+    if not path:
+        return
+    with HistoryStore(path) as store:
+        run = store.start_run('stratum_test', vantage)
+        for result in results:
+            run.record_stratum_result(result)
+
+def describe_runs(runs: int, duration: Optional[float] = None) -> str:
+    """Progress text for a fixed number of runs or a --duration"""
+    if duration:
+        return f"for {duration:g}s each"
+    return f"runs: {runs}"
+
+def completed_runs(results: List[Dict], runs: int) -> int:
+    """Most runs completed by any server (differs from runs with --duration)"""
+    return max([r.get('runs', runs) for r in results] or [runs])
+
+def test_all_servers(runs: int = 1, verify: bool = False, test_tls: bool = False, verify_cert: bool = True,
+                     use_async: bool = False, concurrency: int = DEFAULT_ASYNC_CONCURRENCY,
+                     show_phases: bool = False, tls_resume: bool = False, duration: Optional[float] = None,
+                     history: Optional[str] = None, exporter: Optional[Exporter] = None,
+                     dns_cache: Optional[DnsCache] = None, all_addresses: bool = False,
+                     dual_stack_mode: bool = False, happy_eyeballs: bool = False,
+                     calibration: Optional[Dict] = None):
     """Test all predefined servers with concurrent execution"""
     # Print intro
     print_intro()
     
-    # Check if ping is available and warn if not
-    if not check_ping_available():
+    # Check if ping is available (native ICMP or the ping command) and warn if not
+    if not icmp_ping.is_available() and not check_ping_available():
         show_ping_warning()
     
-    # Get network info
-    ipv4 = get_public_ip()
-    asn_info = get_asn_info(ipv4) if ipv4 else None
+    # Look up network info while the servers are probed
+    vantage = start_vantage_lookup()
     
-    # Print network info
-    print_network_info(ipv4, asn_info)
+    servers, server_names, dns_cache = probe_targets(PREDEFINED_SERVERS, dns_cache, all_addresses, dual_stack_mode)
     
     # Test servers
     verify_msg = " with address type verification" if verify else ""
     tls_msg = " with TLS testing" if test_tls else ""
-    print(f"\nTesting {len(PREDEFINED_SERVERS)} servers (runs: {runs}){verify_msg}{tls_msg}...")
+    address_msg = f" ({len(servers)} address{'es' if len(servers) != 1 else ''})" if server_names is not None else ""
+    print(f"\nTesting {len(PREDEFINED_SERVERS)} servers{address_msg} ({describe_runs(runs, duration)}){verify_msg}{tls_msg}...")
     if verify:
-        print("  Note: Verification adds ~10 seconds per server")
-        print("  Using reduced concurrency (4 servers at a time) for reliability")
-    
-    results = []
-    # Reduce concurrency when doing verification to avoid overwhelming pools
-    max_workers = 4 if verify else len(PREDEFINED_SERVERS)
-    
-    with ThreadPoolExecutor(max_workers=max_workers) as executor:
-        futures = {
-            executor.submit(test_server_multiple_runs, host, port, name, runs, cc, verify, tls_port, test_tls, verify_cert): (host, port, tls_port, name, cc)
-            for host, port, tls_port, name, cc in PREDEFINED_SERVERS
-        }
-        
-        completed = 0
-        for future in as_completed(futures):
-            result = future.result()
-            results.append(result)
-            completed += 1
-            print(f"  Progress: {completed}/{len(PREDEFINED_SERVERS)}", end='\r')
+        print("  Note: Verification pipelines all 5 address types on one connection per server")
+    if use_async:
+        print(f"  Using asyncio engine (max {concurrency} probes in flight)")
+    elif concurrency < len(servers):
+        print(f"  Max {concurrency} probes in flight")
+    
+    completed = 0
+    
+    def show_progress(result):
+        nonlocal completed
+        completed += 1
+        print(f"  Progress: {completed}/{len(servers)}", end='\r')
+    
+    results = run_probes(servers, runs, verify, test_tls, verify_cert,
+                         use_async, concurrency, on_result=show_progress, tls_resume=tls_resume,
+                         duration=duration, dns_cache=dns_cache, server_names=server_names)
+    races = run_happy_eyeballs(PREDEFINED_SERVERS, runs, dns_cache) if happy_eyeballs else []
+    runs = completed_runs(results, runs)
+    if calibration and calibration['subtracted']:
+        for result in results:
+            subtract_overhead(result, calibration)
+    ipv4, asn_info = vantage_result(vantage)
+    record_history(history, results, vantage_info(ipv4, asn_info), exporter)
     
     print()  # New line after progress
     
-    # Sort by stratum time
-    results.sort(key=lambda x: (
-        not x['stratum_times'],  # No results last
-        mean(x['stratum_times']) if x['stratum_times'] else float('inf'),
-        x['display_name'] != 'AtlasPool.io'  # AtlasPool first in ties
-    ))
+    # Print network info
+    print_network_info(ipv4, asn_info)
+    
+    # Sort by stratum time (grouped by pool with --all-addresses)
+    sort_results(results, by_pool=server_names is not None)
     
     print("\nResults:")
-    print_table(results, runs, verify, test_tls)
-    print_summary(results)
+    print_table(results, runs, verify, test_tls, show_phases, tls_resume)
+    print_summary(results, show_phases, test_tls)
+    print_deadline_note(results)
+    print_fastest_endpoints(results)
+    if dual_stack_mode:
+        print_family_comparison(results, test_tls)
+    print_happy_eyeballs(races)
+    print_tls_resumption(results)
     print_tls_errors(results)
+    print_resolver_report(dns_cache)
+    print_calibration(calibration)
     
     print()
 
-def test_single_server(hostname: str, port: int, runs: int = 1, test_tls: bool = False, tls_port: int = 0, verify_cert: bool = True):
-    """Test a single server"""
+def test_single_server(hostname: str, port: int, runs: int = 1, test_tls: bool = False, tls_port: int = 0, verify_cert: bool = True,
+                       show_phases: bool = False, tls_resume: bool = False, duration: Optional[float] = None,
+                       history: Optional[str] = None, exporter: Optional[Exporter] = None,
+                       dns_cache: Optional[DnsCache] = None, all_addresses: bool = False,
+                       dual_stack_mode: bool = False, happy_eyeballs: bool = False,
+                       calibration: Optional[Dict] = None):
+    """Test a single server (each of its addresses with all_addresses / dual_stack_mode)"""
     # Print intro
     print_intro()
     
-    # Check if ping is available and warn if not
-    if not check_ping_available():
+    # Check if ping is available (native ICMP or the ping command) and warn if not
+    if not icmp_ping.is_available() and not check_ping_available():
         show_ping_warning()
     
-    # Get network info
-    ipv4 = get_public_ip()
-    asn_info = get_asn_info(ipv4) if ipv4 else None
-    
-    print_network_info(ipv4, asn_info)
+    # Look up network info while the server is probed
+    vantage = start_vantage_lookup()
     
     # Look up server info from predefined list
     server_info = lookup_predefined_server(hostname)
@@ -1029,63 +2574,437 @@ def test_single_server(hostname: str, port: int, runs: int = 1, test_tls: bool =
         display_name = hostname
         country_code = "??"
     
+    server = (hostname, port, tls_port, display_name, country_code)
+    servers, server_names, dns_cache = probe_targets([server], dns_cache, all_addresses, dual_stack_mode)
+    
     # Test server
     tls_msg = f" with TLS on port {tls_port}" if test_tls and tls_port > 0 else ""
     cert_msg = " (no cert verification)" if test_tls and not verify_cert else ""
-    print(f"\nTesting {hostname}:{port} (runs: {runs}){tls_msg}{cert_msg}...")
-    result = test_server_multiple_runs(hostname, port, display_name, runs, country_code, False, tls_port, test_tls, verify_cert)
+    address_msg = f" ({len(servers)} address{'es' if len(servers) != 1 else ''})" if server_names is not None else ""
+    print(f"\nTesting {hostname}:{port}{address_msg} ({describe_runs(runs, duration)}){tls_msg}{cert_msg}...")
+    results = run_probes(servers, runs, False, test_tls, verify_cert,
+                         tls_resume=tls_resume, duration=duration, dns_cache=dns_cache, server_names=server_names)
+    races = run_happy_eyeballs([server], runs, dns_cache) if happy_eyeballs else []
+    runs = completed_runs(results, runs)
+    if calibration and calibration['subtracted']:
+        for result in results:
+            subtract_overhead(result, calibration)
+    ipv4, asn_info = vantage_result(vantage)
+    record_history(history, results, vantage_info(ipv4, asn_info), exporter)
+    print_network_info(ipv4, asn_info)
+    sort_results(results)
     print("\nResults:")
-    print_table([result], runs, False, test_tls)
-    print_tls_errors([result])
+    print_table(results, runs, False, test_tls, show_phases, tls_resume)
+    print_deadline_note(results)
+    print_fastest_endpoints(results)
+    if dual_stack_mode:
+        print_family_comparison(results, test_tls)
+    print_happy_eyeballs(races)
+    print_tls_resumption(results)
+    print_tls_errors(results)
+    print_resolver_report(dns_cache)
+    print_calibration(calibration)
     
     print()
 
-def output_json(runs: int = 1, test_tls: bool = False, verify_cert: bool = True):
+def _calibration_stats(measured: List[float], calls: List[float], errors: int) -> Dict:
+    """Floor (minimum), median and p90 of one probe type's loopback samples"""
+    sketch = sketch_of(measured)
+    return {
+        'samples': len(measured),
+        'errors': errors,
+        'floor_ms': min(measured) if measured else None,
+        'median_ms': median(measured) if measured else None,
+        'p90_ms': sketch.quantile(0.9) if measured else None,
+        'call_median_ms': median(calls) if calls else None
+    }
+
+def calibrate(runs: int = DEFAULT_CALIBRATION_RUNS) -> Dict:
+    """
+    Measure this machine's own overhead per probe type by running the
+    probe functions runs times each against an in-process loopback stratum
+    server (loopback_stratum.py), which answers instantly over no network.
+    
+    'stratum' and 'tls' time test_stratum_connection() and
+    test_stratum_tls_connection() by the time they report (the figure
+    pool results are made of); 'verify' times verify_address_type() end to
+    end, since it reports no time of its own. 'call_median_ms' is the
+    wall time of the whole call, which for TLS includes creating the SSL
+    context. The floor is the minimum: what every probe costs locally at
+    the least, and so the most that can safely be subtracted.
+    Probing stops early at the --deadline. Without openssl (for the TLS
+    server's certificate) 'tls' is None and 'tls_skipped' says why.
+    """
+    def measure(probe, server):
+        measured, calls, errors = [], [], 0
+        host, port = server.address
+        for _ in range(runs):
+            if deadline_passed():
+                break
+            t_call = now_ns()
+            value = probe(host, port)
+            call_ms = (now_ns() - t_call) / 1e6
+            if value is None:
+                errors += 1
+                continue
+            measured.append(call_ms if value is True else value)
+            calls.append(call_ms)
+        return _calibration_stats(measured, calls, errors)
+    
+    calibration = {'runs': runs, 'subtracted': False}
+    with LoopbackStratumServer() as plain:
+        calibration['stratum'] = measure(lambda host, port: test_stratum_connection(host, port), plain)
+        calibration['verify'] = measure(
+            lambda host, port: verify_address_type(host, port, TEST_ADDRESSES['P2WPKH']) or None, plain)
+    
+    # The TLS server needs openssl to create its throwaway certificate
+    try:
+        tls_server = LoopbackStratumServer(tls=True)
+    except OSError as e:
+        calibration['tls'] = None
+        calibration['tls_skipped'] = str(e)
+        return calibration
+    with tls_server as tls:
+        calibration['tls'] = measure(
+            lambda host, port: test_stratum_tls_connection(host, port, verify_cert=False)[0], tls)
+    return calibration
+
+def subtract_overhead(result: Dict, calibration: Dict):
+    """
+    Subtract the calibrated local overhead floor from a result's stratum and
+    full TLS handshake times (never below 0), so they show network and
+    pool time only. Phase columns are left as measured. The kept samples
+    are shifted one by one and the sketch of all of them bucket by bucket
+    (QuantileSketch.shifted), so runs past the sample limit keep every
+    sample in their statistics.
+    """
+    for key, probe in (('stratum_times', 'stratum'), ('tls_times', 'tls')):
+        if calibration[probe] is None:
+            continue
+        floor = calibration[probe]['floor_ms']
+        if floor and result.get(key):
+            times = SampleList(max(t - floor, 0.0) for t in result[key])
+            times.sketch = sketch_of(result[key]).shifted(floor)
+            result[key] = times
+
+def print_calibration(calibration: Optional[Dict]):
+    """Print the local overhead floor per probe type (--calibrate)"""
+    if not calibration:
+        return
+    print()
+    print(f"Local overhead (loopback calibration, {calibration['runs']} probes each):")
+    for label, probe in [("Stratum", 'stratum'), ("TLS stratum", 'tls'), ("Address verify", 'verify')]:
+        stats = calibration[probe]
+        if stats is None:
+            print(f"  {label + ':':<16} skipped ({calibration.get('tls_skipped')})")
+            continue
+        if stats['floor_ms'] is None and not stats['errors']:
+            print(f"  {label + ':':<16} not measured (deadline reached)")
+            continue
+        if stats['floor_ms'] is None:
+            print(f"  {label + ':':<16} failed ({stats['errors']} errors)")
+            continue
+        line = f"  {label + ':':<16} floor {stats['floor_ms']:.2f} ms, median {stats['median_ms']:.2f} ms, " \
+               f"p90 {stats['p90_ms']:.2f} ms"
+        if probe == 'tls':
+            line += f" (whole call incl. SSL context {stats['call_median_ms']:.2f} ms)"
+        print(line)
+    if calibration['subtracted']:
+        print("  Stratum and TLS times above have the floor subtracted (--subtract-overhead)")
+
+def result_to_json(result: Dict, test_tls: bool = False, tls_resume: bool = False) -> Dict:
+    """JSON representation of one result dict (shared by --json and --ndjson)"""
+    result_data = {
+        'host': result['hostname'],
+        'pool_host': result.get('pool_hostname', result['hostname']),
+        'address': result.get('address'),
+        'family': dual_stack.family_label(dual_stack.address_family(result['address'])) if result.get('address') else None,
+        'port': result['port'],
+        'tls_port': result.get('tls_port', 0),
+        'display_name': result['display_name'],
+        'country_code': result.get('country_code', '??'),
+        'runs': result.get('runs'),
+        'timed_out': result.get('timed_out', False),
+        'ping_ms': result['ping_times'],
+        'stratum_ms': result['stratum_times'],
+        'ping_avg': sketch_of(result['ping_times']).mean if result['ping_times'] else None,
+        'ping_kernel_ms': result.get('ping_kernel_times', []),
+        'ping_kernel_avg': sketch_of(result['ping_kernel_times']).mean if result.get('ping_kernel_times') else None,
+        'stratum_avg': sketch_of(result['stratum_times']).mean if result['stratum_times'] else None,
+        'tcp_rtt_ms': result.get('tcp_rtt_times', []),
+        'tcp_rtt_avg': sketch_of(result['tcp_rtt_times']).mean if result.get('tcp_rtt_times') else None,
+        'ping_loss': result.get('ping_loss'),
+        'ping_jitter_ms': result.get('ping_jitter'),
+        'phases_ms': {phase: times for phase, times in result.get('phase_times', {}).items() if phase != 'tls'},
+        'phases_avg': {phase: _phase_avg(result, phase) for phase in PROBE_METRICS if phase != 'tls'},
+        'stratum_cold_avg': cold_stratum_avg(result),
+        'samples': result.get('samples', []),
+        'stats': {
+            'ping': sketch_of(result['ping_times']).summary(),
+            'tcp_rtt': sketch_of(result.get('tcp_rtt_times', [])).summary(),
+            'stratum': sketch_of(result['stratum_times']).summary()
+        }
+    }
+    if test_tls:
+        result_data['stats']['tls'] = sketch_of(result.get('tls_times', [])).summary()
+        result_data['tls_ms'] = result.get('tls_times', [])
+        result_data['tls_avg'] = sketch_of(result['tls_times']).mean if result.get('tls_times') else None
+        result_data['tls_phases_ms'] = result.get('tls_phase_times', {})
+        result_data['tls_phases_avg'] = {phase: _phase_avg(result, phase, 'tls_phase_times') for phase in PROBE_METRICS}
+    if test_tls and tls_resume:
+        result_data['tls_resumed_ms'] = result.get('tls_resumed_times', [])
+        result_data['tls_resumed_avg'] = sketch_of(result['tls_resumed_times']).mean if result.get('tls_resumed_times') else None
+        result_data['tls_resume_rejected'] = result.get('tls_resume_rejected', 0)
+    return result_data
+
+def client_info() -> Dict:
+    """Public IP and ASN details of the machine running the test (cached, see lookup_vantage)"""
+    return vantage_info(*lookup_vantage())
+
+def vantage_info(ipv4: Optional[str], asn_info: Optional[Dict]) -> Dict:
+    """Client dict of JSON output (and history runs) from a public IP and its ASN details"""
+    return {
+        'ipv4': ipv4,
+        'location': asn_info.get('location') if asn_info else None,
+        'asn': asn_info.get('asn') if asn_info else None,
+        'provider': asn_info.get('provider') if asn_info else None
+    }
+
+def output_json(runs: int = 1, test_tls: bool = False, verify_cert: bool = True,
+                use_async: bool = False, concurrency: int = DEFAULT_ASYNC_CONCURRENCY,
+                tls_resume: bool = False, duration: Optional[float] = None, history: Optional[str] = None,
+                exporter: Optional[Exporter] = None, dns_cache: Optional[DnsCache] = None,
+                all_addresses: bool = False, dual_stack_mode: bool = False, happy_eyeballs: bool = False,
+                calibration: Optional[Dict] = None):
     """Output results in JSON format"""
-    # Get network info
-    ipv4 = get_public_ip()
-    asn_info = get_asn_info(ipv4) if ipv4 else None
-    
+    vantage = start_vantage_lookup()
+    servers, server_names, dns_cache = probe_targets(PREDEFINED_SERVERS, dns_cache, all_addresses, dual_stack_mode)
     output = {
         'timestamp': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
-        'client': {
-            'ipv4': ipv4,
-            'location': asn_info.get('location') if asn_info else None,
-            'asn': asn_info.get('asn') if asn_info else None,
-            'provider': asn_info.get('provider') if asn_info else None
-        },
+        'client': None,
         'runs': runs,
+        'duration': duration,
         'tls_tested': test_tls,
+        'tls_resume': tls_resume,
+        'all_addresses': all_addresses,
+        'dual_stack': dual_stack_mode,
         'results': []
     }
     
     # Test servers
-    with ThreadPoolExecutor(max_workers=len(PREDEFINED_SERVERS)) as executor:
-        futures = [
-            executor.submit(test_server_multiple_runs, host, port, name, runs, cc, False, tls_port, test_tls, verify_cert)
-            for host, port, tls_port, name, cc in PREDEFINED_SERVERS
-        ]
-        for future in as_completed(futures):
-            result = future.result()
-            result_data = {
-                'host': result['hostname'],
-                'port': result['port'],
-                'tls_port': result.get('tls_port', 0),
-                'display_name': result['display_name'],
-                'country_code': result.get('country_code', '??'),
-                'ping_ms': result['ping_times'],
-                'stratum_ms': result['stratum_times'],
-                'ping_avg': mean(result['ping_times']) if result['ping_times'] else None,
-                'stratum_avg': mean(result['stratum_times']) if result['stratum_times'] else None
-            }
-            if test_tls:
-                result_data['tls_ms'] = result.get('tls_times', [])
-                result_data['tls_avg'] = mean(result['tls_times']) if result.get('tls_times') else None
-            output['results'].append(result_data)
+    results = run_probes(servers, runs, False, test_tls, verify_cert,
+                         use_async, concurrency, tls_resume=tls_resume, duration=duration, dns_cache=dns_cache,
+                         server_names=server_names)
+    if happy_eyeballs:
+        output['happy_eyeballs'] = run_happy_eyeballs(PREDEFINED_SERVERS, runs, dns_cache)
+    if calibration:
+        output['calibration'] = calibration
+        if calibration['subtracted']:
+            for result in results:
+                subtract_overhead(result, calibration)
+    output['client'] = vantage_info(*vantage_result(vantage))
+    if dns_cache is not None and dns_cache.resolvers:
+        output['dns_queries'] = list(dns_cache.queries)
+    for result in results:
+        output['results'].append(result_to_json(result, test_tls, tls_resume))
+    record_history(history, results, output['client'], exporter)
     
     print(json.dumps(output, indent=2))
 
+def output_ndjson(runs: int = 1, test_tls: bool = False, verify_cert: bool = True,
+                  use_async: bool = False, concurrency: int = DEFAULT_ASYNC_CONCURRENCY,
+                  tls_resume: bool = False, duration: Optional[float] = None, history: Optional[str] = None,
+                  exporter: Optional[Exporter] = None, dns_cache: Optional[DnsCache] = None,
+                  all_addresses: bool = False, dual_stack_mode: bool = False, happy_eyeballs: bool = False,
+                  calibration: Optional[Dict] = None):
+    """
+    Output JSON Lines: one {"type": "result"} record per server, written as
+    soon as that server completes, then a final {"type": "summary"} record.
+    """
+    started = time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime())
+    start_time = time.monotonic()
+    vantage = start_vantage_lookup()
+    servers, server_names, dns_cache = probe_targets(PREDEFINED_SERVERS, dns_cache, all_addresses, dual_stack_mode)
+    counts = {'servers': 0, 'reachable': 0, 'tls_ok': 0, 'timed_out': 0}
+    fastest = None
+    
+    def emit(result):
+        nonlocal fastest
+        if calibration and calibration['subtracted']:
+            subtract_overhead(result, calibration)
+        counts['servers'] += 1
+        if result['stratum_times']:
+            counts['reachable'] += 1
+            avg = sketch_of(result['stratum_times']).mean
+            if fastest is None or avg < fastest[1]:
+                fastest = (result['display_name'], avg, result['hostname'])
+        if result.get('tls_times'):
+            counts['tls_ok'] += 1
+        if result.get('timed_out'):
+            counts['timed_out'] += 1
+        record = {'type': 'result', 'timestamp': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime())}
+        record.update(result_to_json(result, test_tls, tls_resume))
+        print(json.dumps(record), flush=True)
+    
+    results = run_probes(servers, runs, False, test_tls, verify_cert,
+                         use_async, concurrency, on_result=emit, tls_resume=tls_resume, duration=duration,
+                         dns_cache=dns_cache, server_names=server_names)
+    races = run_happy_eyeballs(PREDEFINED_SERVERS, runs, dns_cache) if happy_eyeballs else None
+    
+    summary = {
+        'type': 'summary',
+        'timestamp': started,
+        'duration_s': round(time.monotonic() - start_time, 3),
+        'client': vantage_info(*vantage_result(vantage)),
+        'runs': runs,
+        'duration': duration,
+        'tls_tested': test_tls,
+        'tls_resume': tls_resume,
+        'all_addresses': all_addresses,
+        'dual_stack': dual_stack_mode,
+        'servers': counts['servers'],
+        'reachable': counts['reachable'],
+        'timed_out': counts['timed_out'],
+        'fastest': {'display_name': fastest[0], 'host': fastest[2], 'stratum_avg': fastest[1]} if fastest else None
+    }
+    if test_tls:
+        summary['tls_ok'] = counts['tls_ok']
+    if races is not None:
+        summary['happy_eyeballs'] = races
+    if calibration:
+        summary['calibration'] = calibration
+    if dns_cache is not None and dns_cache.resolvers:
+        summary['dns_queries'] = list(dns_cache.queries)
+    print(json.dumps(summary), flush=True)
+    record_history(history, results, summary['client'], exporter)
+
+def format_monitor_ms(value: Optional[float]) -> str:
+    """Format a rolling statistic for the monitor table"""
+    return "-" if value is None else f"{value:.0f}"
+
+def print_monitor_snapshot(snapshot: Dict, show_tls: bool = False):
+    """Print the rolling per-pool statistics of a LatencyMonitor snapshot"""
+    headers = ["Pool Name", "CC", "Probes", "Fail %", "Stratum p50", "p95", "p99", "Jitter",
+               "Ping p50", "TCP RTT p50"]
+    if show_tls:
+        headers += ["TLS p50", "TLS p99"]
+    
+    rows = []
+    for pool in snapshot['pools']:
+        metrics = pool['metrics']
+        failure_rate = pool['failure_rate']
+        row = [
+            pool['display_name'],
+            pool['country_code'],
+            str(pool['probes']),
+            "-" if failure_rate is None else f"{failure_rate * 100:.0f}",
+            format_monitor_ms(metrics['stratum']['p50']),
+            format_monitor_ms(metrics['stratum']['p95']),
+            format_monitor_ms(metrics['stratum']['p99']),
+            format_monitor_ms(metrics['stratum']['jitter']),
+            format_monitor_ms(metrics['ping']['p50']),
+            format_monitor_ms(metrics['tcp_rtt']['p50'])
+        ]
+        if show_tls:
+            row += [format_monitor_ms(metrics['tls']['p50']), format_monitor_ms(metrics['tls']['p99'])]
+        rows.append(row)
+    
+    widths = [max(len(header), *(len(row[i]) for row in rows)) for i, header in enumerate(headers)]
+    separator = "+" + "+".join("-" * (w + 2) for w in widths) + "+"
+    
+    print(f"\n[{snapshot['timestamp']}] Rolling statistics over the last {snapshot['window']} samples "
+          f"per pool ({snapshot['rounds']} rounds since {snapshot['started']}), times in ms:")
+    print(separator)
+    print("| " + " | ".join(h.ljust(w) for h, w in zip(headers, widths)) + " |")
+    print(separator)
+    for row in rows:
+        print("| " + " | ".join(v.ljust(w) for v, w in zip(row, widths)) + " |")
+    print(separator)
+    sys.stdout.flush()
+
+def monitor_servers(servers: List[Tuple], interval: float = DEFAULT_MONITOR_INTERVAL,
+                    snapshot_interval: float = DEFAULT_SNAPSHOT_INTERVAL, window: int = DEFAULT_WINDOW,
+                    snapshot_file: Optional[str] = None, test_tls: bool = False, verify_cert: bool = True,
+                    use_async: bool = False, concurrency: int = DEFAULT_ASYNC_CONCURRENCY,
+                    max_rounds: Optional[int] = None, history: Optional[str] = None,
+                    exporter: Optional[Exporter] = None, dns_cache: Optional[DnsCache] = None) -> LatencyMonitor:
+    """
+    Probe servers every interval seconds until interrupted (Ctrl+C) or
+    max_rounds rounds have run, keeping rolling statistics per pool.
+    
+    Every snapshot_interval seconds the statistics are printed and, if
+    snapshot_file is set, written there as JSON. A final snapshot is
+    emitted on exit. One ProbeScheduler and one DnsCache are shared by
+    every round, so hostnames are re-resolved only when their TTL expires.
+    With history, every round's results are appended to that database;
+    with exporter, each result updates its metrics as soon as it arrives.
+    """
+    monitor = LatencyMonitor(window)
+    if dns_cache is None:
+        dns_cache = DnsCache()
+    scheduler = ProbeScheduler(max_in_flight=concurrency, probe_gap=_scheduler_probe_gap(servers, test_tls),
+                               jitter=_probe_jitter, resolve=dns_cache.address)
+    store = HistoryStore(history) if history else None
+    history_run = store.start_run('stratum_test --monitor', client_info()) if store else None
+    
+    emitted_rounds = None
+    
+    def emit_snapshot():
+        nonlocal emitted_rounds
+        if monitor.rounds == emitted_rounds:
+            return
+        emitted_rounds = monitor.rounds
+        snapshot = monitor.snapshot()
+        print_monitor_snapshot(snapshot, test_tls)
+        if snapshot_file:
+            write_snapshot(snapshot, snapshot_file)
+    
+    tls_msg = " with TLS testing" if test_tls else ""
+    print(f"Monitoring {len(servers)} servers every {interval:g}s{tls_msg}; "
+          f"snapshot every {snapshot_interval:g}s (Ctrl+C to stop)")
+    if snapshot_file:
+        print(f"  Writing snapshots to {snapshot_file}")
+    if exporter is not None and exporter.server is not None:
+        host, port = exporter.server.address[:2]
+        print(f"  Serving metrics at http://{host}:{port}/metrics")
+    sys.stdout.flush()
+    
+    next_snapshot = time.monotonic() + snapshot_interval
+    try:
+        while max_rounds is None or monitor.rounds < max_rounds:
+            round_start = time.monotonic()
+            def on_result(result):
+                monitor.add_result(result)
+                if exporter is not None:
+                    exporter.observe_stratum_result(result)
+            
+            results = run_probes(servers, 1, False, test_tls, verify_cert, use_async, concurrency,
+                                 on_result=on_result, scheduler=scheduler, dns_cache=dns_cache)
+            monitor.end_round()
+            if history_run is not None:
+                for result in results:
+                    history_run.record_stratum_result(result)
+    
+            if time.monotonic() >= next_snapshot:
+                emit_snapshot()
+                next_snapshot = time.monotonic() + snapshot_interval
+    
+            if max_rounds is not None and monitor.rounds >= max_rounds:
+                break
+            # Rounds start every interval seconds; a slow round starts the next one immediately
+            time.sleep(max(0.0, round_start + interval - time.monotonic()))
+    except KeyboardInterrupt:
+        print("\nStopping monitor...")
+    finally:
+        if store is not None:
+            store.close()
+    
+    emit_snapshot()
+    return monitor
+
 def main():
+    global _kernel_timestamps, _probe_gap, _probe_jitter, _parallel_probes, _run_deadline, _deadline
+    
     parser = argparse.ArgumentParser(
         description='Test Bitcoin mining stratum server connectivity and response time',
         formatter_class=argparse.RawDescriptionHelpFormatter,
@@ -1097,6 +3016,10 @@ Examples:
   Test with 3 runs for accuracy:
     python stratum_test.py --runs 3
   
+  Tail latency: 50 runs, or as many runs as fit in 2 minutes (adds p50/p90/p99 and jitter):
+    python stratum_test.py --runs 50
+    python stratum_test.py --duration 120
+  
   Test with TLS support (requires Python 3.6+):
     python stratum_test.py -t
     python stratum_test.py --tls
@@ -1107,6 +3030,41 @@ Examples:
   Output JSON format:
     python stratum_test.py --json
   
+  Stream JSON Lines (one record per server as it completes):
+    python stratum_test.py --ndjson
+  
+  Measure TLS reconnect cost (full vs resumed handshake):
+    python stratum_test.py -t --tls-resume --runs 3
+  
+  Show the per-phase latency breakdown (DNS, TCP, TLS, first byte, reply):
+    python stratum_test.py --phases
+    python stratum_test.py -t --phases
+  
+  Use the asyncio engine with at most 500 probes in flight:
+    python stratum_test.py --async --concurrency 500
+  
+  Monitor all pools every 30s, snapshot every 5 minutes to a file:
+    python stratum_test.py --monitor --interval 30 --snapshot-file latency.json
+  
+  Monitor with a Prometheus endpoint and an InfluxDB line protocol file:
+    python stratum_test.py --monitor --metrics 0.0.0.0:9108 --influx-file latency.lp
+  
+  Record results for trend analysis (query with history_db.py):
+    python stratum_test.py --runs 3 --history
+  
+  Compare DNS resolvers and probe the addresses of the fastest one:
+    python stratum_test.py --resolver 1.1.1.1 --resolver 8.8.8.8 --resolver 9.9.9.9
+  
+  Probe every A/AAAA address of each pool separately (anycast / round-robin):
+    python stratum_test.py -t --all-addresses
+    python stratum_test.py solo.atlaspool.io 3333 -t 4333 --all-addresses
+  
+  Compare IPv4 and IPv6 side by side, and see which family Happy Eyeballs picks:
+    python stratum_test.py -t --dual-stack --happy-eyeballs --runs 3
+  
+  Probe over IPv6 only:
+    python stratum_test.py -6
+  
   Test single server:
     python stratum_test.py solo.atlaspool.io 3333
   
@@ -1118,6 +3076,12 @@ Examples:
   
   Test single server with 2 runs:
     python stratum_test.py solo.atlaspool.io 3333 --runs 2
+  
+  Run each run's probes in parallel, giving up on them after 3 seconds:
+    python stratum_test.py -t --runs 5 --parallel-probes --run-deadline 3
+  
+  Finish within 20 seconds, whatever the slowest pool does:
+    python stratum_test.py -t --runs 5 --deadline 20
         """
     )
     
@@ -1125,12 +3089,15 @@ Examples:
                         help='Stratum server hostname (optional)')
     parser.add_argument('port', nargs='?', type=int,
                         help='Stratum server port (optional)')
-    parser.add_argument('--runs', type=int, choices=[1, 2, 3], default=1,
-                        help='Number of test runs per server (default: 1)')
+    parser.add_argument('--runs', type=int, default=1, metavar='N',
+                        help='Number of test runs per server (default: 1). With 4 or more runs the table adds '
+                             'p50/p90/p99 and jitter (standard deviation / IQR) columns')
+    parser.add_argument('--duration', type=float, metavar='SECONDS',
+                        help='Probe each server repeatedly for SECONDS instead of a fixed number of runs')
     parser.add_argument('-v', '--verify', action='store_true',
                         help='Test all 5 Bitcoin address types (P2PKH, P2SH, P2WPKH, P2WSH, P2TR) to verify '
                              'which formats each pool accepts. This confirms the pool will pay block rewards '
-                             'to your address type. See verify_pool.py for detailed verification. (adds ~10s per server)')
+                             'to your address type. See verify_pool.py for detailed verification. (adds a few seconds)')
     parser.add_argument('-t', '--tls', nargs='?', type=int, const=0, metavar='TLS_PORT',
                         help='Test TLS stratum connections. Requires Python 3.6+ (Python 3.7+ for TLS 1.3). '
                              'For predefined servers, uses configured TLS ports. '
@@ -1140,12 +3107,97 @@ Examples:
                              'WARNING: Only use for testing - disables security checks!')
     parser.add_argument('--json', action='store_true',
                         help='Output results in JSON format')
+    parser.add_argument('--ndjson', action='store_true',
+                        help='Output JSON Lines: one record per server as soon as it completes, '
+                             'then a summary record')
+    parser.add_argument('--tls-resume', action='store_true',
+                        help='With -t: resume the TLS session of the first handshake on later runs and show '
+                             'full and resumed handshake latency in separate columns')
+    parser.add_argument('--phases', action='store_true',
+                        help='Show per-phase latency columns: DNS lookup, TCP connect, TLS handshake (with -t), '
+                             'time to first byte and full subscribe reply')
+    parser.add_argument('--kernel-timestamps', action='store_true',
+                        help='Linux: also time ping and plain stratum replies by their kernel receive timestamp '
+                             '(SO_TIMESTAMPNS) and show them beside the userspace times, so thread scheduling '
+                             'delay under heavy concurrency is not counted as latency')
+    parser.add_argument('--probe-gap', type=float, metavar='SECONDS',
+                        help='Minimum time between any two probe starts across all pools; spreads probes out '
+                             f'instead of firing them in bursts (default: each run\'s probes spread evenly over '
+                             f'{RUN_INTERVAL} s, about {RUN_INTERVAL / 3 / len(PREDEFINED_SERVERS) * 1000:.1f} ms '
+                             f'for the predefined pools; 0 for no pacing)')
+    parser.add_argument('--jitter', type=float, default=DEFAULT_JITTER, metavar='FRACTION',
+                        help=f'Randomize the probe gap and the interval between runs by +/- FRACTION '
+                             f'(default: {DEFAULT_JITTER}; 0 for fixed timing)')
+    parser.add_argument('--parallel-probes', action='store_true',
+                        help='Run the ping, TCP RTT, stratum and TLS probes of a run at the same time instead of '
+                             'one after another (a run then takes about as long as its slowest probe)')
+    parser.add_argument('--run-deadline', type=float, metavar='SECONDS',
+                        help=f'With --parallel-probes, give up on probes still running this long after their run '
+                             f'started and record them as "{RUN_DEADLINE_ERROR}" (default: {DEFAULT_RUN_DEADLINE:g})')
+    parser.add_argument('--deadline', type=float, metavar='SECONDS',
+                        help='Finish within SECONDS: probes still outstanding then are abandoned, servers without '
+                             'results are marked TIMEOUT, and the table and recommendation are printed from '
+                             'whatever completed')
+    parser.add_argument('--calibrate', nargs='?', type=int, const=DEFAULT_CALIBRATION_RUNS, metavar='N',
+                        help='Probe an in-process loopback stratum server N times per probe type '
+                             f'(default: {DEFAULT_CALIBRATION_RUNS}) and report the local overhead floor of '
+                             'stratum, TLS and address verification probes')
+    parser.add_argument('--subtract-overhead', action='store_true',
+                        help='Calibrate (see --calibrate) and subtract the local overhead floor from stratum '
+                             'and TLS times')
+    parser.add_argument('--async', dest='use_async', action='store_true',
+                        help='Use the asyncio probe engine instead of one thread per server. '
+                             'Scales to thousands of endpoints. Requires Python 3.7+')
+    parser.add_argument('--concurrency', type=int, default=DEFAULT_ASYNC_CONCURRENCY, metavar='N',
+                        help=f'Maximum probes in flight (default: {DEFAULT_ASYNC_CONCURRENCY}). The cap adapts '
+                             'downwards when probes time out or are reset; each pool is also rate limited')
+    parser.add_argument('--resolver', action='append', metavar='IP[:PORT]',
+                        help='Resolve pool hostnames by querying this DNS resolver directly (repeatable). '
+                             'All resolvers are queried concurrently, their latency and answers are reported, '
+                             'and probes use the fastest answer for its record TTL. Requires Python 3.7+')
+    parser.add_argument('--all-addresses', action='store_true',
+                        help='Probe every A and AAAA address of each pool as its own row, grouped by pool, '
+                             'and report the fastest endpoint (TLS still uses the pool hostname)')
+    family_group = parser.add_mutually_exclusive_group()
+    family_group.add_argument('-4', '--ipv4', dest='family', action='store_const', const=socket.AF_INET,
+                              help='Probe over IPv4 only (the default for pool hostnames)')
+    family_group.add_argument('-6', '--ipv6', dest='family', action='store_const', const=socket.AF_INET6,
+                              help='Probe over IPv6 only (AAAA records, ICMPv6 ping)')
+    parser.add_argument('--dual-stack', action='store_true',
+                        help='Probe the first IPv4 and the first IPv6 address of each pool and report '
+                             'their latency side by side')
+    parser.add_argument('--happy-eyeballs', action='store_true',
+                        help='Also race IPv6 against IPv4 per RFC 8305 (once per run) and report which family '
+                             'a dual-stack client would use, and by how much it wins')
+    parser.add_argument('--history', nargs='?', const=DEFAULT_HISTORY_PATH, metavar='PATH',
+                        help=f'Record every sample in a local SQLite history database (default: {DEFAULT_HISTORY_PATH}). '
+                             'Query it with history_db.py')
+    parser.add_argument('--metrics', metavar='[HOST:]PORT',
+                        help='With --monitor: serve OpenMetrics/Prometheus metrics at http://HOST:PORT/metrics '
+                             '(HOST defaults to 127.0.0.1)')
+    parser.add_argument('--influx-file', metavar='PATH',
+                        help='Append every measurement to PATH in InfluxDB line protocol')
+    parser.add_argument('--monitor', action='store_true',
+                        help='Run continuously: probe every pool each --interval seconds and keep rolling '
+                             'p50/p95/p99, jitter and failure rate per pool until interrupted')
+    parser.add_argument('--interval', type=float, default=DEFAULT_MONITOR_INTERVAL, metavar='SECONDS',
+                        help=f'With --monitor: seconds between probe rounds (default: {DEFAULT_MONITOR_INTERVAL})')
+    parser.add_argument('--snapshot-interval', type=float, default=DEFAULT_SNAPSHOT_INTERVAL, metavar='SECONDS',
+                        help=f'With --monitor: seconds between printed/written snapshots (default: {DEFAULT_SNAPSHOT_INTERVAL})')
+    parser.add_argument('--snapshot-file', metavar='PATH',
+                        help='With --monitor: also write each snapshot to PATH as JSON (replaced atomically)')
+    parser.add_argument('--window', type=int, default=DEFAULT_WINDOW, metavar='N',
+                        help=f'With --monitor: samples kept per pool and metric (default: {DEFAULT_WINDOW})')
     
     args = parser.parse_args()
     
     # Validate arguments
-    if args.json and (args.hostname or args.port):
-        print("Error: --json cannot be used with single server test", file=sys.stderr)
+    if (args.json or args.ndjson) and (args.hostname or args.port):
+        print("Error: --json/--ndjson cannot be used with single server test", file=sys.stderr)
+        sys.exit(1)
+    
+    if args.json and args.ndjson:
+        print("Error: use either --json or --ndjson", file=sys.stderr)
         sys.exit(1)
     
     # Determine if TLS testing is enabled
@@ -1164,6 +3216,108 @@ Examples:
             print("Warning: Python 3.6 detected - TLS 1.2 will be used (TLS 1.3 requires Python 3.7+)", file=sys.stderr)
             print()
     
+    if args.tls_resume and not test_tls:
+        print("Error: --tls-resume requires -t/--tls", file=sys.stderr)
+        sys.exit(1)
+    
+    if args.use_async and sys.version_info < (3, 7):
+        print("Error: --async requires Python 3.7 or higher", file=sys.stderr)
+        sys.exit(1)
+    
+    if args.concurrency < 1:
+        print("Error: --concurrency must be at least 1", file=sys.stderr)
+        sys.exit(1)
+    
+    if args.runs < 1:
+        print("Error: --runs must be at least 1", file=sys.stderr)
+        sys.exit(1)
+    
+    if args.duration is not None and args.duration <= 0:
+        print("Error: --duration must be positive", file=sys.stderr)
+        sys.exit(1)
+    
+    if args.monitor:
+        if (args.json or args.ndjson or args.verify or args.tls_resume or args.duration or args.all_addresses
+                or args.dual_stack or args.happy_eyeballs or args.deadline):
+            print("Error: --monitor cannot be combined with --json, --ndjson, --verify, --tls-resume, --duration, "
+                  "--all-addresses, --dual-stack, --happy-eyeballs or --deadline", file=sys.stderr)
+            sys.exit(1)
+        if args.interval <= 0 or args.snapshot_interval <= 0 or args.window < 1:
+            print("Error: --interval and --snapshot-interval must be positive and --window at least 1", file=sys.stderr)
+            sys.exit(1)
+    
+    if (args.calibrate is not None or args.subtract_overhead) and args.monitor:
+        print("Error: --calibrate and --subtract-overhead cannot be combined with --monitor", file=sys.stderr)
+        sys.exit(1)
+    if args.calibrate is not None and args.calibrate < 1:
+        print("Error: --calibrate needs at least 1 probe", file=sys.stderr)
+        sys.exit(1)
+    
+    if (args.probe_gap is not None and args.probe_gap < 0) or not 0 <= args.jitter <= 1:
+        print("Error: --probe-gap must not be negative and --jitter must be between 0 and 1", file=sys.stderr)
+        sys.exit(1)
+    _probe_gap, _probe_jitter = args.probe_gap, args.jitter
+    
+    if args.run_deadline is not None and not args.parallel_probes:
+        print("Error: --run-deadline requires --parallel-probes", file=sys.stderr)
+        sys.exit(1)
+    if args.run_deadline is not None and args.run_deadline <= 0:
+        print("Error: --run-deadline must be positive", file=sys.stderr)
+        sys.exit(1)
+    _parallel_probes = args.parallel_probes
+    if args.run_deadline is not None:
+        _run_deadline = args.run_deadline
+    
+    if args.deadline is not None:
+        if args.deadline <= 0:
+            print("Error: --deadline must be positive", file=sys.stderr)
+            sys.exit(1)
+        # The clock starts now, so calibration and setup count towards it
+        _deadline = time.monotonic() + args.deadline
+    
+    if args.kernel_timestamps:
+        if not kernel_timestamps.supported():
+            print("Error: --kernel-timestamps requires Linux (SO_TIMESTAMPNS)", file=sys.stderr)
+            sys.exit(1)
+        _kernel_timestamps = True
+    
+    if (args.dual_stack or args.happy_eyeballs) and args.family:
+        print("Error: --dual-stack and --happy-eyeballs use both address families; they cannot be combined "
+              "with -4 or -6", file=sys.stderr)
+        sys.exit(1)
+    
+    # Resolver layer (--resolver queries DNS servers directly instead of getaddrinfo;
+    # -4/-6 pick the address family probes connect over)
+    dns_cache = None
+    if args.resolver and sys.version_info < (3, 7):
+        print("Error: --resolver requires Python 3.7 or newer", file=sys.stderr)
+        sys.exit(1)
+    if args.resolver or args.family:
+        try:
+            dns_cache = DnsCache(family=args.family, resolvers=args.resolver)
+        except ValueError as e:
+            print(f"Error: --resolver must be an IP address with an optional port: {e}", file=sys.stderr)
+            sys.exit(1)
+    
+    if args.metrics and not args.monitor:
+        print("Error: --metrics requires --monitor (use --influx-file to export a single run)", file=sys.stderr)
+        sys.exit(1)
+    
+    # Local overhead floor, measured before any pool is probed
+    calibration = None
+    if args.calibrate is not None or args.subtract_overhead:
+        calibration = calibrate(args.calibrate or DEFAULT_CALIBRATION_RUNS)
+        calibration['subtracted'] = args.subtract_overhead
+    
+    # Metrics export (Prometheus endpoint and/or InfluxDB line protocol file)
+    exporter = None
+    if args.metrics or args.influx_file:
+        try:
+            exporter = Exporter(args.metrics, args.influx_file)
+        except (OSError, ValueError) as e:
+            print(f"Error: cannot start metrics export: {e}", file=sys.stderr)
+            sys.exit(1)
+    
     # Single server test
     if args.hostname and args.port:
         # Check if TLS port is needed
@@ -1174,17 +3328,45 @@ Examples:
                 # Not in predefined list or no TLS support configured
                 print("Error: TLS port must be specified for single server TLS test (e.g., -t 4333)", file=sys.stderr)
                 sys.exit(1)
-        test_single_server(args.hostname, args.port, args.runs, test_tls, tls_port, verify_cert)
+        if args.monitor:
+            server_info = lookup_predefined_server(args.hostname)
+            if server_info:
+                _, predefined_tls_port, display_name, country_code = server_info
+                tls_port = tls_port or predefined_tls_port
+            else:
+                display_name, country_code = args.hostname, "??"
+            monitor_servers([(args.hostname, args.port, tls_port, display_name, country_code)], args.interval,
+                            args.snapshot_interval, args.window, args.snapshot_file, test_tls, verify_cert,
+                            args.use_async, args.concurrency, history=args.history, exporter=exporter,
+                            dns_cache=dns_cache)
+        else:
+            test_single_server(args.hostname, args.port, args.runs, test_tls, tls_port, verify_cert, args.phases,
+                               args.tls_resume, args.duration, args.history, exporter, dns_cache,
+                               args.all_addresses, args.dual_stack, args.happy_eyeballs, calibration)
     elif args.hostname or args.port:
         print("Error: Both hostname and port must be provided for single server test", file=sys.stderr)
         parser.print_help()
         sys.exit(1)
+    # Continuous monitoring of all servers
+    elif args.monitor:
+        monitor_servers(PREDEFINED_SERVERS, args.interval, args.snapshot_interval, args.window,
+                        args.snapshot_file, test_tls, verify_cert, args.use_async, args.concurrency,
+                        history=args.history, exporter=exporter, dns_cache=dns_cache)
+    # Streaming JSON Lines output
+    elif args.ndjson:
+        output_ndjson(args.runs, test_tls, verify_cert, args.use_async, args.concurrency, args.tls_resume,
+                      args.duration, args.history, exporter, dns_cache, args.all_addresses, args.dual_stack,
+                      args.happy_eyeballs, calibration)
     # JSON output
     elif args.json:
-        output_json(args.runs, test_tls, verify_cert)
+        output_json(args.runs, test_tls, verify_cert, args.use_async, args.concurrency, args.tls_resume,
+                    args.duration, args.history, exporter, dns_cache, args.all_addresses, args.dual_stack,
+                    args.happy_eyeballs, calibration)
     # Default: test all servers
     else:
-        test_all_servers(args.runs, args.verify, test_tls, verify_cert)
+        test_all_servers(args.runs, args.verify, test_tls, verify_cert, args.use_async, args.concurrency,
+                         args.phases, args.tls_resume, args.duration, args.history, exporter, dns_cache,
+                         args.all_addresses, args.dual_stack, args.happy_eyeballs, calibration)
 
 if __name__ == "__main__":
     main()
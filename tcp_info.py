@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""
+TCP_INFO
+
+Reads the kernel's view of a connected TCP socket (Linux getsockopt
+TCP_INFO): smoothed RTT, RTT variance and retransmit counters.
+
+A stratum probe times mining.subscribe from the application, so its reply
+time is network RTT plus the time the pool takes to answer. The kernel RTT
+is measured from ACKs alone, which the pool's TCP stack sends without
+waiting for the pool software, so reply time minus kernel RTT is the pool's
+own processing time (plus any proxy or backend hop behind the TCP endpoint).
+
+Usage:
+    import tcp_info
+
+    info = tcp_info.read(sock)   # after the subscribe reply arrived
+    if info is not None:
+        print(info['rtt_ms'], info['total_retrans'])
+        print(tcp_info.server_time(reply_ms, info))
+
+Requirements:
+  • Python 3.6+
+  • Linux (read() returns None elsewhere)
+  • No external dependencies
+"""
+
+import socket
+import struct
+import sys
+from typing import Optional, Dict
+
+# getsockopt option number (socket.TCP_INFO is missing from some builds)
+TCP_INFO = getattr(socket, 'TCP_INFO', 11)
+
+# Start of Linux struct tcp_info: 8 u8 fields, then u32 fields up to tcpi_total_retrans
+TCP_INFO_FORMAT = "8B24I"
+TCP_INFO_SIZE = struct.calcsize(TCP_INFO_FORMAT)
+
+# Positions of the u32 fields read (after the 8 u8 fields)
+_U32 = 8
+_RTO = _U32 + 0
+_RETRANS = _U32 + 7
+_RTT = _U32 + 15
+_RTTVAR = _U32 + 16
+_SND_CWND = _U32 + 18
+_TOTAL_RETRANS = _U32 + 23
+
+
+def supported() -> bool:
+    """True if this platform has Linux TCP_INFO"""
+    return sys.platform.startswith('linux')
+
+
+def read(sock) -> Optional[Dict]:
+    """
+    Kernel TCP statistics of a connected socket (a plain or SSL socket, or
+    the socket of an asyncio transport), or None if unavailable.
+
+    Returns dict with:
+        rtt_ms:        smoothed round-trip time (tcpi_rtt)
+        rttvar_ms:     RTT variance (tcpi_rttvar)
+        rto_ms:        retransmission timeout (tcpi_rto)
+        snd_cwnd:      congestion window in segments
+        retrans:       segments retransmitted and not yet acknowledged (tcpi_retrans)
+        total_retrans: segments retransmitted over the connection (tcpi_total_retrans)
+    """
+    if not supported() or sock is None:
+        return None
+    try:
+        raw = sock.getsockopt(socket.IPPROTO_TCP, TCP_INFO, TCP_INFO_SIZE)
+    except (OSError, AttributeError):
+        return None
+    if len(raw) < TCP_INFO_SIZE:
+        return None
+    fields = struct.unpack(TCP_INFO_FORMAT, raw[:TCP_INFO_SIZE])
+    return {
+        'rtt_ms': fields[_RTT] / 1000,
+        'rttvar_ms': fields[_RTTVAR] / 1000,
+        'rto_ms': fields[_RTO] / 1000,
+        'snd_cwnd': fields[_SND_CWND],
+        'retrans': fields[_RETRANS],
+        'total_retrans': fields[_TOTAL_RETRANS]
+    }
+
+
+def server_time(reply_ms: Optional[float], info: Optional[Dict]) -> Optional[float]:
+    """
+    Server processing time in ms: application reply time minus kernel RTT
+    (never below 0, since the smoothed RTT can exceed one fast reply).
+    None if either is missing.
+    """
+    if reply_ms is None or info is None or not info['rtt_ms']:
+        return None
+    return max(reply_ms - info['rtt_ms'], 0.0)
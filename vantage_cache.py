@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+Vantage Cache
+
+Disk cache for the public IP / ASN / location lookup that stratum_test.py,
+pool-mempool.py and findings/prevhash_timeline.py report as the vantage
+point of a run. The lookup costs two HTTP requests (up to 3s each), so
+repeated or scheduled runs read it from here instead.
+
+Entries are keyed on the local interface address that routes to the
+internet: moving to another network (new Wi-Fi, VPN up or down) changes
+that address and misses the cache, while reruns on the same network hit
+it until the TTL expires. Only successful lookups are stored.
+
+Usage:
+    import vantage_cache
+
+    key = vantage_cache.local_address()
+    entry = vantage_cache.load(key)
+    if entry is None:
+        entry = {'ipv4': ..., 'asn_info': ...}
+        vantage_cache.store(key, entry)
+
+Requirements:
+  • Python 3.6+
+  • No external dependencies
+"""
+
+import os
+import json
+import time
+import socket
+from typing import Optional, Dict
+
+DEFAULT_CACHE_PATH = os.path.join(os.path.expanduser('~'), '.atlaspool_tools', 'vantage.json')
+
+# Seconds a cached lookup stays valid
+DEFAULT_TTL = 6 * 3600
+
+# Any public address works: connecting a UDP socket sends no packet, it only
+# asks the kernel which local address would be used
+ROUTE_PROBE_ADDRESS = ('192.0.2.1', 53)
+
+
+def local_address() -> Optional[str]:
+    """Local interface address of the default route, or None without one"""
+    try:
+        with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+            sock.connect(ROUTE_PROBE_ADDRESS)
+            return sock.getsockname()[0]
+    except OSError:
+        return None
+
+
+def _read(path: str) -> Dict:
+    try:
+        with open(path) as f:
+            data = json.load(f)
+        return data if isinstance(data, dict) else {}
+    except (OSError, ValueError):
+        return {}
+
+
+def load(key: Optional[str], ttl: float = DEFAULT_TTL, path: str = DEFAULT_CACHE_PATH) -> Optional[Dict]:
+    """Cached entry for key if it is younger than ttl seconds, else None"""
+    if key is None or ttl <= 0:
+        return None
+    entry = _read(path).get(key)
+    if not isinstance(entry, dict) or time.time() - entry.get('fetched', 0) > ttl:
+        return None
+    return entry
+
+
+def store(key: Optional[str], entry: Dict, ttl: float = DEFAULT_TTL, path: str = DEFAULT_CACHE_PATH):
+    """
+    Save entry under key (stamped with the current time) and drop expired
+    entries. Written atomically; failures are ignored since the cache is
+    only an optimization.
+    """
+    if key is None or ttl <= 0:
+        return
+    now = time.time()
+    data = {k: v for k, v in _read(path).items()
+            if isinstance(v, dict) and now - v.get('fetched', 0) <= ttl}
+    data[key] = dict(entry, fetched=now)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    try:
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with open(tmp_path, 'w') as f:
+            json.dump(data, f, indent=2)
+        os.replace(tmp_path, path)
+    except OSError:
+        pass
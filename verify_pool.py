@@ -42,6 +42,9 @@ Usage:
     
     # Analyze pool architecture (detect proxying)
     python3 verify_pool.py <pool_host> <pool_port> --analyze
+    
+    # Connect over IPv6 (or -4 for IPv4)
+    python3 verify_pool.py <pool_host> <pool_port> -6
 
 Examples:
     python3 verify_pool.py solo.atlaspool.io 3333
@@ -63,227 +66,108 @@ What You'll See:
 Version: 1.2
 """
 
-import socket
-import json
 import sys
 import time
 import binascii
 import argparse
 import statistics
+import socket
 from typing import Optional, Tuple, Dict, List
 
+from stratum_client import StratumClient, now_ns
+from probe_scheduler import ProbeScheduler
+import dual_stack
+import tcp_info
+
+# Concurrent connections per pool when testing all address types (-a)
+ADDRESS_CHECKS_PER_POOL = 2
 
-def connect_and_subscribe(host: str, port: int, timeout: int = 10) -> Tuple[Optional[socket.socket], Optional[dict]]:
+
+def connect_and_subscribe(host: str, port: int, timeout: int = 10) -> Tuple[Optional[StratumClient], Optional[dict]]:
     """
     Connect to stratum server and send mining.subscribe.
-    Returns (socket, response) or (None, None) on failure.
+    Returns (client, response) or (None, None) on failure.
     """
+    client = StratumClient(host, port, timeout)
     try:
-        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        sock.settimeout(timeout)
-        sock.connect((host, port))
-        
-        # Send mining.subscribe
-        subscribe_msg = json.dumps({
-            "id": 1,
-            "method": "mining.subscribe",
-            "params": ["verify_pool/1.0"]
-        }) + "\n"
-        
-        sock.sendall(subscribe_msg.encode('utf-8'))
+        client.connect()
         
-        # Wait a moment for response to arrive
-        time.sleep(0.2)
-        
-        # Receive response - may need multiple reads
-        response_parts = []
-        sock.settimeout(3)
-        
-        try:
-            for _ in range(2):
-                chunk = sock.recv(4096).decode('utf-8')
-                if chunk:
-                    response_parts.append(chunk)
-                    if '\n' in chunk and '"id":1' in chunk:
-                        break
-                time.sleep(0.1)
-        except socket.timeout:
-            pass
-        
-        response = ''.join(response_parts).strip()
+        # Returns as soon as the subscribe reply arrives
+        response = client.subscribe(["verify_pool/1.0"], timeout=timeout)
         
         if not response:
+            client.close()
             return None, None
         
-        # Parse response (may contain multiple lines)
-        for line in response.split('\n'):
-            if line.strip():
-                try:
-                    data = json.loads(line)
-                    if data.get('id') == 1:
-                        return sock, data
-                except json.JSONDecodeError:
-                    continue
-        
-        return sock, None
+        return client, response
         
     except Exception:
+        client.close()
         return None, None
 
 
-def authorize_worker(sock: socket.socket, username: str, password: str = "x") -> Tuple[bool, Optional[dict], Optional[float]]:
+def authorize_worker(client: StratumClient, username: str, password: str = "x") -> Tuple[bool, Optional[dict], Optional[float]]:
     """
     Send mining.authorize with username (typically your BTC address).
     Returns (authorized, mining_notify_params, difficulty) - notify and difficulty may be None.
     """
     try:
-        # Ensure socket has a reasonable timeout
-        sock.settimeout(10)
-        
-        authorize_msg = json.dumps({
-            "id": 2,
-            "method": "mining.authorize",
-            "params": [username, password]
-        }) + "\n"
-        
-        sock.sendall(authorize_msg.encode('utf-8'))
-        
-        # Receive response - may need multiple reads for slow connections
-        # Wait a bit for the response to arrive
-        time.sleep(0.3)
-        
-        response_parts = []
-        sock.settimeout(2)  # Shorter timeout for subsequent reads
-        
-        try:
-            # Try to read multiple times to get complete response
-            for _ in range(3):
-                chunk = sock.recv(8192).decode('utf-8')
-                if chunk:
-                    response_parts.append(chunk)
-                    # If we got a complete response, break
-                    if '\n' in chunk and '"id":2' in chunk:
-                        break
-                time.sleep(0.1)
-        except socket.timeout:
-            pass  # Normal - no more data
-        
-        response = ''.join(response_parts).strip()
+        response = client.authorize(username, password, timeout=10)
         
         if not response:
             return False, None, None
         
-        authorized = False
-        notify_params = None
-        difficulty = None
+        authorized = response.get('result', False)
         
-        for line in response.split('\n'):
-            if line.strip():
-                try:
-                    data = json.loads(line)
-                    
-                    # Check authorization response
-                    if data.get('id') == 2:
-                        authorized = data.get('result', False)
-                    
-                    # Check for mining.notify
-                    if data.get('method') == 'mining.notify':
-                        notify_params = data.get('params')
-                    
-                    # Check for mining.set_difficulty
-                    if data.get('method') == 'mining.set_difficulty':
-                        diff = data.get('params', [None])[0]
-                        if diff is not None:
-                            difficulty = float(diff)
-                except json.JSONDecodeError:
-                    continue
+        # Pick up mining.notify / mining.set_difficulty sent with the reply
+        client.drain()
         
-        return authorized, notify_params, difficulty
+        return authorized, client.notify_params, client.difficulty
         
     except Exception as e:
         return False, None, None
 
 
-def wait_for_mining_notify(sock: socket.socket, timeout: int = 15, retry_count: int = 0) -> Tuple[Optional[dict], Optional[float]]:
+def wait_for_mining_notify(client: StratumClient, timeout: int = 15, retry_count: int = 0,
+                           verbose: bool = True) -> Tuple[Optional[dict], Optional[float]]:
     """
     Wait for mining.notify message containing the block template.
     Returns (notify_params, difficulty) or (None, None).
     
     Args:
-        sock: Socket connection to pool
+        client: Stratum connection to pool
         timeout: Timeout in seconds
         retry_count: Current retry attempt (for display purposes)
+        verbose: Print progress (disabled when several checks run concurrently)
     """
     try:
-        sock.settimeout(timeout)
-        
-        if retry_count > 0:
+        if retry_count > 0 and verbose:
             print(f"    Retry {retry_count}...")
         
-        # May need to receive multiple messages
-        buffer = ""
         start_time = time.time()
-        difficulty = None
-        notify_params = None
+        notify_params = client.wait_for_notify(timeout)
+        elapsed = time.time() - start_time
         
-        while True:
-            try:
-                chunk = sock.recv(8192).decode('utf-8')
-            except socket.timeout:
-                elapsed = time.time() - start_time
-                if not notify_params:
-                    print(f"    Timeout after {elapsed:.1f}s - no mining.notify received")
-                    return None, None
-                else:
-                    # We got notify but timed out waiting for more data
-                    return notify_params, difficulty
-                
-            if not chunk:
-                break
-                
-            buffer += chunk
-            
-            # Process complete lines
-            while '\n' in buffer:
-                line, buffer = buffer.split('\n', 1)
-                if line.strip():
-                    try:
-                        data = json.loads(line)
-                        
-                        # Look for mining.notify
-                        if data.get('method') == 'mining.notify':
-                            elapsed = time.time() - start_time
-                            if retry_count > 0:
-                                print(f"    ✓ Received after {elapsed:.1f}s (retry {retry_count})")
-                            notify_params = data.get('params')
-                            # Don't return immediately - keep reading for difficulty
-                        
-                        # Also check for mining.set_difficulty
-                        if data.get('method') == 'mining.set_difficulty':
-                            diff = data.get('params', [None])[0]
-                            if diff is not None:
-                                difficulty = float(diff)
-                                print(f"    Received difficulty: {difficulty:,.0f}")
-                        
-                        # If we have both, we can return
-                        if notify_params is not None:
-                            # Give it a moment to see if difficulty comes through
-                            if difficulty is not None:
-                                return notify_params, difficulty
-                            
-                    except json.JSONDecodeError:
-                        continue
-            
-            # If we got notify_params, wait a bit more for difficulty then return
-            if notify_params is not None:
-                elapsed = time.time() - start_time
-                if elapsed > 1.0:  # Wait max 1 more second for difficulty
-                    return notify_params, difficulty
+        if not notify_params:
+            if verbose:
+                print(f"    Timeout after {elapsed:.1f}s - no mining.notify received")
+            return None, None
         
-        return notify_params, difficulty
+        if retry_count > 0 and verbose:
+            print(f"    ✓ Received after {elapsed:.1f}s (retry {retry_count})")
+        
+        # Difficulty usually precedes the first job - give it up to 1 more second
+        if client.difficulty is None and elapsed < 1.0:
+            client.wait_for_method('mining.set_difficulty', 1.0 - elapsed)
+        
+        if client.difficulty is not None and verbose:
+            print(f"    Received difficulty: {client.difficulty:,.0f}")
+        
+        return notify_params, client.difficulty
         
     except Exception as e:
-        print(f"    Error receiving notify: {e}")
+        if verbose:
+            print(f"    Error receiving notify: {e}")
         return None, None
 
 
@@ -1165,9 +1049,9 @@ def test_extranonce1_uniqueness(host: str, port: int, timeout: int = 10, num_tes
     for i in range(num_tests):
         print(f"Connection {i+1}/{num_tests}...", end=" ")
         
-        sock, subscribe_response = connect_and_subscribe(host, port, timeout)
+        client, subscribe_response = connect_and_subscribe(host, port, timeout)
         
-        if not sock or not subscribe_response:
+        if not client or not subscribe_response:
             print("❌ Failed")
             continue
         
@@ -1180,7 +1064,7 @@ def test_extranonce1_uniqueness(host: str, port: int, timeout: int = 10, num_tes
         else:
             print("❌ No extranonce1")
         
-        sock.close()
+        client.close()
         
         # Small delay between connections
         if i < num_tests - 1:
@@ -1275,11 +1159,27 @@ def analyze_pool_architecture(host: str, port: int, timeout: int = 15, num_tests
     """
     Analyze pool architecture to detect potential proxying or performance issues.
     
+    On Linux, the kernel's TCP RTT (TCP_INFO) is read after every subscribe
+    reply, splitting the subscribe round trip into network RTT and server
+    processing time. A server time well above the network RTT means the
+    reply waited on something behind the TCP endpoint (a proxy hop or a
+    busy backend), which wall-clock variance alone cannot tell apart from
+    a distant server.
+    
+    Replies are also timed by their kernel receive timestamp where
+    available (Linux), so the subscribe time does not include the time this
+    process took to wake up and read the reply.
+    
     Returns dict with:
         - response_times: List of connection response times
         - avg_response_time: Average response time in seconds
         - response_variance: Standard deviation of response times
         - extranonce_size: Size of extranonce1 in bytes
+        - reply_ms: Median subscribe round trip in ms, timed in userspace
+        - kernel_reply_ms: Median subscribe round trip in ms to the kernel receive timestamp (None if unavailable)
+        - kernel_rtt_ms: Median kernel TCP RTT in ms (None without TCP_INFO)
+        - server_time_ms: Median subscribe reply time minus kernel RTT in ms (None without TCP_INFO)
+        - retransmits: TCP segments retransmitted over all test connections (None without TCP_INFO)
         - likely_proxied: Boolean indicating if pool appears to be proxying
         - indicators: List of strings describing detected indicators
     """
@@ -1291,20 +1191,46 @@ def analyze_pool_architecture(host: str, port: int, timeout: int = 15, num_tests
     
     response_times = []
     extranonce_sizes = []
+    reply_times = []
+    kernel_reply_times = []
+    kernel_rtts = []
+    server_times = []
+    retransmits = None
     indicators = []
     
     for i in range(num_tests):
         print(f"Test {i+1}/{num_tests}...", end=" ")
         
         start_time = time.time()
-        sock, subscribe_response = connect_and_subscribe(host, port, timeout)
-        
-        if not sock or not subscribe_response:
+        client = StratumClient(host, port, timeout)
+        try:
+            client.connect()
+            client.enable_kernel_timestamps()
+            t_sent = now_ns()
+            subscribe_response = client.subscribe(["verify_pool/1.0"], timeout=timeout)
+            reply_ms = (now_ns() - t_sent) / 1e6
+            kernel_reply_ms = (client.last_recv_kernel_ns - t_sent) / 1e6 if client.last_recv_kernel_ns else None
+        except Exception:
+            subscribe_response = None
+        
+        if not subscribe_response:
+            client.close()
             print("❌ Failed")
             continue
         
         elapsed = time.time() - start_time
         response_times.append(elapsed)
+        reply_times.append(reply_ms)
+        if kernel_reply_ms is not None:
+            kernel_reply_times.append(kernel_reply_ms)
+        
+        # Kernel view of the same connection: network RTT without the pool's think time
+        info = tcp_info.read(client.sock)
+        server_ms = tcp_info.server_time(kernel_reply_ms if kernel_reply_ms is not None else reply_ms, info)
+        if server_ms is not None:
+            kernel_rtts.append(info['rtt_ms'])
+            server_times.append(server_ms)
+            retransmits = (retransmits or 0) + info['total_retrans']
         
         # Get extranonce size
         if 'result' in subscribe_response and len(subscribe_response['result']) >= 2:
@@ -1312,8 +1238,15 @@ def analyze_pool_architecture(host: str, port: int, timeout: int = 15, num_tests
             extranonce_size = len(extranonce1) // 2  # Hex string to bytes
             extranonce_sizes.append(extranonce_size)
         
-        sock.close()
-        print(f"✓ {elapsed:.3f}s")
+        client.close()
+        details = []
+        if kernel_reply_ms is not None:
+            details.append(f"subscribe {reply_ms:.1f} ms, kernel {kernel_reply_ms:.1f} ms")
+        else:
+            details.append(f"subscribe {reply_ms:.1f} ms")
+        if server_ms is not None:
+            details.append(f"RTT {info['rtt_ms']:.1f} + server {server_ms:.1f}")
+        print(f"✓ {elapsed:.3f}s ({'; '.join(details)})")
         
         # Small delay between tests
         if i < num_tests - 1:
@@ -1325,6 +1258,11 @@ def analyze_pool_architecture(host: str, port: int, timeout: int = 15, num_tests
             'avg_response_time': None,
             'response_variance': None,
             'extranonce_size': None,
+            'reply_ms': None,
+            'kernel_reply_ms': None,
+            'kernel_rtt_ms': None,
+            'server_time_ms': None,
+            'retransmits': None,
             'likely_proxied': None,
             'indicators': ['Connection failed - could not analyze']
         }
@@ -1333,6 +1271,10 @@ def analyze_pool_architecture(host: str, port: int, timeout: int = 15, num_tests
     avg_time = statistics.mean(response_times)
     variance = statistics.stdev(response_times) if len(response_times) > 1 else 0
     avg_extranonce = statistics.mean(extranonce_sizes) if extranonce_sizes else None
+    reply_time = statistics.median(reply_times)
+    kernel_reply_time = statistics.median(kernel_reply_times) if kernel_reply_times else None
+    kernel_rtt = statistics.median(kernel_rtts) if kernel_rtts else None
+    server_time = statistics.median(server_times) if server_times else None
     
     # Analyze indicators
     likely_proxied = False
@@ -1362,6 +1304,23 @@ def analyze_pool_architecture(host: str, port: int, timeout: int = 15, num_tests
     elif avg_extranonce:
         indicators.append(f"Standard extranonce space ({int(avg_extranonce)} bytes)")
     
+    # Indicator 4: Server processing time vs network RTT (kernel TCP_INFO)
+    if server_time is not None:
+        if server_time > 50 and server_time > kernel_rtt:
+            indicators.append(f"Slow server reply ({server_time:.1f} ms after {kernel_rtt:.1f} ms network RTT) "
+                              f"- may indicate proxy hop or busy backend")
+            likely_proxied = True
+        elif server_time > 10:
+            indicators.append(f"Moderate server time ({server_time:.1f} ms, network RTT {kernel_rtt:.1f} ms)")
+        else:
+            indicators.append(f"Fast server reply ({server_time:.1f} ms, network RTT {kernel_rtt:.1f} ms) "
+                              f"- response time is mostly network distance")
+    
+    # Indicator 5: Retransmissions (packet loss on the path)
+    if retransmits:
+        indicators.append(f"TCP retransmits ({retransmits} segments over {len(server_times)} connections) "
+                          f"- packet loss inflates response times")
+    
     # Print results
     print()
     print("Results:")
@@ -1370,6 +1329,12 @@ def analyze_pool_architecture(host: str, port: int, timeout: int = 15, num_tests
     print(f"Response variance:      {variance:.3f}s")
     if avg_extranonce:
         print(f"Extranonce size:        {int(avg_extranonce)} bytes")
+    print(f"Subscribe reply:        {reply_time:.1f} ms")
+    if kernel_reply_time is not None:
+        print(f"Subscribe reply (kernel timestamp): {kernel_reply_time:.1f} ms")
+    if server_time is not None:
+        print(f"Network RTT (kernel):   {kernel_rtt:.1f} ms")
+        print(f"Server time:            {server_time:.1f} ms")
     print()
     print("Indicators:")
     for indicator in indicators:
@@ -1392,11 +1357,62 @@ def analyze_pool_architecture(host: str, port: int, timeout: int = 15, num_tests
         'avg_response_time': avg_time,
         'response_variance': variance,
         'extranonce_size': int(avg_extranonce) if avg_extranonce else None,
+        'reply_ms': reply_time,
+        'kernel_reply_ms': kernel_reply_time,
+        'kernel_rtt_ms': kernel_rtt,
+        'server_time_ms': server_time,
+        'retransmits': retransmits,
         'likely_proxied': likely_proxied,
         'indicators': indicators
     }
 
 
+def check_address_type(host: str, port: int, address: str, timeout: int,
+                       password: str) -> Tuple[str, Optional[object], str]:
+    """
+    Check one address on its own connection: authorize it, wait for the block
+    template and look for the address in the coinbase outputs.
+    Returns (status, details, message) for test_all_address_types().
+    """
+    client, subscribe_response = connect_and_subscribe(host, port, timeout)
+    
+    if not client or not subscribe_response:
+        return "Connection Failed", None, "❌ Connection failed"
+    
+    try:
+        # Try to authorize with this address
+        authorized, notify_params, difficulty = authorize_worker(client, address, password)
+        
+        if not authorized:
+            # Check if it's a connection issue or explicit rejection
+            # If we got here, connection worked, so it's likely auth requirements
+            return "Unknown ?", None, "⚠️  Authorization failed (may require valid credentials)"
+        
+        # Get notify if not received
+        if not notify_params:
+            notify_params, difficulty = wait_for_mining_notify(client, timeout, verbose=False)
+    finally:
+        client.close()
+    
+    if not notify_params or len(notify_params) < 9:
+        return "Authorized (No Template)", None, "⚠️  Authorized but no block template received"
+    
+    # Parse outputs
+    coinb1 = notify_params[2]
+    coinb2 = notify_params[3]
+    outputs = parse_coinbase_outputs(coinb2, coinb1)
+    
+    if not outputs:
+        return "Authorized (Parse Error)", None, "⚠️  Authorized but could not parse outputs"
+    
+    # Verify address in outputs
+    found, details = verify_address_in_outputs(outputs, address)
+    
+    if found:
+        return "Supported ✓", details, "✅ Supported and verified in coinbase"
+    return "Not Found X", outputs, "❌ Address NOT found in coinbase"
+
+
 def test_all_address_types(host: str, port: int, timeout: int, password: str) -> int:
     """
     Test all 5 Bitcoin address types to see which are supported by the pool.
@@ -1446,66 +1462,23 @@ def test_all_address_types(host: str, port: int, timeout: int, password: str) ->
     print("Testing which Bitcoin address types are supported by this pool...")
     print()
     
-    results = []
+    # Each address type needs its own connection (the coinbase pays the
+    # connection's authorized worker), so run the checks concurrently with at
+    # most ADDRESS_CHECKS_PER_POOL connections open to the pool at once
+    scheduler = ProbeScheduler(max_in_flight=ADDRESS_CHECKS_PER_POOL)
+    checks = scheduler.map(
+        lambda address: check_address_type(host, port, address, timeout, password),
+        [(address,) for _, address, _ in test_addresses],
+        key=lambda item: host,
+        error_of=lambda check: check[0] if check[0] == "Connection Failed" else None
+    )
     
-    for addr_name, address, addr_format in test_addresses:
+    results = []
+    for (addr_name, address, addr_format), (status, details, message) in zip(test_addresses, checks):
         print(f"Testing {addr_name} ({addr_format})...")
-        
-        # Longer delay between tests to avoid rate limiting (1 second instead of 0.5)
-        if len(results) > 0:
-            time.sleep(1.0)
-        
-        # Try to connect and authorize
-        sock, subscribe_response = connect_and_subscribe(host, port, timeout)
-        
-        if not sock or not subscribe_response:
-            print(f"  ❌ Connection failed")
-            results.append((addr_name, addr_format, "Connection Failed", None))
-            continue
-        
-        # Try to authorize with this address
-        authorized, notify_params, difficulty = authorize_worker(sock, address, password)
-        
-        if not authorized:
-            # Check if it's a connection issue or explicit rejection
-            # If we got here, connection worked, so it's likely auth requirements
-            print(f"  ⚠️  Authorization failed (may require valid credentials)")
-            results.append((addr_name, addr_format, "Unknown ?", None))
-            sock.close()
-            continue
-        
-        # Get notify if not received
-        if not notify_params:
-            notify_params, difficulty = wait_for_mining_notify(sock, timeout)
-        
-        sock.close()
-        
-        if not notify_params or len(notify_params) < 9:
-            print(f"  ⚠️  Authorized but no block template received")
-            results.append((addr_name, addr_format, "Authorized (No Template)", None))
-            continue
-        
-        # Parse outputs
-        coinb1 = notify_params[2]
-        coinb2 = notify_params[3]
-        outputs = parse_coinbase_outputs(coinb2, coinb1)
-        
-        if not outputs:
-            print(f"  ⚠️  Authorized but could not parse outputs")
-            results.append((addr_name, addr_format, "Authorized (Parse Error)", None))
-            continue
-        
-        # Verify address in outputs
-        found, details = verify_address_in_outputs(outputs, address)
-        
-        if found:
-            print(f"  ✅ Supported and verified in coinbase")
-            results.append((addr_name, addr_format, "Supported ✓", details))
-        else:
-            print(f"  ❌ Address NOT found in coinbase")
-            results.append((addr_name, addr_format, "Not Found X", outputs))
-        
+        print(f"  {message}")
         print()
+        results.append((addr_name, addr_format, status, details))
     
     # Print summary table
     print("=" * 70)
@@ -1641,6 +1614,9 @@ Examples:
   
   Test slow pool with increased timeout and retries:
     python3 verify_pool.py slow-pool.example.com 3333 --timeout 60 --retries 3
+  
+  Verify the pool's IPv6 endpoint (some pools run separate IPv6 front ends):
+    python3 verify_pool.py solo.atlaspool.io 3333 -6 --analyze
 
 Supported address types:
   • P2PKH (Legacy):     1...  (e.g., 1A1zP1eP5QGefi2DMPTfTL5SLmv7DivfNa)
@@ -1668,6 +1644,11 @@ Note: This tool performs a basic verification. For complete security, you should
     parser.add_argument('--password', default='x', help='Password (default: x)')
     parser.add_argument('--timeout', type=int, default=30, help='Timeout in seconds (default: 30)')
     parser.add_argument('--retries', type=int, default=2, help='Number of retries for slow pools (default: 2)')
+    family_group = parser.add_mutually_exclusive_group()
+    family_group.add_argument('-4', '--ipv4', dest='family', action='store_const', const=socket.AF_INET,
+                              help="Connect to the pool's first IPv4 address (the default)")
+    family_group.add_argument('-6', '--ipv6', dest='family', action='store_const', const=socket.AF_INET6,
+                              help="Connect to the pool's first IPv6 address")
     
     args = parser.parse_args()
     
@@ -1707,6 +1688,16 @@ Note: This tool performs a basic verification. For complete security, you should
         print("Error: Cannot use both --test-extranonce and --all-types", file=sys.stderr)
         sys.exit(1)
     
+    # -4/-6: pin every connection to one address of that family
+    if args.family is not None:
+        address = dual_stack.family_addresses(args.host).get(args.family)
+        label = dual_stack.family_label(args.family)
+        if address is None:
+            print(f"Error: {args.host} has no {label} address", file=sys.stderr)
+            sys.exit(1)
+        print(f"Using {label} address {address} for {args.host}")
+        args.host = address
+    
     # Handle --test-extranonce mode
     if args.test_extranonce:
         result = test_extranonce1_uniqueness(args.host, args.port, args.timeout, num_tests=5)
@@ -1793,15 +1784,15 @@ Note: This tool performs a basic verification. For complete security, you should
     
     # Step 1: Connect and subscribe
     print("[1/4] Connecting to pool...")
-    sock, subscribe_response = connect_and_subscribe(args.host, args.port, args.timeout)
+    client, subscribe_response = connect_and_subscribe(args.host, args.port, args.timeout)
     
-    if not sock:
+    if not client:
         print("❌ Failed to connect to pool")
         return 1
     
     if not subscribe_response or 'result' not in subscribe_response:
         print("❌ Invalid subscribe response")
-        sock.close()
+        client.close()
         return 1
     
     print("✓ Connected successfully")
@@ -1815,7 +1806,7 @@ Note: This tool performs a basic verification. For complete security, you should
         print("❌ Extranonce1 missing or invalid")
         for warning in extranonce1_info['warnings']:
             print(f"    ⚠️  {warning}")
-        sock.close()
+        client.close()
         return 1
     
     print("✓ Extranonce1 received")
@@ -1839,11 +1830,11 @@ Note: This tool performs a basic verification. For complete security, you should
     
     # Step 2: Authorize
     print("\n[2/5] Authorizing worker...")
-    authorized, notify_params, difficulty = authorize_worker(sock, username, args.password)
+    authorized, notify_params, difficulty = authorize_worker(client, username, args.password)
     
     if not authorized:
         print("❌ Authorization failed")
-        sock.close()
+        client.close()
         return 1
     
     print("✓ Worker authorized")
@@ -1857,7 +1848,7 @@ Note: This tool performs a basic verification. For complete security, you should
         
         # Try with retries for slow pools
         for retry in range(args.retries + 1):
-            notify_params, diff = wait_for_mining_notify(sock, args.timeout, retry_count=retry)
+            notify_params, diff = wait_for_mining_notify(client, args.timeout, retry_count=retry)
             if diff is not None:
                 difficulty = diff
             if notify_params:
@@ -1866,21 +1857,21 @@ Note: This tool performs a basic verification. For complete security, you should
             # If not last retry, reconnect and try again
             if retry < args.retries:
                 print(f"    Reconnecting for retry {retry + 1}...")
-                sock.close()
+                client.close()
                 
-                sock, subscribe_response = connect_and_subscribe(args.host, args.port, args.timeout)
-                if not sock:
+                client, subscribe_response = connect_and_subscribe(args.host, args.port, args.timeout)
+                if not client:
                     print("❌ Reconnection failed")
                     return 1
                 
-                authorized, notify_params, diff = authorize_worker(sock, username, args.password)
+                authorized, notify_params, diff = authorize_worker(client, username, args.password)
                 if diff is not None:
                     difficulty = diff
                 if notify_params:
                     print(f"    ✓ Received on reconnect (retry {retry + 1})")
                     break
     
-    sock.close()
+    client.close()
     
     if not notify_params:
         print(f"❌ Did not receive mining.notify after {args.retries + 1} attempts")